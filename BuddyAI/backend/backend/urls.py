@@ -18,9 +18,12 @@ from django.contrib import admin
 from django.urls import path, include, re_path
 from core.views.practice_api import GenerateQuestionsView, ScoreQuestionView, CorrectAnswerView
 from core.views import test_api
+from core.views.metrics_view import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    # Prometheus scrape endpoint
+    path('metrics', metrics_view, name='metrics'),
     path('api/core/', include('core.urls')),
     path('api/users/', include('users.urls')),
     # Accept top-level API routes for Practice & Test (with or without trailing slash)
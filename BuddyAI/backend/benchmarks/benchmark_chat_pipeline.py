@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Benchmark end-to-end get_chat_response latency for each suggestions strategy
+(local key-term templates, sequential, parallel and structured).
+
+Runs against a fake LLM backend (no network, no API credits): retrieval and
+every chat completion are replaced by sleeps with configurable latency, so the
+numbers isolate how the pipeline orchestrates its calls.
+
+Usage (from BuddyAI/backend):
+    python benchmarks/benchmark_chat_pipeline.py --runs 10 --answer-ms 1200 --suggest-ms 600
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+# Add the backend directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The fake backend never talks to OpenAI; keep service start-up offline.
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark-fake")
+os.environ.setdefault("OPENAI_POOL_WARMUP", "0")
+os.environ.setdefault("ANSWER_CACHE_ENABLED", "0")
+
+from langchain.schema import Document
+
+from core.services.llm_service import LLMService
+from core.services.suggestion_generator import KeyTermIndex
+
+FAKE_ANSWER = (
+    "Answer:\nThe solar system is the Sun and the objects that orbit it.\n\n"
+    "Key Points:\n1. The Sun is a star.\n2. Eight planets orbit the Sun.\n3. Moons orbit planets."
+)
+FAKE_QUESTIONS = [
+    "Why do planets orbit the Sun?",
+    "Which planet is the largest?",
+    "How was the solar system formed?",
+]
+
+
+class FakeLLMService(LLMService):
+    """LLMService with retrieval and chat completions replaced by timed stubs."""
+
+    def __init__(self, retrieval_ms: float, answer_ms: float, suggest_ms: float, structured_ms: float):
+        self.retrieval_ms = retrieval_ms
+        self.answer_ms = answer_ms
+        self.suggest_ms = suggest_ms
+        self.structured_ms = structured_ms
+        self.llm_calls = 0
+        super().__init__()
+
+    def _initialize_textbook_vector_store(self):
+        self.textbook_vectorstore = None
+        # Key terms of the fake chunks, so the local strategy does its real work
+        chunks = self._fake_chunks(4)
+        self.suggestion_index = KeyTermIndex.build(
+            [str(i) for i in range(len(chunks))],
+            [chunk.page_content for chunk in chunks],
+            [chunk.metadata for chunk in chunks],
+        )
+
+    @staticmethod
+    def _fake_chunks(k):
+        return [
+            Document(
+                page_content=(
+                    "The Sun and the eight planets that orbit it make up the solar system. "
+                    "Gravity keeps every planet in its orbit around the Sun. "
+                    "Moons orbit planets, and asteroids orbit between Mars and Jupiter. "
+                ) * 2,
+                metadata={"source": "textbook.pdf", "page_number": i + 1, "chunk_id": i, "content_hash": f"fake-{i}"},
+            )
+            for i in range(k)
+        ]
+
+    def retrieve_textbook_chunks(self, query, k=3, **kwargs):
+        time.sleep(self.retrieval_ms / 1000)
+        return self._fake_chunks(k)
+
+    def _openai_chat(self, model, system, messages, *, max_output_tokens, temperature=0.2, top_p=1.0, response_format=None, **kwargs):
+        self.llm_calls += 1
+        if response_format is not None:
+            time.sleep(self.structured_ms / 1000)
+            return json.dumps({"answer": FAKE_ANSWER, "suggested_questions": FAKE_QUESTIONS})
+        if "follow-up questions" in system:
+            time.sleep(self.suggest_ms / 1000)
+            return json.dumps(FAKE_QUESTIONS)
+        time.sleep(self.answer_ms / 1000)
+        return FAKE_ANSWER
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10, help="questions per mode and strategy")
+    parser.add_argument("--retrieval-ms", type=float, default=80)
+    parser.add_argument("--answer-ms", type=float, default=1200)
+    parser.add_argument("--suggest-ms", type=float, default=600)
+    parser.add_argument("--structured-ms", type=float, default=1350, help="latency of the combined JSON call")
+    parser.add_argument("--modes", default="textbook,detailed,advanced")
+    args = parser.parse_args()
+
+    service = FakeLLMService(args.retrieval_ms, args.answer_ms, args.suggest_ms, args.structured_ms)
+    modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+    results = []
+
+    for strategy in ("local", "sequential", "parallel", "structured"):
+        for mode in modes:
+            service.mode_config[mode]["suggestions"] = strategy
+            service.llm_calls = 0
+            latencies = []
+            for i in range(args.runs):
+                start = time.perf_counter()
+                response = service.get_chat_response(f"What is the solar system? ({i})", level=mode)
+                latencies.append((time.perf_counter() - start) * 1000)
+                assert len(response["suggested_questions"]) == 3
+            results.append({
+                "strategy": strategy,
+                "mode": mode,
+                "mean_ms": round(statistics.mean(latencies), 1),
+                "p50_ms": round(_percentile(latencies, 50), 1),
+                "p95_ms": round(_percentile(latencies, 95), 1),
+                "llm_calls_per_request": round(service.llm_calls / args.runs, 2),
+            })
+
+    print(f"\n{'strategy':<12}{'mode':<10}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'calls':>8}")
+    for row in results:
+        print(f"{row['strategy']:<12}{row['mode']:<10}{row['mean_ms']:>10}{row['p50_ms']:>10}{row['p95_ms']:>10}{row['llm_calls_per_request']:>8}")
+    service.executor.shutdown(wait=False)
+
+
+if __name__ == "__main__":
+    main()
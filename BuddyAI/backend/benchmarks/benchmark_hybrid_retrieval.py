@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Compare dense, BM25 and hybrid (RRF) retrieval on the golden textbook questions.
+
+Each question in golden_questions.json lists the textbook pages that answer
+it. For every backend we report search latency and, over the top-k chunks:
+- hit@k: share of questions with at least one chunk from an expected page
+- recall@k: mean share of expected pages covered
+
+Query embeddings are computed once up front (and cached on disk), so the
+dense and hybrid latencies measure search cost only. With --offline only the
+lexical backend runs and no network calls are made.
+
+Usage (from BuddyAI/backend):
+    python benchmarks/benchmark_hybrid_retrieval.py --k 3
+    python benchmarks/benchmark_hybrid_retrieval.py --offline
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+# Add the backend directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+from langchain_community.vectorstores import Chroma
+
+from core.services.lexical_index import BM25Index, reciprocal_rank_fusion
+from export_vector_index import find_textbook_db
+
+load_dotenv()
+
+GOLDEN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden_questions.json")
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def _score(docs, expected_pages):
+    pages = {doc.metadata.get("page_number") for doc in docs}
+    covered = pages & set(expected_pages)
+    return (1.0 if covered else 0.0), len(covered) / len(expected_pages)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db-path", default=None)
+    parser.add_argument("--golden", default=GOLDEN_PATH, help="golden question set")
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--candidates", type=int, default=8, help="per-retriever depth fused by hybrid")
+    parser.add_argument("--offline", action="store_true", help="lexical only, no embeddings API calls")
+    parser.add_argument("--repeat", type=int, default=5, help="timed repetitions per query")
+    parser.add_argument("--json", dest="json_path", default=None, help="write results to this JSON file")
+    args = parser.parse_args()
+
+    db_path = args.db_path or find_textbook_db()
+    if not db_path:
+        print("❌ Textbook vector database not found.")
+        return 1
+    with open(args.golden, "r", encoding="utf-8") as f:
+        golden = json.load(f)["questions"]
+
+    vectorstore = Chroma(persist_directory=db_path)
+    index_dir = BM25Index.default_path(db_path)
+    lexical = BM25Index.load(index_dir) if not BM25Index.is_stale(index_dir, db_path) else BM25Index.from_chroma(vectorstore)
+
+    searches = {"lexical": lambda q, v: lexical.search(q, args.k)}
+    query_vectors = [None] * len(golden)
+    if not args.offline:
+        from langchain_openai import OpenAIEmbeddings
+        from core.services.embedding_cache import CachedEmbeddings
+        model = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-small")
+        embeddings = CachedEmbeddings(OpenAIEmbeddings(model=model), model_name=model)
+        query_vectors = embeddings.embed_documents([item["question"] for item in golden])
+
+        def hybrid(question, vector):
+            dense = vectorstore.similarity_search_by_vector(vector, k=args.candidates)
+            return reciprocal_rank_fusion([dense, lexical.search(question, args.candidates)])[:args.k]
+
+        searches["dense"] = lambda q, v: vectorstore.similarity_search_by_vector(v, k=args.k)
+        searches["hybrid"] = hybrid
+
+    results = {name: {"latencies": [], "hits": [], "recalls": []} for name in searches}
+    for item, vector in zip(golden, query_vectors):
+        for name, search in searches.items():
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                docs = search(item["question"], vector)
+                timings.append((time.perf_counter() - start) * 1000)
+            hit, recall = _score(docs, item["expected_pages"])
+            results[name]["latencies"].append(min(timings))
+            results[name]["hits"].append(hit)
+            results[name]["recalls"].append(recall)
+
+    report = {
+        "db_path": db_path,
+        "chunks": len(lexical),
+        "k": args.k,
+        "questions": len(golden),
+        "backends": {
+            name: {
+                "mean_ms": round(statistics.mean(r["latencies"]), 3),
+                "p50_ms": round(_percentile(r["latencies"], 50), 3),
+                "p95_ms": round(_percentile(r["latencies"], 95), 3),
+                "hit_at_k": round(statistics.mean(r["hits"]), 4),
+                "recall_at_k": round(statistics.mean(r["recalls"]), 4),
+            }
+            for name, r in results.items()
+        },
+    }
+
+    print(f"\n{'backend':<10}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'hit@k':>10}{'recall@k':>10}")
+    for name, row in report["backends"].items():
+        print(f"{name:<10}{row['mean_ms']:>10}{row['p50_ms']:>10}{row['p95_ms']:>10}{row['hit_at_k']:>10}{row['recall_at_k']:>10}")
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"📝 Wrote {args.json_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
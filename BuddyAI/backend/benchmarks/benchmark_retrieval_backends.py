@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Compare retrieval latency and recall of the Chroma and NumPy backends.
+
+Both backends are queried with the same precomputed query vectors, so the
+numbers measure search cost only (query embedding is cached separately).
+Recall@k is measured against exact brute-force cosine search in float64 over
+the raw Chroma embeddings.
+
+Query vectors come from the embeddings API for a fixed set of textbook
+questions, or with --offline from stored chunk vectors plus Gaussian noise
+(no network needed).
+
+Usage (from BuddyAI/backend):
+    python benchmarks/benchmark_retrieval_backends.py --offline --queries 200 --k 4
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+# Add the backend directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from dotenv import load_dotenv
+from langchain_community.vectorstores import Chroma
+
+from core.services.vector_index import NumpyVectorIndex
+from export_vector_index import find_textbook_db
+
+load_dotenv()
+
+TEXTBOOK_QUESTIONS = [
+    "What is a constellation?",
+    "How did people use stars for navigation?",
+    "What is the Pole Star and why does it not move?",
+    "How can we find the Pole Star using the Big Dipper?",
+    "Which are the planets of the solar system?",
+    "Why does the Moon shine?",
+    "What are artificial satellites used for?",
+    "What is the difference between a star and a planet?",
+    "What is the Milky Way galaxy?",
+    "What are asteroids and comets?",
+    "Why do stars appear to twinkle?",
+    "What is light pollution?",
+]
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def _summary(latencies_ms, recalls):
+    return {
+        "mean_ms": round(statistics.mean(latencies_ms), 3),
+        "p50_ms": round(_percentile(latencies_ms, 50), 3),
+        "p95_ms": round(_percentile(latencies_ms, 95), 3),
+        "recall_at_k": round(statistics.mean(recalls), 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db-path", default=None)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--queries", type=int, default=100, help="number of offline queries")
+    parser.add_argument("--offline", action="store_true", help="use noisy stored vectors instead of the embeddings API")
+    parser.add_argument("--noise", type=float, default=0.02, help="std-dev of offline query noise")
+    parser.add_argument("--repeat", type=int, default=5, help="timed repetitions per query")
+    parser.add_argument("--json", dest="json_path", default=None, help="write results to this JSON file")
+    args = parser.parse_args()
+
+    db_path = args.db_path or find_textbook_db()
+    if not db_path:
+        print("❌ Textbook vector database not found.")
+        return 1
+
+    vectorstore = Chroma(persist_directory=db_path)
+    raw = vectorstore._collection.get(include=["embeddings"])
+    ids = list(raw["ids"])
+    exact_matrix = np.asarray(raw["embeddings"], dtype=np.float64)
+    exact_matrix /= np.linalg.norm(exact_matrix, axis=1, keepdims=True)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index = NumpyVectorIndex.export_from_chroma(vectorstore, tmp)
+
+        if args.offline:
+            rng = np.random.default_rng(0)
+            picks = rng.integers(0, len(ids), size=args.queries)
+            query_vectors = exact_matrix[picks] + rng.normal(0, args.noise, size=(args.queries, exact_matrix.shape[1]))
+        else:
+            from langchain_openai import OpenAIEmbeddings
+            embeddings = OpenAIEmbeddings(model=os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-small"))
+            query_vectors = np.asarray(embeddings.embed_documents(TEXTBOOK_QUESTIONS), dtype=np.float64)
+
+        # Map documents back to ids so results from both backends are comparable
+        id_by_text = {doc: i for doc, i in zip(index.documents, index.ids)}
+        results = {"chroma": ([], []), "numpy": ([], [])}
+
+        for vector in query_vectors:
+            unit = vector / np.linalg.norm(vector)
+            exact_ids = {ids[i] for i in np.argsort(-(exact_matrix @ unit))[:args.k]}
+            query = unit.astype(np.float32).tolist()
+
+            for name, search in (
+                ("chroma", lambda q: vectorstore.similarity_search_by_vector(q, k=args.k)),
+                ("numpy", lambda q: [doc for doc, _ in index.search_by_vector(q, k=args.k)]),
+            ):
+                timings = []
+                for _ in range(args.repeat):
+                    start = time.perf_counter()
+                    docs = search(query)
+                    timings.append((time.perf_counter() - start) * 1000)
+                found = {id_by_text.get(doc.page_content) for doc in docs}
+                results[name][0].append(min(timings))
+                results[name][1].append(len(found & exact_ids) / len(exact_ids))
+
+        report = {
+            "db_path": db_path,
+            "chunks": len(ids),
+            "k": args.k,
+            "queries": len(query_vectors),
+            "mode": "offline" if args.offline else "textbook_questions",
+            "backends": {name: _summary(*values) for name, values in results.items()},
+        }
+
+    print(f"\n{'backend':<10}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'recall@k':>10}")
+    for name, row in report["backends"].items():
+        print(f"{name:<10}{row['mean_ms']:>10}{row['p50_ms']:>10}{row['p95_ms']:>10}{row['recall_at_k']:>10}")
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"📝 Wrote {args.json_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+Retrieval quality and latency per backend and chunking configuration.
+
+Runs the golden textbook questions (golden_questions.json: question ->
+expected page_numbers) against every retrieval backend (lexical BM25, dense
+and hybrid RRF) for each chunking configuration, and reports per backend:
+- recall@k: mean share of expected pages covered by the top-k chunks
+- hit@k: share of questions with at least one chunk from an expected page
+- MRR: mean reciprocal rank of the first chunk from an expected page
+- per-query search latency (mean, p50, p95; best of --repeat runs)
+
+k defaults to 1-5 and 8, which covers max_chunks of every mode.
+
+Chunking configurations (--chunking):
+- "existing": the chunks and stored embeddings of textbook_vector_db
+- "SIZE:OVERLAP", e.g. "800:150": the textbook re-split in memory with
+  core.services.ingestion.split_textbook() (characters)
+- "token:SIZE:OVERLAP", e.g. "token:250:40": the same with the token-aware
+  sentence chunker (tokens). Pages come from the textbook
+  PDF when it is found, otherwise they are reassembled from the stored
+  chunks. Chunks are embedded through the on-disk embedding cache, so
+  repeated runs cost no API calls.
+
+Every run writes a JSON report (per-query rows included) and a CSV with one
+row per configuration/backend/k under benchmarks/results/ so runs can be
+compared over time; --baseline prints the recall@k and MRR change against
+an earlier JSON report. With --offline only the lexical backend runs and no
+network calls are made.
+
+Usage (from BuddyAI/backend):
+    python benchmarks/benchmark_retrieval_quality.py --chunking existing,1000:200,800:150
+    python benchmarks/benchmark_retrieval_quality.py --offline --baseline benchmarks/results/<earlier>.json
+"""
+
+import argparse
+import csv
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+# Add the backend directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from dotenv import load_dotenv
+from langchain.schema import Document
+from langchain_community.vectorstores import Chroma
+
+from core.services.context_packer import strip_overlap
+from core.services.ingestion import find_textbook_pdf, split_textbook
+from core.services.lexical_index import BM25Index, reciprocal_rank_fusion
+from core.services.vector_index import NumpyVectorIndex
+from export_vector_index import find_textbook_db
+
+load_dotenv()
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+GOLDEN_PATH = os.path.join(BENCHMARK_DIR, "golden_questions.json")
+RESULTS_DIR = os.path.join(BENCHMARK_DIR, "results")
+CSV_FIELDS = ["run", "chunking", "chunks", "backend", "k", "recall", "hit", "mrr", "mean_ms", "p50_ms", "p95_ms"]
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=BENCHMARK_DIR, timeout=5
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def score(docs: List[Document], expected_pages: List[int], ks: List[int]) -> Dict[str, Any]:
+    """recall@k and hit@k for every k, and the reciprocal rank of the first relevant chunk."""
+    expected = set(expected_pages)
+    pages = [doc.metadata.get("page_number") for doc in docs]
+    first = next((rank for rank, page in enumerate(pages, 1) if page in expected), None)
+    row = {"rr": 1.0 / first if first else 0.0, "first_relevant_rank": first}
+    for k in ks:
+        covered = set(pages[:k]) & expected
+        row[f"recall@{k}"] = len(covered) / len(expected)
+        row[f"hit@{k}"] = 1.0 if covered else 0.0
+    return row
+
+
+def pages_from_chunks(documents: List[str], metadatas: List[Dict[str, Any]]) -> List[Document]:
+    """Reassemble page texts from stored chunks (in chunk order, overlaps removed)."""
+    by_page: Dict[int, List[tuple]] = {}
+    for text, meta in zip(documents, metadatas):
+        meta = meta or {}
+        by_page.setdefault(int(meta.get("page_number", 1)), []).append((meta.get("chunk_id", 0), text))
+    pages = []
+    for page_number in sorted(by_page):
+        texts: List[str] = []
+        for _, text in sorted(by_page[page_number], key=lambda item: item[0]):
+            texts.append(strip_overlap(text, texts[-1:]))
+        # split_textbook() numbers pages from the 0-based "page" like PyPDFLoader
+        pages.append(Document(page_content="\n".join(texts), metadata={"page": page_number - 1}))
+    return pages
+
+
+def load_pages(stored: Dict[str, Any]) -> List[Document]:
+    pdf_path = find_textbook_pdf()
+    if pdf_path:
+        try:
+            from langchain_community.document_loaders import PyPDFLoader
+            pages = PyPDFLoader(pdf_path).load()
+            print(f"✅ Loaded {len(pages)} pages from {pdf_path}")
+            return pages
+        except Exception as e:
+            print(f"⚠️ Could not load {pdf_path} ({e}), reassembling pages from stored chunks")
+    pages = pages_from_chunks(stored["documents"], stored["metadatas"])
+    print(f"✅ Reassembled {len(pages)} pages from {len(stored['ids'])} stored chunks")
+    return pages
+
+
+def parse_chunking(spec: str) -> List[str]:
+    configs = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if part != "existing":
+            prefix = "token:" if part.startswith("token:") else ""
+            size, _, overlap = part[len(prefix):].partition(":")
+            if not size.isdigit() or not (overlap or "0").isdigit() or int(overlap or 0) >= int(size):
+                raise SystemExit(f"Invalid chunking '{part}' (use 'existing' or [token:]SIZE:OVERLAP with OVERLAP < SIZE)")
+            part = f"{prefix}{int(size)}:{int(overlap or 0)}"
+        configs.append(part)
+    return configs
+
+
+class Configuration:
+    """Lexical and (optionally) dense indexes over one chunking of the textbook."""
+
+    def __init__(self, name: str, ids: List[str], documents: List[str], metadatas: List[Dict[str, Any]], vectors=None):
+        self.name = name
+        self.lexical = BM25Index.build(ids, documents, metadatas)
+        self.dense = None
+        if vectors is not None:
+            matrix = np.asarray(vectors, dtype=np.float32)
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            self.dense = NumpyVectorIndex(np.ascontiguousarray(matrix / norms), ids, documents, metadatas)
+
+    def __len__(self) -> int:
+        return len(self.lexical)
+
+    def searches(self, candidates: int) -> Dict[str, Any]:
+        """backend -> search(question, query_vector, k)"""
+        searches = {"lexical": lambda q, v, k: self.lexical.search(q, k)}
+        if self.dense is not None:
+            def dense(question, vector, k):
+                return [doc for doc, _ in self.dense.search_by_vector(vector, k)]
+
+            def hybrid(question, vector, k):
+                depth = max(k * 2, candidates)
+                return reciprocal_rank_fusion([dense(question, vector, depth), self.lexical.search(question, depth)])[:k]
+
+            searches["dense"] = dense
+            searches["hybrid"] = hybrid
+        return searches
+
+
+def build_configuration(name: str, stored: Dict[str, Any], pages: Optional[List[Document]], embeddings) -> Configuration:
+    if name == "existing":
+        vectors = stored["embeddings"] if embeddings is not None else None
+        return Configuration(name, stored["ids"], stored["documents"], stored["metadatas"], vectors)
+    chunker = "token" if name.startswith("token:") else "recursive"
+    size, overlap = (int(n) for n in name.split(":")[-2:])
+    chunks = split_textbook(pages, chunk_size=size, chunk_overlap=overlap, chunker=chunker)
+    documents = [chunk.page_content for chunk in chunks]
+    metadatas = [dict(chunk.metadata) for chunk in chunks]
+    ids = [f"{name}-{i}" for i in range(len(chunks))]
+    vectors = None
+    if embeddings is not None:
+        start = time.perf_counter()
+        vectors = embeddings.embed_documents(documents)
+        print(f"🧮 Embedded {len(documents)} chunks for {name} in {time.perf_counter() - start:.1f}s")
+    return Configuration(name, ids, documents, metadatas, vectors)
+
+
+def evaluate(config: Configuration, golden: List[Dict[str, Any]], query_vectors, ks: List[int], args) -> Dict[str, Any]:
+    depth = max(ks)
+    backends = {}
+    for backend, search in config.searches(args.candidates).items():
+        rows = []
+        for item, vector in zip(golden, query_vectors):
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                docs = search(item["question"], vector, depth)
+                timings.append((time.perf_counter() - start) * 1000)
+            row = score(docs, item["expected_pages"], ks)
+            row.update({"question": item["question"], "latency_ms": round(min(timings), 3),
+                        "pages": [doc.metadata.get("page_number") for doc in docs]})
+            rows.append(row)
+        latencies = [row["latency_ms"] for row in rows]
+        backends[backend] = {
+            "mrr": round(statistics.mean(row["rr"] for row in rows), 4),
+            "recall": {k: round(statistics.mean(row[f"recall@{k}"] for row in rows), 4) for k in ks},
+            "hit": {k: round(statistics.mean(row[f"hit@{k}"] for row in rows), 4) for k in ks},
+            "mean_ms": round(statistics.mean(latencies), 3),
+            "p50_ms": round(_percentile(latencies, 50), 3),
+            "p95_ms": round(_percentile(latencies, 95), 3),
+            "queries": rows,
+        }
+    return {"chunks": len(config), "backends": backends}
+
+
+def write_reports(report: Dict[str, Any], out_dir: str) -> List[str]:
+    os.makedirs(out_dir, exist_ok=True)
+    base = os.path.join(out_dir, f"retrieval_quality_{report['run']}")
+    with open(f"{base}.json", "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    with open(f"{base}.csv", "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+        for chunking, result in report["configurations"].items():
+            for backend, row in result["backends"].items():
+                for k in report["k"]:
+                    writer.writerow({
+                        "run": report["run"], "chunking": chunking, "chunks": result["chunks"], "backend": backend,
+                        "k": k, "recall": row["recall"][k], "hit": row["hit"][k], "mrr": row["mrr"],
+                        "mean_ms": row["mean_ms"], "p50_ms": row["p50_ms"], "p95_ms": row["p95_ms"],
+                    })
+    return [f"{base}.json", f"{base}.csv"]
+
+
+def print_report(report: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None) -> None:
+    ks = report["k"]
+    header = f"{'chunking':<12}{'backend':<9}{'chunks':>7}" + "".join(f"{'R@' + str(k):>7}" for k in ks)
+    print(f"\n{header}{'MRR':>7}{'p50 ms':>9}{'p95 ms':>9}")
+    for chunking, result in report["configurations"].items():
+        for backend, row in result["backends"].items():
+            recalls = "".join(f"{row['recall'][k]:>7.3f}" for k in ks)
+            print(f"{chunking:<12}{backend:<9}{result['chunks']:>7}{recalls}{row['mrr']:>7.3f}{row['p50_ms']:>9}{row['p95_ms']:>9}")
+            old = ((baseline or {}).get("configurations", {}).get(chunking) or {}).get("backends", {}).get(backend)
+            if old:
+                deltas = "".join(
+                    f"{row['recall'][k] - old['recall'][str(k)]:>+7.3f}" if str(k) in old["recall"] else f"{'':>7}"
+                    for k in ks
+                )
+                print(f"{'  vs base':<28}{deltas}{row['mrr'] - old['mrr']:>+7.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db-path", default=None)
+    parser.add_argument("--golden", default=GOLDEN_PATH, help="golden question set")
+    parser.add_argument("--chunking", default="existing,1000:200,800:150,500:100",
+                        help="comma-separated 'existing' and SIZE:OVERLAP configurations")
+    parser.add_argument("--k", default="1,2,3,4,5,8", help="comma-separated cut-offs for recall@k and hit@k")
+    parser.add_argument("--candidates", type=int, default=int(os.getenv("HYBRID_CANDIDATES", "8")),
+                        help="per-retriever depth fused by hybrid")
+    parser.add_argument("--offline", action="store_true", help="lexical only, no embeddings API calls")
+    parser.add_argument("--repeat", type=int, default=5, help="timed repetitions per query")
+    parser.add_argument("--out-dir", default=RESULTS_DIR, help="directory of the JSON and CSV reports")
+    parser.add_argument("--baseline", default=None, help="earlier JSON report to compare against")
+    args = parser.parse_args()
+
+    ks = sorted({int(k) for k in args.k.split(",") if k.strip()})
+    configs = parse_chunking(args.chunking)
+    db_path = args.db_path or find_textbook_db()
+    if not db_path:
+        print("❌ Textbook vector database not found. Please run create_fresh_textbook_db.py first.")
+        return 1
+    with open(args.golden, "r", encoding="utf-8") as f:
+        golden = json.load(f)["questions"]
+
+    include = ["documents", "metadatas"] if args.offline else ["documents", "metadatas", "embeddings"]
+    stored = Chroma(persist_directory=db_path)._collection.get(include=include)
+    stored["metadatas"] = [m or {} for m in stored["metadatas"]]
+
+    embeddings = None
+    query_vectors = [None] * len(golden)
+    model = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-small")
+    if not args.offline:
+        from langchain_openai import OpenAIEmbeddings
+        from core.services.embedding_cache import CachedEmbeddings
+        embeddings = CachedEmbeddings(OpenAIEmbeddings(model=model), model_name=model)
+        query_vectors = embeddings.embed_documents([item["question"] for item in golden])
+
+    pages = load_pages(stored) if any(name != "existing" for name in configs) else None
+    run = datetime.now().strftime("%Y%m%d-%H%M%S")
+    report = {
+        "run": run,
+        "git_commit": _git_commit(),
+        "db_path": db_path,
+        "golden": os.path.basename(args.golden),
+        "questions": len(golden),
+        "k": ks,
+        "candidates": args.candidates,
+        "embedding_model": None if args.offline else model,
+        "offline": args.offline,
+        "configurations": {},
+    }
+    for name in configs:
+        config = build_configuration(name, stored, pages, embeddings)
+        print(f"🔎 {name}: {len(config)} chunks")
+        report["configurations"][name] = evaluate(config, golden, query_vectors, ks, args)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"📎 Baseline: run {baseline.get('run')} (commit {baseline.get('git_commit')})")
+    print_report(report, baseline)
+    for path in write_reports(report, args.out_dir):
+        print(f"📝 Wrote {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
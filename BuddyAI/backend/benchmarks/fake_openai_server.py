@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+OpenAI-compatible stand-in server for load tests (no API credits needed).
+
+Serves /v1/chat/completions (including streaming and JSON mode),
+/v1/embeddings and /v1/models with a configurable latency distribution and
+error injection, so the whole Django stack (LLMService, OpenAIEmbeddings and
+the LLM translator) can be driven end to end.
+
+- Latency is log-normal around --latency-ms (spread --latency-sigma); a
+  --slow-rate fraction of requests takes --slow-ms more (tail latency).
+  Streams send the first token after that latency, then one token every
+  --token-ms.
+- --error-rate fails requests with 500, --rate-limit-rate with 429 and a
+  retry-after-ms header.
+- Embeddings are deterministic hashed bag-of-words vectors (--embedding-dim,
+  1536 like text-embedding-3-small), so similar texts get similar vectors.
+- Answers are canned but shaped like the real prompts expect: JSON objects
+  in JSON mode, a JSON array for suggested-question prompts.
+
+GET /stats returns request and error counts.
+
+Usage (from BuddyAI/backend):
+    python benchmarks/fake_openai_server.py --port 8100 --latency-ms 800 --error-rate 0.01
+    OPENAI_API_BASE=http://127.0.0.1:8100/v1 OPENAI_API_KEY=sk-fake python manage.py runserver
+    python benchmarks/load_test.py --concurrency 16 --duration 60
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FAKE_ANSWER = (
+    "The solar system is made up of the Sun and everything that travels around it. "
+    "Eight planets orbit the Sun along paths called orbits, held in place by the Sun's gravity. "
+    "The four inner planets are rocky, while the four outer planets are giants made mostly of gas and ice. "
+    "Moons, asteroids and comets are also part of the solar system. "
+    "Earth is the only planet known to support life because it has liquid water and a suitable atmosphere."
+)
+FAKE_QUESTIONS = [
+    "Why do planets stay in orbit around the Sun?",
+    "What makes the outer planets different from the inner planets?",
+    "How do moons form around planets?",
+]
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+class FakeOpenAI:
+    """Response generation, latency and error injection shared by all handler threads."""
+
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self._lock = threading.Lock()
+        self.stats = {"chat": 0, "chat_stream": 0, "embeddings": 0, "embedded_inputs": 0, "errors_500": 0, "errors_429": 0}
+
+    def count(self, key: str, n: int = 1) -> None:
+        with self._lock:
+            self.stats[key] += n
+
+    def latency(self, median_ms: float) -> float:
+        """Seconds to wait before answering."""
+        seconds = median_ms / 1000 * math.exp(random.gauss(0, self.args.latency_sigma)) if median_ms > 0 else 0.0
+        if random.random() < self.args.slow_rate:
+            seconds += self.args.slow_ms / 1000
+        return seconds
+
+    def injected_error(self):
+        """(status, headers, message) of an injected failure, or None."""
+        roll = random.random()
+        if roll < self.args.rate_limit_rate:
+            self.count("errors_429")
+            return 429, {"retry-after-ms": str(self.args.retry_after_ms)}, "Rate limit reached (injected)"
+        if roll < self.args.rate_limit_rate + self.args.error_rate:
+            self.count("errors_500")
+            return 500, {}, "Internal server error (injected)"
+        return None
+
+    @staticmethod
+    def estimate_tokens(text: str) -> int:
+        return max(1, math.ceil(len(text) / 4))
+
+    def completion_text(self, body: dict) -> str:
+        messages = body.get("messages") or []
+        system = " ".join(m.get("content") or "" for m in messages if m.get("role") == "system")
+        prompt = (messages[-1].get("content") or "") if messages else ""
+        if (body.get("response_format") or {}).get("type") == "json_object":
+            return json.dumps({"answer": FAKE_ANSWER, "suggested_questions": FAKE_QUESTIONS})
+        if "follow-up questions" in system or "follow-up questions" in prompt:
+            return json.dumps(FAKE_QUESTIONS)
+        if "translate" in prompt.lower():
+            return prompt.rsplit("Text:", 1)[-1].strip()
+        words = FAKE_ANSWER.split()
+        max_tokens = body.get("max_tokens") or body.get("max_completion_tokens")
+        if max_tokens:
+            # ~0.75 words per token
+            words = words[: max(1, int(max_tokens * 0.75))]
+        return " ".join(words)
+
+    def chat_completion(self, body: dict) -> dict:
+        content = self.completion_text(body)
+        prompt_tokens = sum(self.estimate_tokens(m.get("content") or "") + 3 for m in body.get("messages") or []) + 3
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "gpt-4o-mini"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": self.estimate_tokens(content),
+                "total_tokens": prompt_tokens + self.estimate_tokens(content),
+            },
+        }
+
+    def stream_chunks(self, body: dict):
+        """Chat completion chunks, one per word."""
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        words = self.completion_text(body).split(" ")
+        for i, word in enumerate(words):
+            delta = {"content": word if i == 0 else " " + word}
+            if i == 0:
+                delta["role"] = "assistant"
+            yield {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": body.get("model", "gpt-4o-mini"),
+                "choices": [{"index": 0, "delta": delta, "finish_reason": None}],
+            }
+        yield {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": body.get("model", "gpt-4o-mini"),
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+        }
+
+    def embed(self, item) -> list:
+        """Hashed bag-of-words vector of a string or a list of token ids."""
+        if isinstance(item, str):
+            features = [w.lower() for w in _WORD_RE.findall(item)] or [item]
+        else:
+            features = [str(token) for token in item] or ["<empty>"]
+        dim = self.args.embedding_dim
+        vector = [0.0] * dim
+        for feature in features:
+            digest = hashlib.md5(feature.encode("utf-8")).digest()
+            index = int.from_bytes(digest[:4], "little") % dim
+            vector[index] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def embeddings(self, body: dict) -> dict:
+        inputs = body.get("input")
+        if isinstance(inputs, str) or (isinstance(inputs, list) and inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+        inputs = inputs or []
+        self.count("embedded_inputs", len(inputs))
+        tokens = sum(self.estimate_tokens(i) if isinstance(i, str) else len(i) for i in inputs)
+        return {
+            "object": "list",
+            "data": [{"object": "embedding", "index": i, "embedding": self.embed(item)} for i, item in enumerate(inputs)],
+            "model": body.get("model", "text-embedding-3-small"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+
+
+def make_handler(fake: FakeOpenAI):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            if fake.args.verbose:
+                super().log_message(format, *args)
+
+        def _send_json(self, status: int, payload: dict, headers: dict = None) -> None:
+            data = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _send_error(self, status: int, message: str, headers: dict = None) -> None:
+            self._send_json(status, {"error": {"message": message, "type": "fake_error", "code": status}}, headers)
+
+        def _path(self) -> str:
+            # Accept both /v1/... and bare paths
+            path = self.path.split("?", 1)[0].rstrip("/")
+            return path[3:] if path.startswith("/v1/") else path
+
+        def do_GET(self):
+            path = self._path()
+            if path == "/models":
+                models = ["gpt-4o", "gpt-4o-mini", "text-embedding-3-small", "deepseek-chat"]
+                self._send_json(200, {"object": "list", "data": [{"id": m, "object": "model", "owned_by": "fake"} for m in models]})
+            elif path == "/stats":
+                with fake._lock:
+                    self._send_json(200, dict(fake.stats))
+            else:
+                self._send_error(404, f"Unknown path {self.path}")
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            try:
+                body = json.loads(self.rfile.read(length) or b"{}")
+            except json.JSONDecodeError:
+                self._send_error(400, "Invalid JSON body")
+                return
+            path = self._path()
+            if path == "/chat/completions":
+                self._chat(body)
+            elif path == "/embeddings":
+                fake.count("embeddings")
+                time.sleep(fake.latency(fake.args.embedding_latency_ms))
+                error = fake.injected_error()
+                if error:
+                    self._send_error(error[0], error[2], error[1])
+                    return
+                self._send_json(200, fake.embeddings(body))
+            else:
+                self._send_error(404, f"Unknown path {self.path}")
+
+        def _chat(self, body: dict) -> None:
+            stream = bool(body.get("stream"))
+            fake.count("chat_stream" if stream else "chat")
+            time.sleep(fake.latency(fake.args.latency_ms))
+            error = fake.injected_error()
+            if error:
+                self._send_error(error[0], error[2], error[1])
+                return
+            if not stream:
+                time.sleep(fake.args.token_ms / 1000 * fake.estimate_tokens(fake.completion_text(body)) * fake.args.generation_share)
+                self._send_json(200, fake.chat_completion(body))
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+            try:
+                for i, chunk in enumerate(fake.stream_chunks(body)):
+                    if i:
+                        time.sleep(fake.args.token_ms / 1000)
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+    return Handler
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency-ms", type=float, default=600, help="median time to first token of chat completions")
+    parser.add_argument("--latency-sigma", type=float, default=0.35, help="log-normal spread of latencies")
+    parser.add_argument("--token-ms", type=float, default=15, help="delay per streamed token")
+    parser.add_argument("--generation-share", type=float, default=1.0,
+                        help="fraction of the per-token delay added to non-streamed completions")
+    parser.add_argument("--embedding-latency-ms", type=float, default=60)
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="fraction of requests with extra --slow-ms latency")
+    parser.add_argument("--slow-ms", type=float, default=5000)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests failing with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of requests failing with 429")
+    parser.add_argument("--retry-after-ms", type=int, default=500)
+    parser.add_argument("--embedding-dim", type=int, default=1536)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    fake = FakeOpenAI(args)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(fake))
+    server.daemon_threads = True
+    print(f"🧪 Fake OpenAI server on http://{args.host}:{args.port}/v1 "
+          f"(latency {args.latency_ms:.0f}ms, errors {args.error_rate:.1%}, 429s {args.rate_limit_rate:.1%})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"📊 {json.dumps(fake.stats)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+End-to-end load generator for the Django API.
+
+Drives /api/core/chat/, /api/core/translate/ and the test-mode endpoints
+(start, save, submit, summary) at a fixed concurrency and reports throughput
+and p50/p95/p99 latency per endpoint. Each worker loops over the selected
+scenarios (weighted with --mix) until --duration seconds or --requests
+scenario runs have passed.
+
+Point the server at benchmarks/fake_openai_server.py through
+OPENAI_API_BASE to measure the stack itself without API costs. The answer
+cache and single-flight layer absorb repeated questions, so use
+--unique-questions to measure cold pipeline runs.
+
+Usage (from BuddyAI/backend):
+    python benchmarks/load_test.py --concurrency 16 --duration 60 --mix chat=6,translate=2,tests=1
+    python benchmarks/load_test.py --requests 200 --levels textbook --json results.json
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+GOLDEN_QUESTIONS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden_questions.json")
+FALLBACK_QUESTIONS = [
+    "What is the solar system?",
+    "How do planets orbit the Sun?",
+    "What is a constellation?",
+    "Why does the Moon have phases?",
+]
+TRANSLATE_TEXT = (
+    "The Sun is a star at the centre of our solar system. "
+    "Eight planets travel around it in paths called orbits."
+)
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def load_questions() -> List[str]:
+    try:
+        with open(GOLDEN_QUESTIONS, "r", encoding="utf-8") as f:
+            return [item["question"] for item in json.load(f)["questions"]] or FALLBACK_QUESTIONS
+    except (OSError, ValueError, KeyError):
+        return FALLBACK_QUESTIONS
+
+
+class Recorder:
+    """Latencies and failures per endpoint label."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, Dict[str, int]] = {}
+
+    def record(self, label: str, seconds: float, error: Optional[str] = None) -> None:
+        with self._lock:
+            self.latencies.setdefault(label, []).append(seconds)
+            if error:
+                bucket = self.errors.setdefault(label, {})
+                bucket[error] = bucket.get(error, 0) + 1
+
+    def report(self, elapsed: float) -> Dict[str, Any]:
+        with self._lock:
+            labels = sorted(self.latencies)
+            rows = {}
+            for label in labels:
+                values = self.latencies[label]
+                errors = sum(self.errors.get(label, {}).values())
+                rows[label] = {
+                    "requests": len(values),
+                    "errors": errors,
+                    "error_breakdown": dict(self.errors.get(label, {})),
+                    "rps": round(len(values) / elapsed, 2) if elapsed else 0.0,
+                    "mean_ms": round(statistics.mean(values) * 1000, 1),
+                    "p50_ms": round(_percentile(values, 50) * 1000, 1),
+                    "p95_ms": round(_percentile(values, 95) * 1000, 1),
+                    "p99_ms": round(_percentile(values, 99) * 1000, 1),
+                    "max_ms": round(max(values) * 1000, 1),
+                }
+        return rows
+
+
+class LoadTester:
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.base_url = args.base_url.rstrip("/")
+        self.recorder = Recorder()
+        self.questions = load_questions()
+        self.levels = [level.strip() for level in args.levels.split(",") if level.strip()]
+        self.mix = self._parse_mix(args.mix)
+        self._stop = threading.Event()
+        self._runs = 0
+        self._runs_lock = threading.Lock()
+
+    @staticmethod
+    def _parse_mix(mix: str) -> List[Tuple[str, int]]:
+        weights = []
+        for part in mix.split(","):
+            name, _, weight = part.partition("=")
+            name = name.strip()
+            if name not in ("chat", "translate", "tests"):
+                raise SystemExit(f"Unknown scenario '{name}' (use chat, translate, tests)")
+            weights.append((name, int(weight or 1)))
+        return weights
+
+    def _post(self, label: str, path: str, payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        return self._request(label, path, json.dumps(payload).encode("utf-8"))
+
+    def _request(self, label: str, path: str, data: Optional[bytes] = None) -> Optional[Dict[str, Any]]:
+        """Timed request; returns the JSON body, or None on failure (recorded as an error)."""
+        request = urllib.request.Request(
+            self.base_url + path,
+            data=data,
+            headers={"Content-Type": "application/json"},
+            method="POST" if data is not None else "GET",
+        )
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=self.args.timeout) as response:
+                body = json.loads(response.read() or b"{}")
+            error = None if body.get("success", True) else "success=false"
+        except urllib.error.HTTPError as e:
+            body, error = None, f"http_{e.code}"
+        except Exception as e:
+            body, error = None, type(e).__name__
+        self.recorder.record(label, time.perf_counter() - start, error)
+        return body
+
+    def run_chat(self) -> None:
+        question = random.choice(self.questions)
+        if self.args.unique_questions:
+            question = f"{question} ({uuid.uuid4().hex[:8]})"
+        self._post("chat", "/api/core/chat/", {"message": question, "level": random.choice(self.levels), "history": []})
+
+    def run_translate(self) -> None:
+        text = TRANSLATE_TEXT if not self.args.unique_questions else f"{TRANSLATE_TEXT} ({uuid.uuid4().hex[:8]})"
+        self._post("translate", "/api/core/translate/", {"text": text, "sourceLang": "en", "targetLang": "ar"})
+
+    def run_tests(self) -> None:
+        question_ids = [f"q{i}" for i in range(1, 6)]
+        started = self._post("tests/start", "/api/tests/start/", {"chapterId": "chapter-1", "questionIds": question_ids})
+        test_id = (started or {}).get("testId")
+        if not test_id:
+            return
+        for qid in question_ids:
+            self._post("tests/save", f"/api/tests/{test_id}/save/", {"questionId": qid, "answer": "The Sun is a star."})
+        self._post("tests/submit", f"/api/tests/{test_id}/submit/", {})
+        self._request("tests/summary", f"/api/tests/{test_id}/summary/")
+
+    def _next_scenario(self) -> str:
+        names, weights = zip(*self.mix)
+        return random.choices(names, weights=weights)[0]
+
+    def _claim_run(self) -> bool:
+        if self._stop.is_set():
+            return False
+        with self._runs_lock:
+            if self.args.requests and self._runs >= self.args.requests:
+                return False
+            self._runs += 1
+            return True
+
+    def _worker(self, deadline: float) -> None:
+        while time.monotonic() < deadline and self._claim_run():
+            getattr(self, f"run_{self._next_scenario()}")()
+
+    def run(self) -> Dict[str, Any]:
+        duration = self.args.duration if not self.args.requests else 24 * 3600
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.args.concurrency) as pool:
+            futures = [pool.submit(self._worker, start + duration) for _ in range(self.args.concurrency)]
+            try:
+                for future in futures:
+                    future.result()
+            except KeyboardInterrupt:
+                self._stop.set()
+        elapsed = time.monotonic() - start
+        return {"elapsed_s": round(elapsed, 2), "concurrency": self.args.concurrency, "endpoints": self.recorder.report(elapsed)}
+
+
+def print_report(result: Dict[str, Any]) -> None:
+    rows = result["endpoints"]
+    total = sum(row["requests"] for row in rows.values())
+    print(f"\n📊 {total} requests in {result['elapsed_s']}s at concurrency {result['concurrency']} "
+          f"({total / result['elapsed_s']:.1f} req/s)\n")
+    print(f"{'endpoint':<15}{'requests':>9}{'errors':>8}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    for label, row in rows.items():
+        print(f"{label:<15}{row['requests']:>9}{row['errors']:>8}{row['rps']:>8}"
+              f"{row['p50_ms']:>9}{row['p95_ms']:>9}{row['p99_ms']:>9}{row['max_ms']:>9}")
+        if row["error_breakdown"]:
+            print(f"{'':<15}errors: {row['error_breakdown']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=30, help="seconds to run (ignored with --requests)")
+    parser.add_argument("--requests", type=int, default=0, help="stop after this many scenario runs")
+    parser.add_argument("--mix", default="chat=6,translate=2,tests=1", help="scenario weights")
+    parser.add_argument("--levels", default="textbook,detailed,advanced")
+    parser.add_argument("--unique-questions", action="store_true", help="defeat the answer and translation caches")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    tester = LoadTester(args)
+    print(f"🚀 Load testing {args.base_url} with {args.concurrency} workers ({args.mix})")
+    result = tester.run()
+    print_report(result)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+        print(f"\n💾 Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
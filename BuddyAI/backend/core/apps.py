@@ -1,6 +1,34 @@
+import os
+import sys
+
 from django.apps import AppConfig
 
 
+def _warmup_enabled() -> bool:
+    """
+    LLM_SERVICE_WARMUP=1/0 forces warm-up on or off. Unset, it is on in
+    server processes and off for other manage.py commands (migrate, test,
+    shell, ...) and for runserver's auto-reloader parent, so those never
+    touch the network.
+    """
+    setting = os.getenv("LLM_SERVICE_WARMUP")
+    if setting is not None:
+        return setting.lower() in ("1", "true", "yes")
+    if os.path.basename(sys.argv[0]) != "manage.py":
+        return True  # gunicorn, uvicorn, daphne, ...
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    if command != "runserver":
+        return False
+    return os.environ.get("RUN_MAIN") == "true" or "--noreload" in sys.argv
+
+
 class CoreConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "core"
+
+    def ready(self):
+        # Build the LLM service on a background thread at worker start so the
+        # first request does not pay for it and the readiness probe turns green
+        if _warmup_enabled():
+            from core.services.llm_service import llm_service
+            llm_service.start_background_warmup()
@@ -0,0 +1,245 @@
+"""
+Semantic answer cache for LLMService.get_chat_response.
+
+Questions are normalized and embedded; a new question reuses a stored
+response when it is an exact normalized match or when its embedding is
+within a cosine-similarity threshold of a cached question in the same mode.
+Entries are evicted LRU-first and expire after a TTL. The cache is persisted
+to disk so it survives restarts, tagged with the textbook build id (see
+answer_store.textbook_build_id): answers grounded on another build of the
+vector database are dropped at load.
+"""
+
+import atexit
+import base64
+import copy
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .cache_paths import cache_path
+
+_PUNCT_RE = re.compile(r"[^\w\s]")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_question(text: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace."""
+    text = _PUNCT_RE.sub(" ", (text or "").lower())
+    return _SPACE_RE.sub(" ", text).strip()
+
+
+def _encode_vector(vector: np.ndarray) -> str:
+    return base64.b64encode(vector.astype(np.float32).tobytes()).decode("ascii")
+
+
+def _decode_vector(data: str) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(data), dtype=np.float32)
+
+
+def _unit(vector: List[float]) -> np.ndarray:
+    arr = np.asarray(vector, dtype=np.float32)
+    norm = float(np.linalg.norm(arr))
+    return arr / norm if norm else arr
+
+
+class SemanticAnswerCache:
+    """
+    LRU + TTL cache of full chat responses keyed on (mode, question embedding).
+
+    Configuration (environment variables):
+    - ANSWER_CACHE_PATH: persistence file (default .buddy_cache/answer_cache.json)
+    - ANSWER_CACHE_THRESHOLD: cosine similarity needed for a hit (default 0.95)
+    - ANSWER_CACHE_MAX_ENTRIES: LRU capacity (default 1000)
+    - ANSWER_CACHE_TTL: entry lifetime in seconds (default 7 days)
+    - ANSWER_CACHE_SAVE_INTERVAL: min seconds between disk writes (default 30)
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        threshold: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        ttl_seconds: Optional[float] = None,
+        save_interval: Optional[float] = None,
+        build_id: Optional[str] = None,
+    ):
+        self.path = path or os.getenv("ANSWER_CACHE_PATH") or cache_path("answer_cache.json")
+        self.threshold = threshold if threshold is not None else float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+        self.max_entries = max_entries or int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else float(os.getenv("ANSWER_CACHE_TTL", str(7 * 24 * 3600)))
+        self.save_interval = save_interval if save_interval is not None else float(os.getenv("ANSWER_CACHE_SAVE_INTERVAL", "30"))
+        self.build_id = build_id
+
+        self._lock = threading.RLock()
+        self._entries: "OrderedDict[Tuple[str, str], Dict[str, Any]]" = OrderedDict()
+        self._dirty = False
+        self._last_save = 0.0
+        self.counters = {
+            "exact_hits": 0,
+            "semantic_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+            "expired": 0,
+        }
+        self.load()
+        atexit.register(self.save)
+
+    def _expired(self, entry: Dict[str, Any], now: float) -> bool:
+        return self.ttl_seconds > 0 and now - entry["created_at"] > self.ttl_seconds
+
+    def _hit(self, key: Tuple[str, str], counter: str) -> Dict[str, Any]:
+        self._entries.move_to_end(key)
+        self.counters[counter] += 1
+        return copy.deepcopy(self._entries[key]["response"])
+
+    def lookup(self, mode: str, question: str, embed: Callable[[str], List[float]]) -> Tuple[Optional[Dict[str, Any]], Optional[np.ndarray]]:
+        """
+        Find a cached response for the question.
+
+        Returns (response, vector); response is None on a miss. The question
+        itself (not its normalized form) is embedded, so the caller can reuse
+        the vector for retrieval and pass it back to store() instead of
+        embedding the question again.
+        """
+        normalized = normalize_question(question)
+        key = (mode, normalized)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if not self._expired(entry, now):
+                    return self._hit(key, "exact_hits"), entry["vector"]
+                del self._entries[key]
+                self.counters["expired"] += 1
+
+        vector = _unit(embed(question))
+
+        with self._lock:
+            keys = [k for k in self._entries if k[0] == mode]
+            if keys:
+                matrix = np.stack([self._entries[k]["vector"] for k in keys])
+                scores = matrix @ vector
+                best = int(np.argmax(scores))
+                best_key = keys[best]
+                if scores[best] >= self.threshold:
+                    if not self._expired(self._entries[best_key], now):
+                        print(f"🗃️ Answer cache hit (similarity {scores[best]:.3f}) for: '{question}'")
+                        return self._hit(best_key, "semantic_hits"), vector
+                    del self._entries[best_key]
+                    self.counters["expired"] += 1
+            self.counters["misses"] += 1
+        return None, vector
+
+    def store(self, mode: str, question: str, response: Dict[str, Any], vector: Optional[np.ndarray]) -> None:
+        """Insert a response, evicting the least recently used entry if full."""
+        if vector is None:
+            return
+        key = (mode, normalize_question(question))
+        with self._lock:
+            self._entries[key] = {
+                "question": question,
+                "vector": vector,
+                "response": copy.deepcopy(response),
+                "created_at": time.time(),
+            }
+            self._entries.move_to_end(key)
+            self.counters["stores"] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.counters["evictions"] += 1
+            self._dirty = True
+            should_save = time.time() - self._last_save >= self.save_interval
+        if should_save:
+            self.save()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._dirty = True
+            self.save()
+
+    def load(self) -> None:
+        """Load persisted entries, dropping any that have expired."""
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("build_id") != self.build_id:
+                print(f"🗃️ Dropping cached answers at {self.path}: built for another textbook database "
+                      f"({data.get('build_id')} != {self.build_id})")
+                with self._lock:
+                    self._dirty = True
+                return
+            now = time.time()
+            with self._lock:
+                for item in data.get("entries", []):
+                    entry = {
+                        "question": item["question"],
+                        "vector": _decode_vector(item["vector"]),
+                        "response": item["response"],
+                        "created_at": item["created_at"],
+                    }
+                    if not self._expired(entry, now):
+                        self._entries[(item["mode"], item["key"])] = entry
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            print(f"🗃️ Loaded {len(self._entries)} cached answers from {self.path}")
+        except Exception as e:
+            print(f"⚠️ Could not load answer cache: {e}")
+
+    def save(self) -> None:
+        """Write entries to disk atomically (no-op when nothing changed)."""
+        with self._lock:
+            if not self._dirty:
+                return
+            payload = {
+                "version": 1,
+                "build_id": self.build_id,
+                "entries": [
+                    {
+                        "mode": mode,
+                        "key": normalized,
+                        "question": entry["question"],
+                        "vector": _encode_vector(entry["vector"]),
+                        "response": entry["response"],
+                        "created_at": entry["created_at"],
+                    }
+                    for (mode, normalized), entry in self._entries.items()
+                ],
+            }
+            self._dirty = False
+            self._last_save = time.time()
+        try:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(payload, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            print(f"⚠️ Could not persist answer cache: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self.counters)
+            size = len(self._entries)
+        hits = counters["exact_hits"] + counters["semantic_hits"]
+        lookups = hits + counters["misses"]
+        return {
+            **counters,
+            "hits": hits,
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            "entries": size,
+            "max_entries": self.max_entries,
+            "threshold": self.threshold,
+            "ttl_seconds": self.ttl_seconds,
+            "build_id": self.build_id,
+            "path": self.path,
+        }
@@ -0,0 +1,127 @@
+"""
+Precomputed answer store for LLMService.get_chat_response.
+
+precompute_answers.py answers the canned suggested questions and the most
+frequent logged questions in every mode ahead of time and writes them to a
+versioned JSON file. The service serves an exact normalized match from
+memory, without retrieval or LLM calls.
+
+Answers are only valid for the vector database they were grounded on: the
+store records the textbook build id (a fingerprint of the chunk ids, which
+change on every rebuild, and the embedding model) and is ignored when it
+does not match the running database.
+"""
+
+import copy
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional
+
+from .answer_cache import normalize_question
+from .cache_paths import cache_path
+
+# Version 2 stores content-hash chunk_ids instead of positional Chroma ids
+STORE_VERSION = 2
+
+
+def textbook_build_id(chunk_ids: Iterable[Any], embedding_model: Optional[str] = None) -> str:
+    """Fingerprint of a textbook vector database build."""
+    digest = hashlib.sha1((embedding_model or "").encode("utf-8"))
+    for chunk_id in sorted(str(chunk_id) for chunk_id in chunk_ids):
+        digest.update(b"\0" + chunk_id.encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+class PrecomputedAnswerStore:
+    """
+    Read-only map of (mode, normalized question) -> chat response.
+
+    Configuration (environment variables):
+    - ANSWER_STORE_PATH: store file (default .buddy_cache/answer_store.json)
+    """
+
+    def __init__(self, path: Optional[str] = None, build_id: Optional[str] = None):
+        self.path = path or self.default_path()
+        self.build_id = build_id
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self.info: Dict[str, Any] = {}
+        self.status = "missing"
+        self.counters = {"hits": 0, "misses": 0}
+        self.load()
+
+    @staticmethod
+    def default_path() -> str:
+        return os.getenv("ANSWER_STORE_PATH") or cache_path("answer_store.json")
+
+    def load(self) -> None:
+        """Load the store file; a store built for another database is ignored."""
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"⚠️ Could not load precomputed answers: {e}")
+            self.status = "error"
+            return
+        info = {k: data.get(k) for k in ("version", "build_id", "created_at", "questions", "answers", "models")}
+        if data.get("version") != STORE_VERSION or (self.build_id and data.get("build_id") != self.build_id):
+            print(f"⚠️ Precomputed answers at {self.path} were built for another textbook database "
+                  f"({data.get('build_id')} != {self.build_id}); run precompute_answers.py again")
+            with self._lock:
+                self.info, self.status = info, "stale"
+            return
+        entries = {mode: dict(answers) for mode, answers in (data.get("entries") or {}).items()}
+        with self._lock:
+            self._entries, self.info, self.status = entries, info, "loaded"
+        print(f"🗃️ Loaded {sum(len(a) for a in entries.values())} precomputed answers from {self.path}")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(len(answers) for answers in self._entries.values())
+
+    def lookup(self, mode: str, question: str) -> Optional[Dict[str, Any]]:
+        """The precomputed response for an exact (normalized) question, or None."""
+        with self._lock:
+            answers = self._entries.get(mode)
+            if not answers:
+                return None
+            response = answers.get(normalize_question(question))
+            self.counters["hits" if response is not None else "misses"] += 1
+        return copy.deepcopy(response) if response is not None else None
+
+    @staticmethod
+    def write(path: str, build_id: str, entries: Dict[str, Dict[str, Dict[str, Any]]], **info: Any) -> None:
+        """Atomically write a store file (used by precompute_answers.py)."""
+        payload = {
+            "version": STORE_VERSION,
+            "build_id": build_id,
+            "created_at": time.time(),
+            "answers": sum(len(answers) for answers in entries.values()),
+            **info,
+            "entries": entries,
+        }
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self.counters)
+            entries = {mode: len(answers) for mode, answers in self._entries.items()}
+            info = dict(self.info)
+        return {
+            "status": self.status,
+            "path": self.path,
+            "build_id": self.build_id,
+            "store_build_id": info.get("build_id"),
+            "created_at": info.get("created_at"),
+            "entries": entries,
+            **counters,
+        }
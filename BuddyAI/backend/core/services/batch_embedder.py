@@ -0,0 +1,141 @@
+"""
+Batched, concurrent and resumable embedding for ingestion.
+
+Texts are embedded in fixed-size batches by a bounded pool of concurrent
+requests. Retryable failures (429, 5xx, timeouts) are retried with jittered
+exponential backoff that honours Retry-After; a rate limit seen by one
+worker pauses all of them, so the pool backs off as a whole instead of
+hammering the API.
+
+Every completed batch is written to the embedding cache right away, which
+is the checkpoint: when a build is interrupted, the next run finds those
+vectors in the cache and only embeds the batches that never finished.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional
+
+from .embedding_cache import CachedEmbeddings
+from .resilience import is_retryable, retry_after_seconds, retry_delay, status_code
+
+
+@dataclass
+class EmbedReport:
+    total: int = 0
+    resumed: int = 0
+    embedded: int = 0
+    batches: int = 0
+    retries: int = 0
+    seconds: float = 0.0
+
+    @property
+    def chunks_per_second(self) -> float:
+        return self.embedded / self.seconds if self.seconds else 0.0
+
+    def add(self, other: "EmbedReport") -> None:
+        """Accumulate another run (e.g. the next window of a streamed ingestion)."""
+        for name in ("total", "resumed", "embedded", "batches", "retries", "seconds"):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+
+    def summary(self) -> Dict[str, Any]:
+        return {**asdict(self), "seconds": round(self.seconds, 2), "chunks_per_second": round(self.chunks_per_second, 1)}
+
+
+class BatchEmbedder:
+    """
+    Embed many texts through a CachedEmbeddings, checkpointing each batch.
+
+    Configuration (environment variables):
+    - INGEST_EMBED_BATCH_SIZE: texts per embeddings request (default 100)
+    - INGEST_EMBED_CONCURRENCY: requests in flight (default 4)
+    - INGEST_EMBED_MAX_ATTEMPTS: attempts per batch before giving up (default 6)
+    """
+
+    def __init__(
+        self,
+        embeddings: CachedEmbeddings,
+        batch_size: Optional[int] = None,
+        concurrency: Optional[int] = None,
+        max_attempts: Optional[int] = None,
+    ):
+        self.embeddings = embeddings
+        self.batch_size = batch_size or int(os.getenv("INGEST_EMBED_BATCH_SIZE", "100"))
+        self.concurrency = concurrency or int(os.getenv("INGEST_EMBED_CONCURRENCY", "4"))
+        self.max_attempts = max_attempts or int(os.getenv("INGEST_EMBED_MAX_ATTEMPTS", "6"))
+        self._lock = threading.Lock()
+        self._paused_until = 0.0
+        self._stop = threading.Event()
+
+    def _wait_for_pause(self) -> None:
+        while not self._stop.is_set():
+            with self._lock:
+                remaining = self._paused_until - time.monotonic()
+            if remaining <= 0:
+                return
+            time.sleep(min(remaining, 1.0))
+
+    def _embed_batch(self, texts: List[str], report: EmbedReport) -> List[List[float]]:
+        for attempt in range(self.max_attempts):
+            self._wait_for_pause()
+            if self._stop.is_set():
+                raise RuntimeError("embedding stopped after another batch failed")
+            try:
+                return self.embeddings.underlying.embed_documents(texts)
+            except Exception as e:
+                if not is_retryable(e) or attempt == self.max_attempts - 1:
+                    raise
+                delay = retry_delay(attempt, retry_after_seconds(e), base=1.0, cap=60.0)
+                with self._lock:
+                    report.retries += 1
+                    if status_code(e) == 429:
+                        # Everyone waits out a rate limit, not just this worker
+                        self._paused_until = max(self._paused_until, time.monotonic() + delay)
+                print(f"⚠️ Embedding batch failed ({e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+        raise RuntimeError("unreachable")
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """Vectors for all texts; raises if a batch fails for good (finished batches stay checkpointed)."""
+        start = time.perf_counter()
+        self._stop.clear()
+        vectors: List[Optional[List[float]]] = self.embeddings.cached_vectors(texts) if texts else []
+        pending = [i for i, vector in enumerate(vectors) if vector is None]
+        batches = [pending[i:i + self.batch_size] for i in range(0, len(pending), self.batch_size)]
+        report = EmbedReport(total=len(texts), resumed=len(texts) - len(pending))
+        self.last_report = report
+        if report.resumed:
+            print(f"♻️ {report.resumed} of {len(texts)} chunks already embedded (checkpoint)")
+        if not batches:
+            return vectors
+
+        def run(indexes: List[int]) -> None:
+            batch_texts = [texts[i] for i in indexes]
+            batch_vectors = self._embed_batch(batch_texts, report)
+            self.embeddings.store_vectors(batch_texts, batch_vectors)
+            with self._lock:
+                for i, vector in zip(indexes, batch_vectors):
+                    vectors[i] = vector
+                report.batches += 1
+                report.embedded += len(indexes)
+                elapsed = time.perf_counter() - start
+                print(f"🧮 Embedded {report.embedded}/{len(pending)} chunks ({report.embedded / elapsed:.1f} chunks/s)")
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="ingest-embed") as pool:
+            futures = [pool.submit(run, indexes) for indexes in batches]
+            done, not_done = wait(futures, return_when=FIRST_EXCEPTION)
+            failed = next((f for f in done if f.exception() is not None), None)
+            if failed is not None:
+                self._stop.set()
+                for future in not_done:
+                    future.cancel()
+        report.seconds = time.perf_counter() - start
+        if failed is not None:
+            print(f"❌ Embedding stopped after {report.embedded} of {len(pending)} chunks; re-run to resume")
+            raise failed.exception()
+        print(f"✅ Embedded {report.embedded} chunks in {report.batches} batches "
+              f"({report.chunks_per_second:.1f} chunks/s, {report.retries} retries)")
+        return vectors
@@ -0,0 +1,109 @@
+"""
+In-memory store for bulk question-answering jobs.
+
+Large batches run in the background and are polled by job id. Jobs live in
+the memory of the worker that accepted them, so polling must reach the same
+worker process (true for the default single-process runserver/gunicorn
+setups used here). Finished jobs are pruned after a TTL.
+"""
+
+import os
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+
+class BatchJobStore:
+    """
+    Thread-safe registry of batch jobs and their per-item results.
+
+    Configuration (environment variables):
+    - BATCH_JOB_TTL: seconds a finished job stays available (default 3600)
+    - BATCH_MAX_JOBS: max jobs kept, oldest finished ones pruned first (default 100)
+    """
+
+    def __init__(self, ttl_seconds: Optional[float] = None, max_jobs: Optional[int] = None):
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else float(os.getenv("BATCH_JOB_TTL", "3600"))
+        self.max_jobs = max_jobs or int(os.getenv("BATCH_MAX_JOBS", "100"))
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+
+    def create(self, total: int) -> str:
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._prune()
+            self._jobs[job_id] = {
+                "job_id": job_id,
+                "status": "queued",
+                "total": total,
+                "completed": 0,
+                "failed": 0,
+                "results": [None] * total,
+                "error": None,
+                "created_at": time.time(),
+                "started_at": None,
+                "finished_at": None,
+            }
+        return job_id
+
+    def start(self, job_id: str) -> None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job["status"] = "running"
+                job["started_at"] = time.time()
+
+    def set_result(self, job_id: str, index: int, result: Dict[str, Any]) -> None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job["results"][index] is not None:
+                return
+            job["results"][index] = result
+            job["completed"] += 1
+            if not result.get("success"):
+                job["failed"] += 1
+
+    def finish(self, job_id: str, error: Optional[str] = None) -> None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job["status"] = "failed" if error else "completed"
+                job["error"] = error
+                job["finished_at"] = time.time()
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Snapshot of a job (results of unfinished items are None)."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            snapshot = dict(job)
+            snapshot["results"] = list(job["results"])
+        end = snapshot["finished_at"] or time.time()
+        snapshot["elapsed_ms"] = round((end - snapshot["started_at"]) * 1000, 1) if snapshot["started_at"] else 0.0
+        return snapshot
+
+    def _prune(self) -> None:
+        """Drop expired finished jobs, then the oldest finished ones over capacity (lock held)."""
+        now = time.time()
+        for job_id, job in list(self._jobs.items()):
+            if job["finished_at"] and now - job["finished_at"] > self.ttl_seconds:
+                del self._jobs[job_id]
+        finished: List[Dict[str, Any]] = sorted(
+            (job for job in self._jobs.values() if job["finished_at"]),
+            key=lambda job: job["finished_at"],
+        )
+        while len(self._jobs) >= self.max_jobs and finished:
+            del self._jobs[finished.pop(0)["job_id"]]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            statuses = [job["status"] for job in self._jobs.values()]
+        return {
+            "jobs": len(statuses),
+            "running": statuses.count("running"),
+            "queued": statuses.count("queued"),
+            "completed": statuses.count("completed"),
+            "failed": statuses.count("failed"),
+        }
@@ -0,0 +1,24 @@
+"""
+Location of on-disk caches used by the backend services.
+
+Everything lives under BUDDY_CACHE_DIR (default: BuddyAI/backend/.buddy_cache)
+so caches survive restarts and can be wiped with a single rm -rf.
+"""
+
+import os
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def cache_dir() -> str:
+    """Return the cache root, creating it if needed."""
+    path = os.getenv("BUDDY_CACHE_DIR") or os.path.join(BACKEND_DIR, ".buddy_cache")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def cache_path(*parts: str) -> str:
+    """Return a path inside the cache root; parent directories are created."""
+    path = os.path.join(cache_dir(), *parts)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
@@ -0,0 +1,101 @@
+"""
+Token-budgeted packing of retrieved chunks into a prompt context.
+
+Chunks arrive in relevance order and are added greedily while they fit the
+mode's budget. A chunk that does not fit is cut at a sentence boundary when
+a useful part of it still fits, and text repeated from an already packed
+chunk (the splitter's overlap) is dropped first.
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional
+
+from langchain.schema import Document
+
+from .tokens import count_tokens
+
+SEPARATOR = "\n\n"
+MIN_PARTIAL_TOKENS = 40
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+@dataclass
+class PackedContext:
+    text: str
+    tokens: int
+    chunks: List[Document] = field(default_factory=list)
+    truncated: int = 0
+    dropped: int = 0
+
+
+def strip_overlap(text: str, packed_texts: List[str], min_overlap: int = 30, window: int = 300) -> str:
+    """Remove a prefix of text that repeats the tail of an already packed chunk."""
+    for previous in packed_texts:
+        tail = previous[-window:]
+        for size in range(min(len(tail), len(text)), min_overlap - 1, -1):
+            if text.startswith(tail[-size:]):
+                return text[size:].lstrip()
+    return text
+
+
+def truncate_to_sentences(text: str, budget: int, model: Optional[str] = None) -> str:
+    """Longest prefix of whole sentences within budget tokens ("" if none fits)."""
+    kept: List[str] = []
+    used = 0
+    for sentence in _SENTENCE_RE.split(text.strip()):
+        tokens = count_tokens(sentence + " ", model)
+        if used + tokens > budget:
+            break
+        kept.append(sentence)
+        used += tokens
+    return " ".join(kept)
+
+
+def pack_context(
+    chunks: List[Document],
+    budget: int,
+    render: Callable[[Document, str], str],
+    model: Optional[str] = None,
+) -> PackedContext:
+    """
+    Pack chunks (best first) into at most `budget` tokens.
+
+    render(chunk, text) formats one chunk for the prompt, e.g. with a page
+    label; text is the (possibly de-overlapped or truncated) chunk content.
+    """
+    pieces: List[str] = []
+    packed_chunks: List[Document] = []
+    packed_texts: List[str] = []
+    used = 0
+    truncated = dropped = 0
+    separator_tokens = count_tokens(SEPARATOR, model)
+
+    for chunk in chunks:
+        content = strip_overlap(chunk.page_content.strip(), packed_texts)
+        if not content:
+            dropped += 1
+            continue
+        cost = separator_tokens if pieces else 0
+        piece = render(chunk, content)
+        tokens = count_tokens(piece, model)
+        if used + cost + tokens <= budget:
+            pieces.append(piece)
+        else:
+            label_tokens = count_tokens(render(chunk, ""), model)
+            remaining = budget - used - cost - label_tokens
+            partial = truncate_to_sentences(content, remaining, model) if remaining >= MIN_PARTIAL_TOKENS else ""
+            if not partial:
+                dropped += 1
+                continue
+            piece = render(chunk, partial)
+            tokens = count_tokens(piece, model)
+            pieces.append(piece)
+            truncated += 1
+            content = partial
+        used += cost + tokens
+        packed_chunks.append(chunk)
+        packed_texts.append(content)
+
+    text = SEPARATOR.join(pieces)
+    return PackedContext(text=text, tokens=count_tokens(text, model), chunks=packed_chunks, truncated=truncated, dropped=dropped)
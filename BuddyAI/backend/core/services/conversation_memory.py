@@ -0,0 +1,207 @@
+"""
+Per-session conversation memory with summarization compaction.
+
+Each chat session keeps its most recent turns verbatim and folds older turns
+into a rolling summary once the turns outgrow a token budget, so follow-up
+questions get context while the prompt size stays flat. Compaction runs in
+the background; until it finishes, the oldest turns are simply left out of
+the prompt. Sessions are evicted after an idle TTL and beyond a maximum
+count, so worker memory stays bounded.
+
+Sessions live in the memory of the worker that served them. A worker that
+does not know a session seeds it from the history the client sent along.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Executor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from .context_packer import truncate_to_sentences
+from .tokens import count_tokens
+
+# summarize(previous_summary, turns) -> new summary
+Summarizer = Callable[[str, List[Dict[str, str]]], str]
+
+
+@dataclass
+class ConversationContext:
+    """What a prompt gets from memory: the rolling summary and the recent turns."""
+    summary: str = ""
+    turns: List[Dict[str, str]] = field(default_factory=list)
+
+    @property
+    def empty(self) -> bool:
+        return not self.summary and not self.turns
+
+
+@dataclass
+class _Session:
+    summary: str = ""
+    turns: List[Dict[str, str]] = field(default_factory=list)
+    last_used: float = field(default_factory=time.time)
+    compacting: bool = False
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+class ConversationMemory:
+    """
+    Bounded, per-session conversation memory.
+
+    Configuration (environment variables):
+    - CONVERSATION_MEMORY_TOKENS: token budget of the verbatim turns (default 800)
+    - CONVERSATION_MESSAGE_TOKENS: max tokens kept of a single message (default 300)
+    - CONVERSATION_KEEP_TURNS: messages always kept verbatim (default 2)
+    - CONVERSATION_MAX_SESSIONS: sessions kept per worker, LRU evicted (default 2000)
+    - CONVERSATION_TTL: seconds an idle session is kept (default 7200)
+    """
+
+    def __init__(self, summarize: Summarizer, executor: Optional[Executor] = None, model: Optional[str] = None):
+        self.summarize = summarize
+        self.executor = executor
+        self.model = model
+        self.token_budget = int(os.getenv("CONVERSATION_MEMORY_TOKENS", "800"))
+        self.message_tokens = int(os.getenv("CONVERSATION_MESSAGE_TOKENS", "300"))
+        self.keep_turns = int(os.getenv("CONVERSATION_KEEP_TURNS", "2"))
+        self.max_sessions = int(os.getenv("CONVERSATION_MAX_SESSIONS", "2000"))
+        self.ttl_seconds = float(os.getenv("CONVERSATION_TTL", "7200"))
+        self._lock = threading.Lock()
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+        self.counters = {"compactions": 0, "compaction_errors": 0, "seeded": 0, "evicted": 0}
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            self.counters[counter] += 1
+
+    def _session(self, session_id: str, create: bool = False) -> Optional[_Session]:
+        now = time.time()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None and now - session.last_used > self.ttl_seconds:
+                del self._sessions[session_id]
+                session = None
+            if session is None and create:
+                session = self._sessions[session_id] = _Session()
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+                    self.counters["evicted"] += 1
+            if session is not None:
+                session.last_used = now
+                self._sessions.move_to_end(session_id)
+            return session
+
+    def _message(self, role: str, content: str) -> Dict[str, str]:
+        content = (content or "").strip()
+        if count_tokens(content, self.model) > self.message_tokens:
+            content = truncate_to_sentences(content, self.message_tokens, self.model) or content[: self.message_tokens * 4]
+        return {"role": role, "content": content}
+
+    def _tokens(self, turns: List[Dict[str, str]]) -> int:
+        return sum(count_tokens(turn["content"], self.model) + 3 for turn in turns)
+
+    def context(self, session_id: Optional[str], history: Optional[List[Dict[str, Any]]] = None, question: Optional[str] = None) -> ConversationContext:
+        """
+        Summary and the most recent turns of the session that fit the budget.
+        An unknown session is seeded from `history` (client-side turns, the
+        current question at its end is skipped).
+        """
+        if not session_id:
+            return ConversationContext()
+        session = self._session(session_id)
+        if session is None and history:
+            session = self._seed(session_id, history, question)
+        if session is None:
+            return ConversationContext()
+        with session.lock:
+            kept: List[Dict[str, str]] = []
+            used = 0
+            for turn in reversed(session.turns):
+                tokens = self._tokens([turn])
+                if kept and used + tokens > self.token_budget:
+                    break
+                kept.insert(0, turn)
+                used += tokens
+            return ConversationContext(summary=session.summary, turns=[dict(turn) for turn in kept])
+
+    def _seed(self, session_id: str, history: List[Dict[str, Any]], question: Optional[str]) -> Optional[_Session]:
+        turns = [
+            self._message(item["role"], item.get("content") or "")
+            for item in history
+            if isinstance(item, dict) and item.get("role") in ("user", "assistant") and (item.get("content") or "").strip()
+        ]
+        if turns and question and turns[-1]["role"] == "user" and turns[-1]["content"] == question.strip():
+            turns = turns[:-1]
+        if not turns:
+            return None
+        session = self._session(session_id, create=True)
+        with session.lock:
+            session.turns = turns
+        self._count("seeded")
+        self._schedule_compaction(session_id, session)
+        return session
+
+    def record(self, session_id: Optional[str], question: str, answer: str) -> None:
+        """Append a question/answer turn and compact the session if it outgrew its budget."""
+        if not session_id:
+            return
+        session = self._session(session_id, create=True)
+        with session.lock:
+            session.turns.extend([self._message("user", question), self._message("assistant", answer)])
+        self._schedule_compaction(session_id, session)
+
+    def _schedule_compaction(self, session_id: str, session: _Session) -> None:
+        with session.lock:
+            if session.compacting or self._tokens(session.turns) <= self.token_budget:
+                return
+            session.compacting = True
+        if self.executor is None:
+            self._compact(session_id, session)
+        else:
+            self.executor.submit(self._compact, session_id, session)
+
+    def _compact(self, session_id: str, session: _Session) -> None:
+        """Fold the oldest turns into the summary until the rest fit half the budget."""
+        try:
+            with session.lock:
+                turns = list(session.turns)
+                summary = session.summary
+            # Summarize whole question/answer pairs, keeping the latest ones verbatim
+            split = 0
+            while len(turns) - split > self.keep_turns and self._tokens(turns[split:]) > self.token_budget // 2:
+                split += 2 if split + 1 < len(turns) and turns[split]["role"] == "user" else 1
+            if split == 0:
+                return
+            folded = turns[:split]
+            try:
+                new_summary = self.summarize(summary, folded).strip()
+            except Exception as e:
+                print(f"⚠️ Conversation summary failed for session {session_id[:8]}, dropping oldest turns: {e}")
+                self._count("compaction_errors")
+                new_summary = summary
+            with session.lock:
+                # Turns recorded meanwhile were appended after the folded ones
+                session.turns = session.turns[len(folded):]
+                session.summary = new_summary
+            self._count("compactions")
+        finally:
+            with session.lock:
+                session.compacting = False
+
+    def forget(self, session_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            sessions = list(self._sessions.values())
+            counters = dict(self.counters)
+        return {
+            "sessions": len(sessions),
+            "max_sessions": self.max_sessions,
+            "token_budget": self.token_budget,
+            "summarized_sessions": sum(1 for session in sessions if session.summary),
+            **counters,
+        }
@@ -0,0 +1,210 @@
+"""
+Persistent, content-addressed cache around an embeddings model.
+
+Vectors are stored in a local sqlite database keyed by (model name, sha256 of
+the text), so repeated questions and the start-up self-test never pay for a
+second embeddings API call. Concurrent requests for the same uncached text
+share a single in-flight API call.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from concurrent.futures import Future
+from typing import Dict, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+from . import metrics
+from .cache_paths import cache_path
+
+
+def _text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _to_blob(vector: List[float]) -> bytes:
+    return array("f", vector).tobytes()
+
+
+def _from_blob(blob: bytes) -> List[float]:
+    values = array("f")
+    values.frombytes(blob)
+    return values.tolist()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper backed by a sqlite store with in-flight deduplication.
+
+    Configuration (environment variables):
+    - EMBEDDING_CACHE_PATH: sqlite file (default .buddy_cache/embeddings.sqlite3)
+    """
+
+    def __init__(self, underlying: Embeddings, model_name: str, path: Optional[str] = None):
+        self.underlying = underlying
+        self.model_name = model_name
+        self.path = path or os.getenv("EMBEDDING_CACHE_PATH") or cache_path("embeddings.sqlite3")
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._in_flight: Dict[str, Future] = {}
+        self.counters = {
+            "hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "api_calls": 0,
+            "api_ms": 0.0,
+            "errors": 0,
+        }
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " model TEXT NOT NULL,"
+                " text_hash TEXT NOT NULL,"
+                " vector BLOB NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " PRIMARY KEY (model, text_hash))"
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        """One connection per thread; sqlite connections are not thread-safe."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _get_many(self, hashes: List[str]) -> Dict[str, List[float]]:
+        if not hashes:
+            return {}
+        found: Dict[str, List[float]] = {}
+        conn = self._connection()
+        # Stay well below sqlite's bound-parameter limit
+        for start in range(0, len(hashes), 500):
+            batch = hashes[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = conn.execute(
+                f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                [self.model_name, *batch],
+            ).fetchall()
+            for text_hash, blob in rows:
+                found[text_hash] = _from_blob(blob)
+        return found
+
+    def _put_many(self, items: Dict[str, List[float]]) -> None:
+        if not items:
+            return
+        now = time.time()
+        with self._connection() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vector, created_at) VALUES (?, ?, ?, ?)",
+                [(self.model_name, h, _to_blob(v), now) for h, v in items.items()],
+            )
+
+    def _call_api(self, texts: List[str]) -> List[List[float]]:
+        start = time.perf_counter()
+        try:
+            with metrics.timed("embedding"):
+                if len(texts) == 1:
+                    vectors = [self.underlying.embed_query(texts[0])]
+                else:
+                    vectors = self.underlying.embed_documents(texts)
+        except Exception:
+            with self._lock:
+                self.counters["errors"] += 1
+            raise
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self.counters["api_calls"] += 1
+            self.counters["api_ms"] += elapsed_ms
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        key = _text_hash(text)
+        cached = self._get_many([key]).get(key)
+        if cached is not None:
+            with self._lock:
+                self.counters["hits"] += 1
+            metrics.cache_event("embedding", "hit")
+            return cached
+
+        with self._lock:
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._in_flight[key] = future
+                self.counters["misses"] += 1
+            else:
+                self.counters["coalesced"] += 1
+        metrics.cache_event("embedding", "miss" if leader else "coalesced")
+        if not leader:
+            return future.result()
+
+        try:
+            vector = self._call_api([text])[0]
+            self._put_many({key: vector})
+            future.set_result(vector)
+            return vector
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        hashes = [_text_hash(t) for t in texts]
+        found = self._get_many(list(dict.fromkeys(hashes)))
+        missing: Dict[str, str] = {}
+        for text, h in zip(texts, hashes):
+            if h not in found:
+                missing.setdefault(h, text)
+        with self._lock:
+            self.counters["hits"] += len(texts) - sum(1 for h in hashes if h in missing)
+            self.counters["misses"] += len(missing)
+        metrics.cache_event("embedding", "hit", len(texts) - sum(1 for h in hashes if h in missing))
+        metrics.cache_event("embedding", "miss", len(missing))
+        if missing:
+            vectors = self._call_api(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            self._put_many(computed)
+            found.update(computed)
+        return [found[h] for h in hashes]
+
+    def cached_vectors(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """Stored vectors of the texts (None where not cached), without calling the API."""
+        hashes = [_text_hash(t) for t in texts]
+        found = self._get_many(list(dict.fromkeys(hashes)))
+        return [found.get(h) for h in hashes]
+
+    def store_vectors(self, texts: List[str], vectors: List[List[float]]) -> None:
+        """Store vectors computed outside the cache (e.g. by a batch embedder)."""
+        self._put_many({_text_hash(t): v for t, v in zip(texts, vectors)})
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            counters = dict(self.counters)
+        served = counters["hits"] + counters["coalesced"]
+        lookups = served + counters["misses"]
+        avg_api_ms = counters["api_ms"] / counters["api_calls"] if counters["api_calls"] else 0.0
+        try:
+            entries = self._connection().execute(
+                "SELECT COUNT(*) FROM embeddings WHERE model = ?", (self.model_name,)
+            ).fetchone()[0]
+        except sqlite3.Error:
+            entries = None
+        return {
+            **{k: v for k, v in counters.items() if k != "api_ms"},
+            "model": self.model_name,
+            "entries": entries,
+            "hit_rate": round(served / lookups, 3) if lookups else 0.0,
+            "avg_api_ms": round(avg_api_ms, 1),
+            "saved_ms": round(served * avg_api_ms, 1),
+            "path": self.path,
+        }
@@ -3,6 +3,8 @@ import requests
 from typing import List, Dict, Any
 from django.conf import settings
 
+from . import metrics
+
 class GoogleSearchService:
     """
     Service for searching images and videos using Google Custom Search API
@@ -14,6 +16,7 @@ class GoogleSearchService:
         self.search_engine_id = os.getenv('GOOGLE_SEARCH_ENGINE_ID', settings.GOOGLE_SEARCH_ENGINE_ID if hasattr(settings, 'GOOGLE_SEARCH_ENGINE_ID') else None)
         self.base_url = "https://www.googleapis.com/customsearch/v1"
     
+    @metrics.timed("media_search")
     def search_images(self, query: str, num_results: int = 10) -> List[Dict[str, Any]]:
         """
         Search for images related to the query
@@ -67,8 +70,10 @@ class GoogleSearchService:
             
         except Exception as e:
             print(f"❌ Error searching images: {e}")
+            metrics.count_error("media_search")
             return self._get_fallback_images(query)
     
+    @metrics.timed("media_search")
     def search_videos(self, query: str, num_results: int = 10) -> List[Dict[str, Any]]:
         """
         Search for videos related to the query (YouTube)
@@ -117,6 +122,7 @@ class GoogleSearchService:
             
         except Exception as e:
             print(f"❌ Error searching videos: {e}")
+            metrics.count_error("media_search")
             return self._get_fallback_videos(query)
     
     def _extract_youtube_thumbnail(self, youtube_url: str) -> str:
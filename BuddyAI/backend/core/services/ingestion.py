@@ -0,0 +1,442 @@
+"""
+Incremental textbook ingestion into the Chroma vector store.
+
+Every chunk is stored under a content-derived id: a hash of its source,
+its text, the chunking parameters and the embedding model. Re-ingesting therefore only
+embeds chunks whose id is not in the store yet, deletes ids that are no
+longer produced, and merely updates the metadata (page and chunk numbers)
+of unchanged chunks that moved. The store is modified in place, so a
+running server keeps answering from it during an update.
+
+New chunks can be embedded by a BatchEmbedder (batched, concurrent,
+rate-limit aware and resumable from the embedding cache) and then written
+with their precomputed vectors.
+
+Chunks are tagged with their source, chapter and section (from the
+headings in the text) and, when configured, the grade, so retrieval can
+filter on them inside the index query. Several textbooks can share one
+store: syncing only ever touches the chunks of its own source, and the
+source is part of the id, so a passage printed in two books is stored
+once per book.
+
+A manifest (ingest_manifest.json in the database directory) records the
+PDF hash, the chunking parameters and the chunk ids of the last run; when
+none of them changed, ingestion stops before touching the store.
+"""
+
+import hashlib
+import json
+import os
+import re
+import time
+from dataclasses import asdict, dataclass, field
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from langchain.schema import Document
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from .batch_embedder import BatchEmbedder, EmbedReport
+from .lexical_index import BM25Index
+from .suggestion_generator import KeyTermIndex
+from .token_chunker import TOKEN_CHUNK_OVERLAP, TOKEN_CHUNK_SIZE, TokenSentenceChunker
+
+MANIFEST_FILE = "ingest_manifest.json"
+# Version 2 hashes the source into the chunk ids
+MANIFEST_VERSION = 2
+
+TEXTBOOK_PATHS = [
+    "../../knowledge-base/textbook.pdf",
+    "../knowledge-base/textbook.pdf",
+    "knowledge-base/textbook.pdf",
+    "../../../knowledge-base/textbook.pdf"
+]
+# "recursive": RecursiveCharacterTextSplitter, sizes in characters
+# "token": TokenSentenceChunker, sizes in tokens (TEXTBOOK_TOKEN_CHUNK_SIZE/_OVERLAP)
+CHUNKERS = ("recursive", "token")
+TEXTBOOK_CHUNKER = os.getenv("TEXTBOOK_CHUNKER", "recursive").strip().lower()
+CHUNK_SIZE = int(os.getenv("TEXTBOOK_CHUNK_SIZE", "1000"))
+CHUNK_OVERLAP = int(os.getenv("TEXTBOOK_CHUNK_OVERLAP", "200"))
+TEXTBOOK_SOURCE = "textbook.pdf"
+TEXTBOOK_GRADE = int(os.getenv("TEXTBOOK_GRADE", "0")) or None
+# Bump when split_textbook() starts storing different metadata
+METADATA_VERSION = 3
+
+# Numbered section headings ("12.1 Stars and Constellations") and chapter titles
+_SECTION_RE = re.compile(r"^\s*(\d{1,2})\.(\d{1,2})\s+([A-Z][A-Za-z ,'’:&()-]{2,80}?)\s*$", re.MULTILINE)
+_CHAPTER_RE = re.compile(r"^\s*chapter\s+(\d{1,2})\b", re.IGNORECASE | re.MULTILINE)
+
+
+def find_textbook_pdf() -> Optional[str]:
+    for path in TEXTBOOK_PATHS:
+        if os.path.exists(path):
+            return path
+    return None
+
+
+class SectionTagger:
+    """
+    Add chapter and section metadata from the headings in chunk texts, one
+    chunk at a time in reading order. A chunk gets the first new heading it
+    contains, otherwise the last one seen before it. Sections only move
+    forward (summaries repeat earlier headings) and numbers that contradict
+    a "Chapter N" title are ignored.
+    """
+
+    def __init__(self):
+        self.chapter: Optional[str] = None
+        self.section: Optional[str] = None
+        self.position = (0, 0)
+
+    def tag(self, chunk: Document) -> None:
+        text = chunk.page_content
+        chapters = _CHAPTER_RE.findall(text)
+        if chapters and chapters[0] != self.chapter:
+            self.chapter, self.section, self.position = chapters[0], None, (0, 0)
+        headings = [
+            ((int(number), int(sub)), number, f"{number}.{sub} {title.strip()}")
+            for number, sub, title in _SECTION_RE.findall(text)
+            if (self.chapter is None or number == self.chapter) and (int(number), int(sub)) >= self.position
+        ]
+        if headings:
+            self.position, self.chapter, self.section = headings[0]
+        if self.chapter:
+            chunk.metadata["chapter"] = self.chapter
+        if self.section:
+            chunk.metadata["section"] = self.section
+        if headings:
+            self.position, self.chapter, self.section = max(headings)
+
+
+def tag_sections(chunks: List[Document]) -> None:
+    tagger = SectionTagger()
+    for chunk in chunks:
+        tagger.tag(chunk)
+
+
+def chunking_params(chunker: str = TEXTBOOK_CHUNKER, chunk_size: Optional[int] = None, chunk_overlap: Optional[int] = None) -> Dict[str, Any]:
+    """Chunker settings with the defaults of its unit, as hashed into chunk ids and kept in the manifest."""
+    if chunker not in CHUNKERS:
+        raise ValueError(f"Unknown chunker '{chunker}' (expected one of {', '.join(CHUNKERS)})")
+    if chunker == "token":
+        params = {"splitter": "token_sentence", "chunk_size": chunk_size or TOKEN_CHUNK_SIZE,
+                  "chunk_overlap": TOKEN_CHUNK_OVERLAP if chunk_overlap is None else chunk_overlap, "unit": "tokens"}
+    else:
+        # Unchanged from before the token chunker so existing chunk ids stay valid
+        params = {"splitter": "recursive_character", "chunk_size": chunk_size or CHUNK_SIZE,
+                  "chunk_overlap": CHUNK_OVERLAP if chunk_overlap is None else chunk_overlap}
+    if params["chunk_overlap"] >= params["chunk_size"]:
+        raise ValueError("chunk_overlap must be smaller than chunk_size")
+    return params
+
+
+def _recursive_chunks(pages: Iterable[Document], chunk_size: int, chunk_overlap: int) -> Iterator[Document]:
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        length_function=len,
+    )
+    for page in pages:
+        # The splitter cuts every page on its own, so this matches splitting the whole book
+        yield from text_splitter.split_documents([page])
+
+
+def iter_textbook_chunks(
+    pages: Iterable[Document],
+    chunk_size: Optional[int] = None,
+    chunk_overlap: Optional[int] = None,
+    source: str = TEXTBOOK_SOURCE,
+    grade: Optional[int] = TEXTBOOK_GRADE,
+    chunker: str = TEXTBOOK_CHUNKER,
+) -> Iterator[Document]:
+    """
+    Split pages into chunks with source, chunk_id, page_number,
+    page_number_end, chapter/section and grade metadata, lazily: pages can
+    come from a generator such as pdf_pages.iter_pdf_pages() and each page
+    is released once it is split. page_number and page_number_end are the
+    1-based first and last page of the chunk (equal unless a token chunk
+    spans pages). Sizes are in the chunker's unit (see chunking_params);
+    token chunks also carry the 0-based page_end and tokens.
+    """
+    params = chunking_params(chunker, chunk_size, chunk_overlap)
+    if chunker == "token":
+        chunks = TokenSentenceChunker(params["chunk_size"], params["chunk_overlap"]).split_pages(pages)
+    else:
+        chunks = _recursive_chunks(pages, params["chunk_size"], params["chunk_overlap"])
+    tagger = SectionTagger()
+    for chunk_id, chunk in enumerate(chunks):
+        page = chunk.metadata.get('page', 0)
+        chunk.metadata.update({
+            'source': source,
+            'chunk_id': chunk_id,
+            'page_number': page + 1,
+            'page_number_end': chunk.metadata.get('page_end', page) + 1
+        })
+        if grade is not None:
+            chunk.metadata['grade'] = int(grade)
+        tagger.tag(chunk)
+        yield chunk
+
+
+def split_textbook(
+    pages: List[Document],
+    chunk_size: Optional[int] = None,
+    chunk_overlap: Optional[int] = None,
+    source: str = TEXTBOOK_SOURCE,
+    grade: Optional[int] = TEXTBOOK_GRADE,
+    chunker: str = TEXTBOOK_CHUNKER,
+) -> List[Document]:
+    """Split loaded PDF pages into chunks with source, chunk_id, page_number, chapter/section and grade metadata."""
+    return list(iter_textbook_chunks(pages, chunk_size, chunk_overlap, source, grade, chunker))
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_hash(text: str, chunk_params: Dict[str, Any], embedding_model: str, source: Optional[str] = None) -> str:
+    """Content hash of a chunk: where it comes from, its text, how it was cut and how it is embedded."""
+    key = json.dumps([embedding_model, chunk_params, source, text], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+
+def assign_chunk_ids(
+    chunks: List[Document],
+    chunk_params: Dict[str, Any],
+    embedding_model: str,
+    seen: Optional[Dict[str, int]] = None,
+) -> List[str]:
+    """
+    Store ids for the chunks (keyed on their "source" metadata); repeated
+    texts get an occurrence suffix. Pass the same `seen` dict for
+    successive slices of one textbook.
+    """
+    seen = {} if seen is None else seen
+    ids = []
+    for chunk in chunks:
+        digest = chunk_hash(chunk.page_content, chunk_params, embedding_model, chunk.metadata.get("source"))
+        seen[digest] = seen.get(digest, 0) + 1
+        ids.append(digest if seen[digest] == 1 else f"{digest}-{seen[digest]}")
+        chunk.metadata["content_hash"] = digest
+    return ids
+
+
+def manifest_path(db_path: str) -> str:
+    return os.path.join(db_path, MANIFEST_FILE)
+
+
+def load_manifest(db_path: str) -> Dict[str, Any]:
+    try:
+        with open(manifest_path(db_path), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        return manifest if manifest.get("version") == MANIFEST_VERSION else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(db_path: str, manifest: Dict[str, Any]) -> None:
+    os.makedirs(db_path, exist_ok=True)
+    tmp_path = f"{manifest_path(db_path)}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({**manifest, "version": MANIFEST_VERSION}, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, manifest_path(db_path))
+
+
+def metadata_params(source: str = TEXTBOOK_SOURCE, grade: Optional[int] = TEXTBOOK_GRADE) -> Dict[str, Any]:
+    """Settings that only change chunk metadata (not ids), recorded in the manifest."""
+    return {"version": METADATA_VERSION, "source": source, "grade": grade}
+
+
+def is_up_to_date(
+    manifest: Dict[str, Any],
+    source_sha256: str,
+    chunk_params: Dict[str, Any],
+    embedding_model: str,
+    metadata: Optional[Dict[str, Any]] = None,
+) -> bool:
+    """True when the last run ingested this exact PDF with the same settings."""
+    return (
+        bool(manifest)
+        and manifest.get("source_sha256") == source_sha256
+        and manifest.get("chunk_params") == chunk_params
+        and manifest.get("embedding_model") == embedding_model
+        and manifest.get("metadata") == (metadata or metadata_params())
+    )
+
+
+@dataclass
+class IngestReport:
+    added: int = 0
+    updated: int = 0
+    deleted: int = 0
+    unchanged: int = 0
+    total: int = 0
+    seconds: float = 0.0
+    added_ids: List[str] = field(default_factory=list, repr=False)
+    chunk_ids: List[str] = field(default_factory=list, repr=False)
+    embedding: Optional[Dict[str, Any]] = None
+
+    def summary(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data.pop("added_ids")
+        data.pop("chunk_ids")
+        data["seconds"] = round(self.seconds, 2)
+        if data["embedding"] is None:
+            data.pop("embedding")
+        return data
+
+
+def _batches(items: List[Any], size: int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _stored_metadata(collection, source: Optional[str]) -> Dict[str, Dict[str, Any]]:
+    existing = collection.get(where={"source": source} if source else None, include=["metadatas"])
+    return {chunk_id: (meta or {}) for chunk_id, meta in zip(existing["ids"], existing["metadatas"])}
+
+
+def _add_chunks(vectorstore, wanted: Dict[str, Document], new_ids: List[str], batch_size: int, embedder: Optional[BatchEmbedder]) -> Optional[EmbedReport]:
+    """Embed and add new chunks; returns the embedder's report when one was used."""
+    if embedder is not None and new_ids:
+        vectors = dict(zip(new_ids, embedder.embed([wanted[chunk_id].page_content for chunk_id in new_ids])))
+        for batch in _batches(new_ids, batch_size):
+            vectorstore._collection.add(
+                ids=batch,
+                embeddings=[vectors[chunk_id] for chunk_id in batch],
+                documents=[wanted[chunk_id].page_content for chunk_id in batch],
+                metadatas=[wanted[chunk_id].metadata for chunk_id in batch],
+            )
+        return embedder.last_report
+    for batch in _batches(new_ids, batch_size):
+        vectorstore.add_texts(
+            texts=[wanted[chunk_id].page_content for chunk_id in batch],
+            metadatas=[wanted[chunk_id].metadata for chunk_id in batch],
+            ids=batch,
+        )
+    return None
+
+
+def sync_chunks(
+    vectorstore,
+    chunks: List[Document],
+    ids: List[str],
+    dry_run: bool = False,
+    batch_size: int = 500,
+    embedder: Optional[BatchEmbedder] = None,
+    source: Optional[str] = None,
+) -> IngestReport:
+    """
+    Make the store hold exactly these chunks: embed and add new ids, delete
+    ids that are gone, and update the metadata of kept chunks that changed.
+    With a source, only that textbook's chunks are compared and deleted.
+
+    With an embedder, all new chunks are embedded up front (resuming from its
+    checkpoint) and added with their vectors; otherwise the store's own
+    embedding function is called per write batch.
+    """
+    start = time.perf_counter()
+    collection = vectorstore._collection
+    stored = _stored_metadata(collection, source)
+    wanted = dict(zip(ids, chunks))
+
+    new_ids = [chunk_id for chunk_id in ids if chunk_id not in stored]
+    removed_ids = [chunk_id for chunk_id in stored if chunk_id not in wanted]
+    moved_ids = [
+        chunk_id for chunk_id in ids
+        if chunk_id in stored and stored[chunk_id] != wanted[chunk_id].metadata
+    ]
+    report = IngestReport(
+        added=len(new_ids),
+        updated=len(moved_ids),
+        deleted=len(removed_ids),
+        unchanged=len(ids) - len(new_ids) - len(moved_ids),
+        total=len(ids),
+        added_ids=new_ids,
+        chunk_ids=list(ids),
+    )
+    if dry_run:
+        report.seconds = time.perf_counter() - start
+        return report
+
+    embedding = _add_chunks(vectorstore, wanted, new_ids, batch_size, embedder)
+    if embedding is not None:
+        report.embedding = embedding.summary()
+    for batch in _batches(moved_ids, batch_size):
+        collection.update(ids=batch, metadatas=[wanted[chunk_id].metadata for chunk_id in batch])
+    for batch in _batches(removed_ids, batch_size):
+        collection.delete(ids=batch)
+    report.seconds = time.perf_counter() - start
+    return report
+
+
+def sync_chunk_stream(
+    vectorstore,
+    chunks: Iterable[Document],
+    chunk_params: Dict[str, Any],
+    embedding_model: str,
+    dry_run: bool = False,
+    window: Optional[int] = None,
+    batch_size: int = 500,
+    embedder: Optional[BatchEmbedder] = None,
+    source: Optional[str] = None,
+) -> IngestReport:
+    """
+    sync_chunks() for chunks arriving from a generator (iter_textbook_chunks
+    over iter_pdf_pages). Chunks are given ids, embedded and written a window
+    at a time (INGEST_STREAM_WINDOW, default 1000), so only one window of
+    text is held in memory; ids no longer produced are deleted at the end.
+    """
+    start = time.perf_counter()
+    window = window or int(os.getenv("INGEST_STREAM_WINDOW", "1000"))
+    collection = vectorstore._collection
+    stored = _stored_metadata(collection, source)
+    report = IngestReport()
+    embedding = EmbedReport()
+    seen: Dict[str, int] = {}
+    chunks = iter(chunks)
+    while True:
+        batch_chunks = list(islice(chunks, window))
+        if not batch_chunks:
+            break
+        ids = assign_chunk_ids(batch_chunks, chunk_params, embedding_model, seen)
+        wanted = dict(zip(ids, batch_chunks))
+        new_ids = [chunk_id for chunk_id in ids if chunk_id not in stored]
+        moved_ids = [chunk_id for chunk_id in ids if chunk_id in stored and stored[chunk_id] != wanted[chunk_id].metadata]
+        report.total += len(ids)
+        report.added += len(new_ids)
+        report.updated += len(moved_ids)
+        report.unchanged += len(ids) - len(new_ids) - len(moved_ids)
+        report.added_ids.extend(new_ids)
+        report.chunk_ids.extend(ids)
+        if dry_run:
+            continue
+        window_embedding = _add_chunks(vectorstore, wanted, new_ids, batch_size, embedder)
+        if window_embedding is not None:
+            embedding.add(window_embedding)
+        for batch in _batches(moved_ids, batch_size):
+            collection.update(ids=batch, metadatas=[wanted[chunk_id].metadata for chunk_id in batch])
+        print(f"📦 Synced {report.total} chunks ({report.added} new)")
+
+    produced = set(report.chunk_ids)
+    removed_ids = [chunk_id for chunk_id in stored if chunk_id not in produced]
+    report.deleted = len(removed_ids)
+    if not dry_run:
+        for batch in _batches(removed_ids, batch_size):
+            collection.delete(ids=batch)
+    if embedding.total:
+        report.embedding = embedding.summary()
+    report.seconds = time.perf_counter() - start
+    return report
+
+
+def rebuild_side_indexes(vectorstore, db_path: str) -> BM25Index:
+    """Rebuild the BM25 and key-term indexes from the store (no embedding calls)."""
+    lexical_index = BM25Index.from_chroma(vectorstore)
+    lexical_index.save(BM25Index.default_path(db_path))
+    KeyTermIndex.from_lexical_index(lexical_index).save(KeyTermIndex.default_path(db_path))
+    return lexical_index
@@ -0,0 +1,203 @@
+"""
+Persisted BM25 lexical index over the textbook chunks.
+
+Built at ingest time from the same chunks as the vector store and saved as
+JSON next to it, so lexical retrieval needs no network calls at all. Used on
+its own (RETRIEVAL_BACKEND=lexical), fused with dense results via reciprocal
+rank fusion (RETRIEVAL_BACKEND=hybrid), and as the fallback when the
+embeddings API is slow or down.
+"""
+
+import json
+import math
+import os
+import re
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from langchain.schema import Document
+
+from .retrieval_filters import FilterMasks
+
+INDEX_FILE = "bm25.json"
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = {
+    "a", "an", "the", "and", "or", "but", "if", "of", "to", "in", "on", "at", "by", "for", "with",
+    "from", "into", "about", "as", "is", "are", "was", "were", "be", "been", "being", "it", "its",
+    "this", "that", "these", "those", "there", "their", "they", "them", "we", "our", "us", "you",
+    "your", "he", "she", "his", "her", "i", "me", "my", "do", "does", "did", "can", "could", "will",
+    "would", "should", "may", "might", "has", "have", "had", "not", "no", "so", "than", "then",
+    "also", "such", "very", "which", "what", "why", "how", "when", "where", "who", "whom", "some",
+    "any", "all", "more", "most", "other", "many", "much", "each",
+}
+
+
+def _stem(token: str) -> str:
+    """Very light plural folding so "planets" matches "planet"."""
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("s") and not token.endswith(("ss", "us", "is")):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens without stopwords, lightly stemmed."""
+    return [
+        _stem(token)
+        for token in _TOKEN_RE.findall((text or "").lower())
+        if len(token) > 1 and token not in STOPWORDS
+    ]
+
+
+def chunk_ref(metadata: Dict[str, Any]) -> Optional[str]:
+    """
+    Id of a stored chunk derived from its metadata: the content_hash set at
+    ingest, or "source:chunk_id" in databases built before content hashes
+    (stable until that database is re-ingested). None if it has neither.
+    """
+    if metadata.get("content_hash"):
+        return metadata["content_hash"]
+    if metadata.get("chunk_id") is not None:
+        return f"{metadata.get('source')}:{metadata['chunk_id']}"
+    return None
+
+
+def chunk_key(doc: Document) -> Hashable:
+    """Stable identity of a chunk across retrieval backends."""
+    return chunk_ref(doc.metadata) or hash(doc.page_content)
+
+
+def reciprocal_rank_fusion(result_lists: List[List[Document]], k: int = 60, key: Callable[[Document], Hashable] = chunk_key) -> List[Document]:
+    """Fuse ranked lists: score(d) = sum over lists of 1 / (k + rank)."""
+    scores: Dict[Hashable, float] = {}
+    docs: Dict[Hashable, Document] = {}
+    for results in result_lists:
+        for rank, doc in enumerate(results, start=1):
+            doc_key = key(doc)
+            scores[doc_key] = scores.get(doc_key, 0.0) + 1.0 / (k + rank)
+            docs.setdefault(doc_key, doc)
+    ordered = sorted(scores, key=scores.get, reverse=True)
+    return [docs[doc_key] for doc_key in ordered]
+
+
+class BM25Index:
+    """Okapi BM25 over an inverted index of term -> [(doc index, term frequency)]."""
+
+    def __init__(
+        self,
+        ids: List[str],
+        documents: List[str],
+        metadatas: List[Dict[str, Any]],
+        postings: Dict[str, List[List[int]]],
+        doc_lengths: List[int],
+        k1: float = 1.5,
+        b: float = 0.75,
+        info: Optional[Dict[str, Any]] = None,
+    ):
+        self.ids = ids
+        self.documents = documents
+        self.metadatas = metadatas
+        self.postings = postings
+        self.doc_lengths = doc_lengths
+        self.k1 = k1
+        self.b = b
+        self.info = info or {}
+        self.avg_length = (sum(doc_lengths) / len(doc_lengths)) if doc_lengths else 0.0
+        self.filter_masks = FilterMasks(self.metadatas)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @staticmethod
+    def default_path(textbook_db_path: str) -> str:
+        return os.getenv("LEXICAL_INDEX_PATH") or os.path.join(textbook_db_path, "lexical_index")
+
+    @staticmethod
+    def exists(index_dir: str) -> bool:
+        return os.path.exists(os.path.join(index_dir, INDEX_FILE))
+
+    @staticmethod
+    def is_stale(index_dir: str, textbook_db_path: str) -> bool:
+        """True when the index is missing or older than the Chroma database."""
+        index_file = os.path.join(index_dir, INDEX_FILE)
+        if not os.path.exists(index_file):
+            return True
+        chroma_file = os.path.join(textbook_db_path, "chroma.sqlite3")
+        return os.path.exists(chroma_file) and os.path.getmtime(chroma_file) > os.path.getmtime(index_file)
+
+    @classmethod
+    def build(cls, ids: List[str], documents: List[str], metadatas: List[Dict[str, Any]]) -> "BM25Index":
+        postings: Dict[str, List[List[int]]] = {}
+        doc_lengths: List[int] = []
+        for doc_index, text in enumerate(documents):
+            tokens = tokenize(text)
+            doc_lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                postings.setdefault(term, []).append([doc_index, tf])
+        info = {"version": 1, "count": len(ids), "terms": len(postings), "created_at": time.time()}
+        return cls(list(ids), list(documents), [m or {} for m in metadatas], postings, doc_lengths, info=info)
+
+    @classmethod
+    def from_chroma(cls, vectorstore) -> "BM25Index":
+        """Build the index from every chunk stored in a Chroma vector store."""
+        data = vectorstore._collection.get(include=["documents", "metadatas"])
+        return cls.build(data["ids"], data["documents"], data["metadatas"])
+
+    def save(self, index_dir: str) -> None:
+        os.makedirs(index_dir, exist_ok=True)
+        payload = {
+            **self.info,
+            "k1": self.k1,
+            "b": self.b,
+            "ids": self.ids,
+            "documents": self.documents,
+            "metadatas": self.metadatas,
+            "doc_lengths": self.doc_lengths,
+            "postings": self.postings,
+        }
+        tmp_path = os.path.join(index_dir, f"{INDEX_FILE}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False)
+        os.replace(tmp_path, os.path.join(index_dir, INDEX_FILE))
+        print(f"✅ Saved BM25 index ({len(self.ids)} chunks, {len(self.postings)} terms) to {index_dir}")
+
+    @classmethod
+    def load(cls, index_dir: str) -> "BM25Index":
+        with open(os.path.join(index_dir, INDEX_FILE), "r", encoding="utf-8") as f:
+            data = json.load(f)
+        info = {k: data[k] for k in ("version", "count", "terms", "created_at") if k in data}
+        return cls(
+            data["ids"], data["documents"], data["metadatas"], data["postings"], data["doc_lengths"],
+            k1=data.get("k1", 1.5), b=data.get("b", 0.75), info=info,
+        )
+
+    def idf(self, term: str) -> float:
+        df = len(self.postings.get(term, ()))
+        n = len(self.ids)
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def search_with_scores(self, query: str, k: int = 3, filters: Optional[Dict[str, Any]] = None) -> List[Tuple[Document, float]]:
+        """Top-k (document, BM25 score) pairs among chunks matching filters, best first; empty if no term matches."""
+        mask = self.filter_masks.get(filters)
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = self.idf(term)
+            for doc_index, tf in postings:
+                if mask is not None and not mask[doc_index]:
+                    continue
+                length_norm = 1 - self.b + self.b * (self.doc_lengths[doc_index] / (self.avg_length or 1.0))
+                scores[doc_index] = scores.get(doc_index, 0.0) + idf * (tf * (self.k1 + 1)) / (tf + self.k1 * length_norm)
+        top = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [
+            (Document(page_content=self.documents[i], metadata=dict(self.metadatas[i])), score)
+            for i, score in top
+        ]
+
+    def search(self, query: str, k: int = 3, filters: Optional[Dict[str, Any]] = None) -> List[Document]:
+        return [doc for doc, _ in self.search_with_scores(query, k, filters)]
@@ -5,20 +5,38 @@ This version uses the new textbook vector database and implements strict mode se
 
 import os
 import json
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, as_completed, wait
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Callable, Iterator, Optional, Tuple
 from dotenv import load_dotenv
 
 # LangChain imports
 from langchain.schema import Document, HumanMessage
 from langchain_community.vectorstores import Chroma
 from langchain.chains import ConversationalRetrievalChain
-from langchain.memory import ConversationBufferMemory
 from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from langchain.retrievers import EnsembleRetriever
-from langchain_community.retrievers import BM25Retriever
 from openai import OpenAI
 
+from .answer_cache import SemanticAnswerCache, normalize_question
+from .answer_store import PrecomputedAnswerStore, textbook_build_id
+from .batch_jobs import BatchJobStore
+from .context_packer import PackedContext, pack_context
+from .conversation_memory import ConversationContext, ConversationMemory
+from .embedding_cache import CachedEmbeddings
+from .lexical_index import BM25Index, chunk_ref, reciprocal_rank_fusion
+from .openai_pool import ModelSlotTimeout, get_openai_pool
+from . import metrics
+from .resilience import ModelHealth, is_retryable, retry_after_seconds, retry_delay, status_code
+from .retrieval_cache import TurnRetrievalCache, chunk_ids_of
+from .retrieval_filters import default_filters, matches, normalize_filters, to_chroma_where
+from .single_flight import SingleFlight
+from .suggestion_generator import INDEX_VERSION as KEY_TERM_INDEX_VERSION, KeyTermIndex
+from .tokens import count_chat_tokens, count_tokens
+from .vector_index import NumpyVectorIndex
+
 # Load environment variables
 load_dotenv()
 
@@ -42,6 +60,11 @@ class LLMService:
         self._initialize_core_components()
         self._initialize_prompts()
         self._initialize_textbook_vector_store()
+        self._initialize_answer_cache()
+        self._initialize_answer_store()
+        # Opt-in: open keep-alive connections before the first question
+        if os.getenv("OPENAI_POOL_WARMUP", "0").lower() in ("1", "true", "yes"):
+            self.openai_pool.warm_up()
     
     def _validate_environment(self):
         """Validate required environment variables (OpenAI only)."""
@@ -51,29 +74,66 @@ class LLMService:
     
     def _initialize_core_components(self):
         """Initialize LLM, embeddings, and memory components."""
+        # OPENAI_API_BASE points every OpenAI call (chat and embeddings) elsewhere,
+        # e.g. at benchmarks/fake_openai_server.py for load tests
+        base_url = os.getenv("OPENAI_API_BASE") or "https://api.openai.com/v1"
+        
         # Initialize embeddings (OpenAI only)
         oa_embed_model = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-small")
-        self.embeddings = OpenAIEmbeddings(model=oa_embed_model, openai_api_key=self.openai_api_key)
+        # Document embeddings keep the client defaults: anything writing chunks
+        # through the textbook vector store must not give up after a few seconds
+        self.document_embeddings = OpenAIEmbeddings(
+            model=oa_embed_model,
+            openai_api_key=self.openai_api_key,
+            base_url=base_url,
+        )
+        # Query embeddings fail fast so retrieval can fall back to the lexical index
+        self.embeddings = OpenAIEmbeddings(
+            model=oa_embed_model,
+            openai_api_key=self.openai_api_key,
+            base_url=base_url,
+            request_timeout=float(os.getenv("OPENAI_EMBEDDING_TIMEOUT", "10")),
+            max_retries=int(os.getenv("OPENAI_EMBEDDING_MAX_RETRIES", "1")),
+        )
+        if os.getenv("EMBEDDING_CACHE_ENABLED", "1").lower() in ("1", "true", "yes"):
+            # Persistent query-embedding cache shared by retrieval and the answer cache
+            self.embeddings = CachedEmbeddings(self.embeddings, model_name=oa_embed_model)
+        
+        # Shared connection pool used by every chat completion
+        self.openai_pool = get_openai_pool(self.openai_api_key, base_url)
+        
+        # Retry/breaker/hedging policy for chat completions
+        self.model_health = ModelHealth()
+        self.max_attempts = max(1, int(os.getenv("LLM_MAX_ATTEMPTS", "3")))
+        # Seconds a request may spend in retry backoff, across all its models
+        self.retry_budget = float(os.getenv("LLM_RETRY_BUDGET", "20"))
+        self.hedging_enabled = os.getenv("LLM_HEDGING", "0").lower() in ("1", "true", "yes")
+        self.hedge_executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("LLM_HEDGE_WORKERS", "16")),
+            thread_name_prefix="llm-hedge",
+        )
         
         # Initialize LLM with different temperatures for different modes
-        base_url = os.getenv("OPENAI_API_BASE") or "https://api.openai.com/v1"
         self.llm_textbook = ChatOpenAI(
             temperature=0.1,
             model=os.getenv("LLM_MODEL_TEXTBOOK") or "gpt-4o-mini",
             openai_api_key=self.openai_api_key,
             base_url=base_url,
+            client=self.openai_pool.client.chat.completions,
         )
         self.llm_detailed = ChatOpenAI(
             temperature=0.3,
             model=os.getenv("LLM_MODEL_DETAILED") or "gpt-4o-mini",
             openai_api_key=self.openai_api_key,
             base_url=base_url,
+            client=self.openai_pool.client.chat.completions,
         )
         self.llm_advanced = ChatOpenAI(
             temperature=0.7, 
             model=os.getenv("LLM_MODEL_ADVANCED") or "gpt-4o",
             openai_api_key=self.openai_api_key,
             base_url=base_url,
+            client=self.openai_pool.client.chat.completions,
         )
         
         # Task routing for providers/models per feature (using real OpenAI models)
@@ -83,6 +143,7 @@ class LLMService:
                 "detailed": {"provider": "openai", "model": os.getenv("LLM_MODEL_DETAILED") or "gpt-4o-mini"},
                 "advanced": {"provider": "openai", "model": os.getenv("LLM_MODEL_ADVANCED") or "gpt-4o"},
             },
+            "memory": {"provider": "openai", "model": os.getenv("LLM_MODEL_MEMORY") or "gpt-4o-mini"},
             "practice": {
                 "generation": {"provider": "openai", "model": os.getenv("LLM_MODEL_PRACTICE_GEN") or "gpt-4o-mini"},
                 "scoring": {"provider": "openai", "model": os.getenv("LLM_MODEL_PRACTICE_SCORE") or "gpt-4o-mini"},
@@ -92,16 +153,60 @@ class LLMService:
         # Default LLM (for backward compatibility)
         self.llm = self.llm_textbook
         
-        # Initialize memory
-        self.memory = ConversationBufferMemory(
-            memory_key='chat_history', 
-            return_messages=True
-        )
-        
         # Initialize placeholders
         self.textbook_vectorstore = None
+        self.textbook_db_path = None
+        self.vector_index = None
+        self.lexical_index = None
+        self.suggestion_index = None
         self.conversation_chain = None
         
+        # Retrieval engine: "chroma" (default), "numpy" (in-process exact index),
+        # "hybrid" (dense + BM25 fused with RRF) or "lexical" (BM25 only, no network)
+        self.retrieval_backend = (os.getenv("RETRIEVAL_BACKEND") or "chroma").strip().lower()
+        
+        # Worker pool for running independent LLM calls concurrently
+        self.executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("LLM_SERVICE_WORKERS", "16")),
+            thread_name_prefix="llm-service",
+        )
+        # Separate pool for per-mode fan-out, whose tasks themselves submit to self.executor
+        self.mode_executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("LLM_MODE_WORKERS", "12")),
+            thread_name_prefix="llm-modes",
+        )
+        # Bounded pool for bulk question answering (throughput over latency)
+        self.batch_executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("BATCH_WORKERS", "8")),
+            thread_name_prefix="llm-batch",
+        )
+        self.batch_jobs = BatchJobStore()
+        
+        # Semantic answer cache in front of get_chat_response (loaded once the
+        # textbook database is known, see _initialize_answer_cache)
+        self.answer_cache: Optional[SemanticAnswerCache] = None
+        
+        # Answers precomputed offline for frequent questions (loaded once the
+        # textbook database is known, see _initialize_answer_store)
+        self.answer_store: Optional[PrecomputedAnswerStore] = None
+        
+        # Chunks retrieved per chat turn, reused by rewrites and the chapter view
+        self.retrieval_cache = TurnRetrievalCache()
+        
+        # Per-session conversation memory, older turns compacted into a summary
+        self.conversation_memory = ConversationMemory(
+            self._summarize_conversation,
+            executor=self.executor,
+            model=self.task_router["memory"]["model"],
+        )
+        
+        # Identical concurrent questions share one pipeline run
+        self.single_flight = (
+            SingleFlight()
+            if os.getenv("SINGLE_FLIGHT_ENABLED", "1").lower() in ("1", "true", "yes")
+            else None
+        )
+        
         # Mode-specific configurations (used for chunk limits and status)
         self.mode_config = {
             "textbook": {
@@ -109,73 +214,293 @@ class LLMService:
                 "llm": self.llm_textbook,
                 "strict_textbook_only": True,
                 "description": "Uses ONLY textbook.pdf content",
+                "system": "You are a strict textbook assistant.",
+                "max_output_tokens": int(os.getenv("LLM_MAX_TOKENS_ANSWER", "850")),
+                "max_context_tokens": int(os.getenv("LLM_CONTEXT_TOKENS_TEXTBOOK", "1000")),
+                "suggestions": self._suggestions_strategy("textbook"),
             },
             "detailed": {
                 "max_chunks": 4,
                 "llm": self.llm_detailed,
                 "strict_textbook_only": False,
                 "description": "Uses textbook + LLM enhancement",
+                "system": "You improve textbook explanations for students.",
+                "max_output_tokens": int(os.getenv("LLM_MAX_TOKENS_ANSWER", "850")),
+                "max_context_tokens": int(os.getenv("LLM_CONTEXT_TOKENS_DETAILED", "1400")),
+                "suggestions": self._suggestions_strategy("detailed"),
             },
             "advanced": {
                 "max_chunks": 2,
                 "llm": self.llm_advanced,
                 "strict_textbook_only": False,
                 "description": "Uses primarily LLM knowledge",
+                "system": "You are an advanced science educator.",
+                "max_output_tokens": int(os.getenv("LLM_MAX_TOKENS_ANSWER", "900")),
+                "max_context_tokens": int(os.getenv("LLM_CONTEXT_TOKENS_ADVANCED", "600")),
+                "suggestions": self._suggestions_strategy("advanced"),
             },
         }
 
+    @staticmethod
+    def _suggestions_strategy(mode: str) -> str:
+        """
+        How suggested questions are produced for a mode:
+        - "local": templates over the key terms of the retrieved chunks, no LLM call (default)
+        - "sequential": answer first, then a second call on the answer
+        - "parallel": a second call on the retrieved chunks, run concurrently with the answer
+        - "structured": one JSON completion returning {answer, suggested_questions}
+        Set per mode with LLM_SUGGESTIONS_<MODE> or globally with LLM_SUGGESTIONS_STRATEGY.
+        """
+        strategy = (
+            os.getenv(f"LLM_SUGGESTIONS_{mode.upper()}")
+            or os.getenv("LLM_SUGGESTIONS_STRATEGY")
+            or "local"
+        ).strip().lower()
+        return strategy if strategy in ("local", "sequential", "parallel", "structured") else "local"
+
     def _openai_client(self) -> OpenAI:
-        """Create OpenAI client (OpenAI only)."""
-        api_key = self.openai_api_key
-        base_url = os.getenv("OPENAI_API_BASE") or "https://api.openai.com/v1"
-        return OpenAI(api_key=api_key, base_url=base_url)
+        """Return the shared, pooled OpenAI client."""
+        return self.openai_pool.client
 
-    def _openai_chat(self, model: str, system: str, messages: list[dict], *, max_output_tokens: int, temperature: float = 0.2, top_p: float = 1.0) -> str:
-        """Unified chat call with retry and fallback from gpt-4o → gpt-4o-mini.
-        Uses max_tokens for all current OpenAI models.
+    @staticmethod
+    def _chat_payload(model: str, system: str, messages: list[dict], *, max_output_tokens: Optional[int], temperature: float, top_p: float, response_format: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Build a chat.completions payload; max_output_tokens=None omits max_tokens."""
+        payload: Dict[str, Any] = {
+            "model": model,
+            "messages": ([{"role": "system", "content": system}] + messages),
+            "temperature": temperature,
+            "top_p": top_p,
+        }
+        if max_output_tokens is not None:
+            payload["max_tokens"] = max_output_tokens  # Standard for all current OpenAI models
+        if response_format is not None:
+            payload["response_format"] = response_format
+        return payload
+
+    @staticmethod
+    def _chat_models(model: str) -> List[str]:
+        """The requested model followed by its fallback, if any."""
+        return [model, "gpt-4o-mini"] if model == "gpt-4o" else [model]
+
+    def _healthy_models(self, model: str) -> List[str]:
         """
-        client = self._openai_client()
-        attempt_models = [model]
-        if model == "gpt-4o":
-            attempt_models.append("gpt-4o-mini")
-        last_err: Optional[Exception] = None
-        for m in attempt_models:
-            for attempt in range(3):
-                try:
-                    token_key = "max_tokens"  # Standard for all current OpenAI models
-                    payload = {
-                        "model": m,
-                        "messages": ([{"role": "system", "content": system}] + messages),
-                        "temperature": temperature,
-                        "top_p": top_p,
-                        token_key: max_output_tokens,
-                    }
-                    print(f"LLM call → provider=openai model={m} mtok={max_output_tokens}")
+        Candidate models whose circuit breaker is available (the last one is
+        always kept). Read-only: the half-open probe is claimed by the call itself.
+        """
+        models = self._chat_models(model)
+        healthy = []
+        for m in models:
+            if self.model_health.breaker(m).available():
+                healthy.append(m)
+            else:
+                self.model_health.count("breaker_skips")
+                print(f"⚡ Circuit open for {m}, skipping to fallback")
+        return healthy or models[-1:]
+
+    def _chat_once(self, m: str, system: str, messages: list[dict], *, max_output_tokens: Optional[int], temperature: float, top_p: float, response_format: Optional[Dict[str, Any]]) -> str:
+        """One chat completion without retries (retries by the SDK are disabled too)."""
+        client = self.openai_pool.direct_client
+        payload = self._chat_payload(m, system, messages, max_output_tokens=max_output_tokens, temperature=temperature, top_p=top_p, response_format=response_format)
+        print(f"LLM call → provider=openai model={m} mtok={max_output_tokens}")
+        start = time.perf_counter()
+        try:
+            try:
+                with self.openai_pool.model_slot(m):
                     resp = client.chat.completions.create(**payload)
-                    return (resp.choices[0].message.content or "").strip()
-                except Exception as e:
-                    last_err = e
-                    msg = str(e)
-                    # Fallback for providers that don't accept max_tokens (e.g., some OpenRouter models)
-                    if "Unsupported parameter" in msg and ("max_tokens" in msg or "max_completion_tokens" in msg):
-                        try:
-                            payload_no_max = {
-                                "model": m,
-                                "messages": ([{"role": "system", "content": system}] + messages),
-                                "temperature": temperature,
-                                "top_p": top_p,
-                            }
-                            print(f"LLM call → retry without max_tokens provider=openai model={m}")
-                            resp = client.chat.completions.create(**payload_no_max)
-                            return (resp.choices[0].message.content or "").strip()
-                        except Exception as e2:
-                            last_err = e2
-                    if any(code in msg for code in ["429", "500", "502", "503", "504"]):
-                        import time
-                        time.sleep(0.5 * (attempt + 1))
-                        continue
-                    break
+            except Exception as e:
+                msg = str(e)
+                # Fallback for providers that don't accept max_tokens (e.g., some OpenRouter models)
+                if max_output_tokens is None or not ("Unsupported parameter" in msg and ("max_tokens" in msg or "max_completion_tokens" in msg)):
+                    raise
+                payload = self._chat_payload(m, system, messages, max_output_tokens=None, temperature=temperature, top_p=top_p, response_format=response_format)
+                print(f"LLM call → retry without max_tokens provider=openai model={m}")
+                with self.openai_pool.model_slot(m):
+                    resp = client.chat.completions.create(**payload)
+        except Exception as e:
+            metrics.observe_llm_call(m, time.perf_counter() - start, error=self._error_label(e))
+            raise
+        self._observe_completion(m, time.perf_counter() - start, resp)
+        return (resp.choices[0].message.content or "").strip()
+
+    @staticmethod
+    def _error_label(err: Exception) -> str:
+        code = status_code(err)
+        return str(code) if code is not None else type(err).__name__
+
+    @staticmethod
+    def _observe_completion(model: str, seconds: float, resp: Any) -> None:
+        """Record latency and token usage of a finished completion."""
+        usage = getattr(resp, "usage", None)
+        metrics.observe_llm_call(
+            model,
+            seconds,
+            prompt_tokens=getattr(usage, "prompt_tokens", None),
+            completion_tokens=getattr(usage, "completion_tokens", None),
+        )
+
+    def _chat_with_retries(self, m: str, system: str, messages: list[dict], *, has_fallback: bool, deadline: Optional[float] = None, **kwargs) -> str:
+        """
+        Call one model with jittered exponential backoff that honours Retry-After.
+        When a fallback model exists, a retryable failure goes straight to the
+        fallback instead of sleeping on the request thread, and so does a model
+        whose breaker refuses the call (the last model is tried anyway). Backoff
+        never sleeps past the request's deadline (time.monotonic() based,
+        default: now + LLM_RETRY_BUDGET).
+        A local queue timeout (ModelSlotTimeout) is not held against the model.
+        """
+        breaker = self.model_health.breaker(m)
+        deadline = deadline if deadline is not None else time.monotonic() + self.retry_budget
+        for attempt in range(self.max_attempts):
+            if not breaker.allow() and has_fallback:
+                self.model_health.count("breaker_skips")
+                raise RuntimeError(f"Circuit open for {m}")
+            self.model_health.count("calls")
+            start = time.monotonic()
+            try:
+                answer = self._chat_once(m, system, messages, **kwargs)
+                self.model_health.latency(m).record(time.monotonic() - start)
+                breaker.record_success()
+                return answer
+            except ModelSlotTimeout:
+                breaker.release()
+                raise
+            except Exception as e:
+                self.model_health.count("failures")
+                if not is_retryable(e):
+                    # The API answered; the request itself was bad
+                    breaker.record_success()
+                    raise
+                breaker.record_failure()
+                retry_after = retry_after_seconds(e)
+                delay = retry_delay(attempt, retry_after)
+                if attempt + 1 >= self.max_attempts or not breaker.available():
+                    raise
+                if has_fallback:
+                    print(f"⏭️ {m} failed ({e}), using fallback instead of waiting {delay:.1f}s")
+                    raise
+                if time.monotonic() + delay > deadline:
+                    raise
+                if retry_after is not None:
+                    self.model_health.count("retry_after_honoured")
+                self.model_health.count("retries")
+                print(f"🔁 Retrying {m} in {delay:.2f}s after: {e}")
+                time.sleep(delay)
+        raise RuntimeError(f"No attempts left for {m}")
+
+    def _openai_chat(self, model: str, system: str, messages: list[dict], *, max_output_tokens: int, temperature: float = 0.2, top_p: float = 1.0, response_format: Optional[Dict[str, Any]] = None) -> str:
+        """Unified chat call with adaptive retries, circuit breaking and fallback gpt-4o → gpt-4o-mini.
+        Uses max_tokens for all current OpenAI models. With LLM_HEDGING enabled, the
+        fallback is also fired when the primary runs past its p95 latency.
+        All models share one retry deadline, LLM_RETRY_BUDGET seconds from now.
+        """
+        kwargs = dict(max_output_tokens=max_output_tokens, temperature=temperature, top_p=top_p, response_format=response_format)
+        kwargs["deadline"] = time.monotonic() + self.retry_budget
+        models = self._healthy_models(model)
+        if self.hedging_enabled and len(models) == 2:
+            return self._hedged_chat(models[0], models[1], system, messages, **kwargs)
+        last_err: Optional[Exception] = None
+        for i, m in enumerate(models):
+            has_fallback = i + 1 < len(models)
+            try:
+                return self._chat_with_retries(m, system, messages, has_fallback=has_fallback, **kwargs)
+            except Exception as e:
+                last_err = e
+                if has_fallback:
+                    self.model_health.count("fallbacks")
+                    print(f"↪️ Falling back from {m} to {models[i + 1]}: {e}")
         raise RuntimeError(f"LLM chat failed for model {model}: {last_err}")
+
+    def _hedged_chat(self, primary: str, fallback: str, system: str, messages: list[dict], **kwargs) -> str:
+        """
+        Start the primary; if it has not answered by its p95 latency (or fails),
+        start the fallback too and return whichever succeeds first.
+        """
+        call = lambda m, has_fallback: self._chat_with_retries(m, system, messages, has_fallback=has_fallback, **kwargs)
+        primary_future = self.hedge_executor.submit(metrics.in_scope(call, primary, True))
+        done, _ = wait([primary_future], timeout=self.model_health.hedge_deadline(primary))
+        if done and primary_future.exception() is None:
+            return primary_future.result()
+
+        if not done:
+            self.model_health.count("hedges_fired")
+            print(f"🏁 {primary} slower than its p95, hedging with {fallback}")
+        else:
+            self.model_health.count("fallbacks")
+        pending = {primary_future, self.hedge_executor.submit(metrics.in_scope(call, fallback, False))}
+        last_err: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is not primary_future:
+                        self.model_health.count("hedges_won")
+                    return future.result()
+                last_err = future.exception()
+        raise RuntimeError(f"LLM chat failed for model {primary}: {last_err}")
+
+    def _openai_chat_stream(self, model: str, system: str, messages: list[dict], *, max_output_tokens: int, temperature: float = 0.2, top_p: float = 1.0) -> Iterator[str]:
+        """Streaming variant of _openai_chat that yields content deltas as they arrive.
+        Falls back gpt-4o → gpt-4o-mini only if the primary fails before its first token,
+        and skips a primary whose circuit breaker is open.
+        """
+        client = self.openai_pool.direct_client
+        models = self._healthy_models(model)
+        last_err: Optional[Exception] = None
+        for m in models:
+            started = False
+            parts: List[str] = []
+            breaker = self.model_health.breaker(m)
+            if not breaker.allow() and m != models[-1]:
+                self.model_health.count("breaker_skips")
+                continue
+            self.model_health.count("calls")
+            start = time.monotonic()
+            try:
+                payload = self._chat_payload(m, system, messages, max_output_tokens=max_output_tokens, temperature=temperature, top_p=top_p)
+                print(f"LLM stream → provider=openai model={m} mtok={max_output_tokens}")
+                with self.openai_pool.model_slot(m):
+                    stream = client.chat.completions.create(stream=True, **payload)
+                    for event in stream:
+                        if not event.choices:
+                            continue
+                        delta = event.choices[0].delta.content
+                        if delta:
+                            if not started:
+                                metrics.observe_first_token(m, time.monotonic() - start)
+                            started = True
+                            parts.append(delta)
+                            yield delta
+                # Streams carry no usage here, so tokens are counted locally
+                metrics.observe_llm_call(
+                    m,
+                    time.monotonic() - start,
+                    prompt_tokens=count_chat_tokens(system, messages, m),
+                    completion_tokens=count_tokens("".join(parts), m),
+                )
+                self.model_health.latency(m).record(time.monotonic() - start)
+                breaker.record_success()
+                return
+            except GeneratorExit:
+                # The client went away mid-stream; the call proved nothing either way
+                breaker.release()
+                raise
+            except Exception as e:
+                metrics.observe_llm_call(m, time.monotonic() - start, error=self._error_label(e))
+                if isinstance(e, ModelSlotTimeout):
+                    # Saturated locally; the model itself did not fail
+                    breaker.release()
+                elif is_retryable(e):
+                    self.model_health.count("failures")
+                    breaker.record_failure()
+                else:
+                    self.model_health.count("failures")
+                    breaker.record_success()
+                if started:
+                    raise
+                last_err = e
+                if m != models[-1]:
+                    self.model_health.count("fallbacks")
+        raise RuntimeError(f"LLM stream failed for model {model}: {last_err}")
     
     def _initialize_prompts(self):
         """Initialize strict prompt templates for different answer levels."""
@@ -281,14 +606,25 @@ Question: {question}
                     break
             
             if textbook_db_path:
-                self.textbook_vectorstore = Chroma(
-                    persist_directory=textbook_db_path,
-                    embedding_function=self.embeddings
-                )
-                print("✅ Textbook vector store initialized successfully!")
+                self.textbook_db_path = textbook_db_path
+                try:
+                    # Searches pass query vectors from self.embeddings explicitly
+                    self.textbook_vectorstore = Chroma(
+                        persist_directory=textbook_db_path,
+                        embedding_function=self.document_embeddings
+                    )
+                    print("✅ Textbook vector store initialized successfully!")
+                except Exception as e:
+                    # The lexical index alone can still serve textbook retrieval
+                    print(f"❌ Error opening Chroma textbook database: {e}")
+                
+                if self.retrieval_backend == "numpy" and self.textbook_vectorstore is not None:
+                    self._initialize_numpy_index()
+                self._initialize_lexical_index()
+                self._initialize_suggestion_index()
                 
                 # Test the database
-                test_results = self.textbook_vectorstore.similarity_search("solar system", k=1)
+                test_results = self._search_chunks("solar system", k=1)
                 print(f"🧪 Test query found {len(test_results)} textbook chunks")
                 
             else:
@@ -297,38 +633,361 @@ Question: {question}
         except Exception as e:
             print(f"❌ Error initializing textbook vector store: {e}")
     
-    def retrieve_textbook_chunks(self, query: str, k: int = 3) -> List[Document]:
+    def _initialize_numpy_index(self):
+        """Load (exporting from Chroma first if missing or stale) the NumPy vector index."""
+        try:
+            index_dir = NumpyVectorIndex.default_path(self.textbook_db_path)
+            index = NumpyVectorIndex.load(index_dir) if NumpyVectorIndex.exists(index_dir) else None
+            if index is None or index.is_stale(self._chroma_build_id()):
+                print(f"🔄 Exporting textbook embeddings to NumPy index at: {index_dir}")
+                index = NumpyVectorIndex.export_from_chroma(
+                    self.textbook_vectorstore, index_dir, model_name=os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-small")
+                )
+            self.vector_index = index
+            print(f"✅ NumPy vector index loaded ({len(self.vector_index)} chunks)")
+        except Exception as e:
+            print(f"❌ Error loading NumPy vector index, falling back to Chroma: {e}")
+            self.vector_index = None
+
+    def _initialize_lexical_index(self):
+        """
+        Load the persisted BM25 index.
+
+        It is always loaded when present (it doubles as the fallback when the
+        embeddings API fails). When it is older than the Chroma database it is
+        rebuilt first, whatever the backend, so the fallback never serves
+        chunks that were re-ingested or removed; for the hybrid and lexical
+        backends a missing index is built as well.
+        """
+        index_dir = BM25Index.default_path(self.textbook_db_path)
+        try:
+            wants_lexical = self.retrieval_backend in ("hybrid", "lexical")
+            needs_build = BM25Index.is_stale(index_dir, self.textbook_db_path) and (wants_lexical or BM25Index.exists(index_dir))
+            if needs_build and self.textbook_vectorstore is not None:
+                print(f"🔄 Building BM25 lexical index at: {index_dir}")
+                rebuilt = BM25Index.from_chroma(self.textbook_vectorstore)
+                if len(rebuilt):
+                    rebuilt.save(index_dir)
+                    self.lexical_index = rebuilt
+                # Never replace a good index with one built from an empty collection
+                elif BM25Index.exists(index_dir):
+                    self.lexical_index = BM25Index.load(index_dir)
+            elif BM25Index.exists(index_dir):
+                self.lexical_index = BM25Index.load(index_dir)
+            if self.lexical_index is not None:
+                print(f"✅ BM25 lexical index loaded ({len(self.lexical_index)} chunks)")
+            elif wants_lexical:
+                print("⚠️ BM25 lexical index not found. Please run create_fresh_textbook_db.py first.")
+        except Exception as e:
+            print(f"❌ Error loading BM25 lexical index: {e}")
+            self.lexical_index = None
+
+    def _initialize_suggestion_index(self):
+        """Load the key-term index behind local suggested questions, rebuilding it when missing or stale."""
+        index_dir = KeyTermIndex.default_path(self.textbook_db_path)
+        try:
+            index = KeyTermIndex.load(index_dir) if not KeyTermIndex.is_stale(index_dir, self.textbook_db_path) else None
+            # Older versions name chunks by their positional chunk_id
+            if index is not None and index.info.get("version") == KEY_TERM_INDEX_VERSION:
+                self.suggestion_index = index
+            elif self.lexical_index is not None and len(self.lexical_index):
+                print(f"🔄 Building key-term index at: {index_dir}")
+                self.suggestion_index = KeyTermIndex.from_lexical_index(self.lexical_index)
+                self.suggestion_index.save(index_dir)
+            elif self.textbook_vectorstore is not None:
+                print(f"🔄 Building key-term index at: {index_dir}")
+                data = self.textbook_vectorstore._collection.get(include=["documents", "metadatas"])
+                if data["ids"]:
+                    self.suggestion_index = KeyTermIndex.build(data["ids"], data["documents"], data["metadatas"])
+                    self.suggestion_index.save(index_dir)
+            if self.suggestion_index is not None:
+                print(f"✅ Key-term index loaded ({len(self.suggestion_index)} chunks)")
+        except Exception as e:
+            print(f"❌ Error loading key-term index, local suggestions use the topic questions: {e}")
+            self.suggestion_index = None
+
+    def _chroma_build_id(self) -> Optional[str]:
+        """Fingerprint of the ids currently in the textbook Chroma collection."""
+        if self.textbook_vectorstore is None:
+            return None
+        ids = self.textbook_vectorstore._collection.get(include=[])["ids"]
+        return textbook_build_id(ids, os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-small"))
+
+    def textbook_build_id(self) -> Optional[str]:
+        """
+        Fingerprint of the loaded textbook database (None when nothing loaded).
+        The Chroma collection is the source of truth; the exported indexes are
+        only consulted without it, since they can lag behind a re-ingestion.
+        """
+        if self.textbook_vectorstore is not None:
+            return self._chroma_build_id()
+        if self.vector_index is not None:
+            ids = self.vector_index.ids
+        elif self.lexical_index is not None:
+            ids = self.lexical_index.ids
+        else:
+            return None
+        return textbook_build_id(ids, os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-small"))
+
+    def _initialize_answer_cache(self):
+        """Load the semantic answer cache kept for this textbook database."""
+        if os.getenv("ANSWER_CACHE_ENABLED", "1").lower() not in ("1", "true", "yes"):
+            return
+        try:
+            self.answer_cache = SemanticAnswerCache(build_id=self.textbook_build_id())
+        except Exception as e:
+            print(f"❌ Error loading answer cache: {e}")
+            self.answer_cache = None
+
+    def _initialize_answer_store(self):
+        """Load the precomputed answers built for this textbook database."""
+        if os.getenv("ANSWER_STORE_ENABLED", "1").lower() not in ("1", "true", "yes"):
+            return
+        try:
+            build_id = self.textbook_build_id()
+            if build_id is None:
+                print("⚠️ No textbook database loaded, precomputed answers disabled")
+                return
+            self.answer_store = PrecomputedAnswerStore(build_id=build_id)
+        except Exception as e:
+            print(f"❌ Error loading precomputed answers: {e}")
+            self.answer_store = None
+
+    def _effective_retrieval_backend(self) -> str:
+        """The backend _search_chunks actually uses, given what loaded."""
+        dense_available = self.textbook_vectorstore is not None or self.vector_index is not None
+        if self.lexical_index is not None:
+            if self.retrieval_backend == "lexical" or not dense_available:
+                return "lexical"
+            if self.retrieval_backend == "hybrid":
+                return "hybrid"
+        return "numpy" if self.vector_index is not None else "chroma"
+
+    def _dense_search(self, query: str, k: int, filters: Optional[Dict[str, Any]] = None, query_vector: Optional[List[float]] = None) -> List[Document]:
+        if self.vector_index is None and self.textbook_vectorstore is None:
+            raise RuntimeError("No dense retrieval backend available")
+        if query_vector is None:
+            query_vector = self.embeddings.embed_query(query)
+        if self.vector_index is not None:
+            return [doc for doc, _ in self.vector_index.search_by_vector(query_vector, k, filters)]
+        return self.textbook_vectorstore.similarity_search_by_vector(list(query_vector), k=k, filter=to_chroma_where(filters or {}))
+
+    def _search_chunks(self, query: str, k: int, filters: Optional[Dict[str, Any]] = None, query_vector: Optional[List[float]] = None) -> List[Document]:
+        """
+        Run the similarity search on the configured retrieval backend, filters
+        applied in the index. query_vector reuses an embedding of the query
+        made earlier in the request.
+        """
+        backend = self._effective_retrieval_backend()
+        if backend == "lexical":
+            return self.lexical_index.search(query, k, filters)
+        if backend == "hybrid":
+            # Fuse a deeper candidate list from each retriever, then cut to k
+            candidates = max(k * 2, int(os.getenv("HYBRID_CANDIDATES", "8")))
+            lexical = self.lexical_index.search(query, candidates, filters)
+            try:
+                dense = self._dense_search(query, candidates, filters, query_vector)
+            except Exception as e:
+                print(f"⚠️ Dense retrieval failed, using lexical results only: {e}")
+                return lexical[:k]
+            return reciprocal_rank_fusion([dense, lexical], k=int(os.getenv("HYBRID_RRF_K", "60")))[:k]
+        try:
+            return self._dense_search(query, k, filters, query_vector)
+        except Exception as e:
+            if self.lexical_index is None:
+                raise
+            print(f"⚠️ Dense retrieval failed, falling back to BM25: {e}")
+            return self.lexical_index.search(query, k, filters)
+
+    def get_chunks_by_ids(self, ids: List[Any], filters: Optional[Dict[str, Any]] = None) -> List[Document]:
+        """
+        Look up textbook chunks by the ids chunk_ids_of() returned (their
+        content_hash, or source:chunk_id on a database built before content
+        hashes), in the given order. Chunks outside the retrieval filters
+        (RETRIEVAL_SOURCE plus `filters`) are left out, so ids from another
+        textbook or a stale client cannot leak in.
+        """
+        wanted = [str(chunk_id) for chunk_id in ids or [] if chunk_id]
+        if not wanted:
+            return []
+        wanted_set = set(wanted)
+        found: Dict[str, Document] = {}
+        local_index = self.lexical_index or self.vector_index
+        try:
+            filters = normalize_filters({**default_filters(), **(filters or {})})
+            if local_index is not None:
+                for text, metadata in zip(local_index.documents, local_index.metadatas):
+                    ref = chunk_ref(metadata)
+                    if ref in wanted_set and ref not in found and matches(metadata, filters):
+                        found[ref] = Document(page_content=text, metadata=dict(metadata))
+            elif self.textbook_vectorstore is not None:
+                hashes = [ref for ref in wanted if ":" not in ref]
+                positions = sorted({int(ref.rpartition(":")[2]) for ref in wanted if ref.rpartition(":")[2].isdigit()})
+                for field, values in (("content_hash", hashes), ("chunk_id", positions)):
+                    if not values:
+                        continue
+                    where = to_chroma_where({**filters, field: values})
+                    data = self.textbook_vectorstore._collection.get(where=where, include=["documents", "metadatas"])
+                    for text, metadata in zip(data["documents"], data["metadatas"]):
+                        ref = chunk_ref(metadata)
+                        if ref in wanted_set:
+                            found.setdefault(ref, Document(page_content=text, metadata=metadata))
+        except Exception as e:
+            print(f"⚠️ Could not look up chunks by id: {e}")
+            return []
+        return [found[chunk_id] for chunk_id in wanted if chunk_id in found]
+
+    def retrieve_for_turn(
+        self,
+        turn_id: Optional[str],
+        query: str,
+        k: int = 3,
+        chunk_ids: Optional[List[Any]] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        query_vector: Optional[List[float]] = None,
+    ) -> List[Document]:
         """
-        Retrieve chunks specifically from textbook content with validation.
+        Retrieve chunks for a chat turn, reusing what the turn already retrieved.
+        A larger k than before only tops up the cached ranking; chunk_ids sent
+        back by the client restore the turn when it is no longer cached.
         """
-        if not self.textbook_vectorstore:
+        retrieve = lambda q, n: self.retrieve_textbook_chunks(q, k=n, filters=filters, query_vector=query_vector)
+        if not turn_id:
+            return retrieve(query, k)
+        return self.retrieval_cache.get_or_retrieve(
+            turn_id,
+            query,
+            k,
+            retrieve,
+            chunk_ids=chunk_ids,
+            lookup=lambda ids: self.get_chunks_by_ids(ids, filters),
+        )
+
+    def retrieve_textbook_chunks(self, query: str, k: int = 3, filters: Optional[Dict[str, Any]] = None, query_vector: Optional[List[float]] = None) -> List[Document]:
+        """
+        Retrieve the top k textbook chunks matching the metadata filters
+        (source, chapter, section, grade, page_min/page_max; see
+        retrieval_filters). The textbook source filter from RETRIEVAL_SOURCE
+        always applies and, like the others, is evaluated inside the index
+        query, so only matching chunks are ranked.
+        """
+        if not self.textbook_vectorstore and self.vector_index is None and self.lexical_index is None:
             print("⚠️ Textbook vector store not available")
             return []
         
         try:
+            filters = normalize_filters({**default_filters(), **(filters or {})})
             # Retrieve chunks from textbook database
-            chunks = self.textbook_vectorstore.similarity_search(query, k=k)
-            
-            print(f"📚 Retrieved {len(chunks)} textbook chunks for: '{query}'")
+            with metrics.timed("retrieval"):
+                chunks = self._search_chunks(query, k=k, filters=filters, query_vector=query_vector)
             
-            # Validate that all chunks are from textbook
-            textbook_chunks = []
-            for chunk in chunks:
-                if chunk.metadata.get('source') == 'textbook.pdf':
-                    textbook_chunks.append(chunk)
-                else:
-                    print(f"⚠️ Non-textbook chunk found: {chunk.metadata}")
-            
-            print(f"✅ Validated {len(textbook_chunks)} pure textbook chunks")
-            return textbook_chunks
+            print(f"📚 Retrieved {len(chunks)} textbook chunks for: '{query}'" + (f" {filters}" if filters else ""))
+            return chunks
             
         except Exception as e:
             print(f"❌ Error retrieving textbook chunks: {e}")
             return []
+
+    def _pack_context(self, level: str, chunks: List[Document]) -> PackedContext:
+        """Pack retrieved chunks, best first, into the mode's context token budget."""
+        if level == "advanced":
+            # Textbook is just a reference in advanced mode, not the primary source
+            chunks, render = chunks[:2], lambda chunk, text: text  # Only first 2 chunks
+        else:
+            render = lambda chunk, text: f"[Textbook Page {chunk.metadata.get('page_number', '?')}]: {text}"
+        return pack_context(
+            chunks,
+            self.mode_config[level]["max_context_tokens"],
+            render,
+            model=self.task_router["chat"][level]["model"],
+        )
+
+    def _build_context(self, level: str, chunks: List[Document], packed: Optional[PackedContext] = None) -> str:
+        """Format retrieved chunks into the {context} block for a mode prompt."""
+        if level == "advanced" and not chunks:
+            return "No specific textbook reference available for this topic."
+        return (packed or self._pack_context(level, chunks)).text
+
+    def _build_mode_request(self, level: str, message: str, chunks: List[Document], memory: Optional[ConversationContext] = None, packed: Optional[PackedContext] = None) -> Dict[str, Any]:
+        """
+        Assemble the model, system prompt, user prompt and token limit for a mode.
+        Conversation memory adds its summary to the system prompt and its recent
+        turns as messages before the question. Pass `packed` to reuse chunks
+        already packed with _pack_context.
+        """
+        config = self.mode_config[level]
+        prompt = self.PROMPTS[level].format(
+            context=self._build_context(level, chunks, packed),
+            question=message
+        )
+        system = config["system"]
+        messages: List[Dict[str, str]] = []
+        if memory is not None:
+            if memory.summary:
+                system += f"\n\nSummary of the earlier conversation with this student:\n{memory.summary}"
+            messages.extend(memory.turns)
+        messages.append({"role": "user", "content": prompt})
+        return {
+            "model": self.task_router["chat"][level]["model"],
+            "system": system,
+            "messages": messages,
+            "max_output_tokens": config["max_output_tokens"],
+        }
+
+    def _prepare_mode_request(self, level: str, message: str, chunks: Optional[List[Document]], memory: Optional[ConversationContext] = None) -> Tuple[Dict[str, Any], PackedContext]:
+        """Pack the chunks once and build the mode request from them; the pair feeds _prompt_metadata."""
+        packed = self._pack_context(level, chunks or [])
+        return self._build_mode_request(level, message, chunks or [], memory, packed=packed), packed
+
+    def _prompt_metadata(self, level: str, request: Dict[str, Any], packed: PackedContext, memory: Optional[ConversationContext] = None) -> Dict[str, Any]:
+        """Token accounting of the prompt sent for a mode (reported with the response)."""
+        metadata = {
+            "prompt_tokens": count_chat_tokens(request["system"], request["messages"], request["model"]),
+            "context_tokens": packed.tokens,
+            "context_token_budget": self.mode_config[level]["max_context_tokens"],
+            "context_chunks": len(packed.chunks),
+            "context_chunks_truncated": packed.truncated,
+        }
+        if memory is not None:
+            metadata["memory_turns"] = len(memory.turns)
+            metadata["memory_summarized"] = bool(memory.summary)
+        return metadata
+
+    def _summarize_conversation(self, summary: str, turns: List[Dict[str, str]]) -> str:
+        """Fold older conversation turns into the session's rolling summary."""
+        transcript = "\n".join(f"{turn['role'].capitalize()}: {turn['content']}" for turn in turns)
+        prompt = (
+            "Update the summary of a tutoring conversation with a middle school student. "
+            "Keep the topics discussed, facts the student learned, and anything they were confused about. "
+            "Write at most 5 short sentences.\n\n"
+            f"Current summary:\n{summary or '(none)'}\n\nNew turns:\n{transcript}\n\nUpdated summary:"
+        )
+        with metrics.scope(task="memory"):
+            return self._openai_chat(
+                model=self.task_router["memory"]["model"],
+                system="You summarize conversations concisely.",
+                messages=[{"role": "user", "content": prompt}],
+                max_output_tokens=int(os.getenv("CONVERSATION_SUMMARY_TOKENS", "200")),
+                temperature=0.2,
+            )
     
-    def generate_textbook_answer(self, message: str, history: List[Dict] = None) -> Dict[str, Any]:
+    @staticmethod
+    def _is_insufficient_textbook_answer(answer: str) -> bool:
+        """Detect textbook-mode answers where the model says the context was not enough."""
+        return any(phrase in answer.lower() for phrase in [
+            "i don't have information",
+            "not in the textbook",
+            "cannot be answered",
+            "insufficient information"
+        ])
+
+    def generate_textbook_answer(self, message: str, history: List[Dict] = None, chunks: Optional[List[Document]] = None, suggest: Optional[Callable[[str], List[str]]] = None, memory: Optional[ConversationContext] = None, request: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """
         Generate answer using ONLY textbook content with strict validation.
+        Pass `chunks` to reuse an earlier retrieval, `suggest` to override
+        how suggested questions are produced from the answer, `memory` to
+        give the model the conversation so far and `request` to send a
+        request already built from those chunks.
         """
         print("📘 TEXTBOOK MODE: Strict textbook-only mode activated")
         
@@ -336,7 +995,8 @@ Question: {question}
         config = self.mode_config["textbook"]
         
         # Retrieve textbook chunks
-        chunks = self.retrieve_textbook_chunks(message, k=config["max_chunks"])
+        if chunks is None:
+            chunks = self.retrieve_textbook_chunks(message, k=config["max_chunks"])
         
         if not chunks:
             return {
@@ -346,32 +1006,11 @@ Question: {question}
                 "source": "textbook_only"
             }
         
-        # Build context from textbook chunks only
-        context = "\n\n".join([
-            f"[Textbook Page {chunk.metadata.get('page_number', '?')}]: {chunk.page_content}"
-            for chunk in chunks
-        ])
-        
         try:
             # Use strict textbook prompt with textbook-specific LLM
-            prompt = self.PROMPTS["textbook"].format(
-                context=context,
-                question=message
-            )
-            model = self.task_router["chat"]["textbook"]["model"]
-            answer = self._openai_chat(
-                model=model,
-                system="You are a strict textbook assistant.",
-                messages=[{"role": "user", "content": prompt}],
-                max_output_tokens=int(os.getenv("LLM_MAX_TOKENS_ANSWER", "850")),
-            )
+            answer = self._openai_chat(**(request or self._build_mode_request("textbook", message, chunks, memory)))
             # Validate answer quality
-            if any(phrase in answer.lower() for phrase in [
-                "i don't have information",
-                "not in the textbook",
-                "cannot be answered",
-                "insufficient information"
-            ]):
+            if self._is_insufficient_textbook_answer(answer):
                 return {
                     "success": False,
                     "answer": f"The textbook doesn't contain enough information to answer: '{message}'. Please try asking about topics that are covered in your science textbook.",
@@ -384,7 +1023,7 @@ Question: {question}
             return {
                 "success": True,
                 "answer": answer,
-                "suggested_questions": self.generate_suggested_questions(answer),
+                "suggested_questions": (suggest or self.generate_suggested_questions)(answer),
                 "source": "textbook_only",
                 "chunks_used": len(chunks),
                 "used_mode": "textbook",
@@ -401,7 +1040,7 @@ Question: {question}
                 "mode_notes": "Exception occurred during textbook generation"
             }
     
-    def generate_detailed_answer(self, message: str) -> str:
+    def generate_detailed_answer(self, message: str, chunks: Optional[List[Document]] = None, memory: Optional[ConversationContext] = None, request: Optional[Dict[str, Any]] = None) -> str:
         """
         Generate detailed explanation using textbook + LLM enhancement.
         """
@@ -411,37 +1050,21 @@ Question: {question}
         config = self.mode_config["detailed"]
         
         # Retrieve textbook chunks as primary source
-        chunks = self.retrieve_textbook_chunks(message, k=config["max_chunks"])
+        if chunks is None:
+            chunks = self.retrieve_textbook_chunks(message, k=config["max_chunks"])
         
         if not chunks:
             return "I couldn't find enough textbook content to provide a detailed explanation. Please try asking about topics covered in your science textbook."
         
-        # Build context from textbook chunks
-        context = "\n\n".join([
-            f"[Textbook Page {chunk.metadata.get('page_number', '?')}]: {chunk.page_content}"
-            for chunk in chunks
-        ])
-        
         try:
             # Use detailed prompt with enhanced LLM
-            prompt = self.PROMPTS["detailed"].format(
-                context=context,
-                question=message
-            )
-            
-            model = self.task_router["chat"]["detailed"]["model"]
-            return self._openai_chat(
-                model=model,
-                system="You improve textbook explanations for students.",
-                messages=[{"role": "user", "content": prompt}],
-                max_output_tokens=int(os.getenv("LLM_MAX_TOKENS_ANSWER", "850")),
-            )
+            return self._openai_chat(**(request or self._build_mode_request("detailed", message, chunks, memory)))
             
         except Exception as e:
             print(f"❌ Error generating detailed answer: {e}")
             return "Error generating detailed explanation. Please try again."
     
-    def generate_advanced_answer(self, message: str) -> str:
+    def generate_advanced_answer(self, message: str, chunks: Optional[List[Document]] = None, memory: Optional[ConversationContext] = None, request: Optional[Dict[str, Any]] = None) -> str:
         """
         Generate advanced explanation using primarily LLM knowledge.
         """
@@ -451,35 +1074,18 @@ Question: {question}
         config = self.mode_config["advanced"]
         
         # Optionally retrieve minimal textbook chunks as reference
-        chunks = self.retrieve_textbook_chunks(message, k=config["max_chunks"])
-        
-        # Build minimal context (textbook is just reference, not primary source)
-        context = ""
-        if chunks:
-            context = "\n\n".join([chunk.page_content for chunk in chunks[:2]])  # Only first 2 chunks
-        else:
-            context = "No specific textbook reference available for this topic."
+        if chunks is None:
+            chunks = self.retrieve_textbook_chunks(message, k=config["max_chunks"])
         
         try:
-            # Use advanced prompt with advanced LLM
-            prompt = self.PROMPTS["advanced"].format(
-                context=context,
-                question=message
-            )
-            
-            model = self.task_router["chat"]["advanced"]["model"]
-            return self._openai_chat(
-                model=model,
-                system="You are an advanced science educator.",
-                messages=[{"role": "user", "content": prompt}],
-                max_output_tokens=int(os.getenv("LLM_MAX_TOKENS_ANSWER", "900")),
-            )
+            # Use advanced prompt with advanced LLM (minimal textbook context as reference)
+            return self._openai_chat(**(request or self._build_mode_request("advanced", message, chunks, memory)))
             
         except Exception as e:
             print(f"❌ Error generating advanced answer: {e}")
             return "Error generating advanced explanation. Please try again."
     
-    def generate_answer(self, message: str, level: str = "textbook", history: List[Dict] = None) -> str:
+    def generate_answer(self, message: str, level: str = "textbook", history: List[Dict] = None, chunks: Optional[List[Document]] = None, memory: Optional[ConversationContext] = None, request: Optional[Dict[str, Any]] = None) -> str:
         """
         Main method to generate answers based on level with strict mode enforcement.
         """
@@ -492,14 +1098,14 @@ Question: {question}
         
         try:
             if level == "textbook":
-                result = self.generate_textbook_answer(message, history)
+                result = self.generate_textbook_answer(message, history, chunks=chunks, memory=memory, request=request)
                 return result["answer"]
             
             elif level == "detailed":
-                return self.generate_detailed_answer(message)
+                return self.generate_detailed_answer(message, chunks=chunks, memory=memory, request=request)
             
             elif level == "advanced":
-                return self.generate_advanced_answer(message)
+                return self.generate_advanced_answer(message, chunks=chunks, memory=memory, request=request)
             
             else:
                 raise ValueError(f"Invalid level '{level}'. Please use 'textbook', 'detailed', or 'advanced'.")
@@ -510,6 +1116,10 @@ Question: {question}
     
     def generate_suggested_questions(self, context: str) -> List[str]:
         """Generate suggested questions using OpenAI with smart fallback."""
+        with metrics.scope(task="suggestions"), metrics.timed("suggestions"):
+            return self._generate_suggested_questions(context)
+
+    def _generate_suggested_questions(self, context: str) -> List[str]:
         try:
             if not context or len(context) < 30:
                 return self._get_fallback_questions()
@@ -521,8 +1131,13 @@ Question: {question}
                 f"Content:\n{context[:800]}\n\nReturn JSON array only, e.g., [\"Q1?\", \"Q2?\", \"Q3?\"]."
             )
             print(f"🔍 Generating suggested questions for context: {context[:100]}...")
-            response = self.llm_detailed.invoke(prompt)
-            raw = response.content
+            raw = self._openai_chat(
+                model=self.task_router["chat"]["detailed"]["model"],
+                system=system,
+                messages=[{"role": "user", "content": prompt}],
+                max_output_tokens=int(os.getenv("LLM_MAX_TOKENS_SUGGESTIONS", "200")),
+                temperature=0.3,
+            )
             print(f"📝 Raw response: {raw[:200]}...")
             try:
                 data = json.loads(raw)
@@ -541,68 +1156,356 @@ Question: {question}
                         questions.append(clean)
             if len(questions) >= 3:
                 return questions[:3]
-            # Heuristic fallback: build context-specific questions from keywords
-            import re
-            words = [w.lower() for w in re.findall(r"[A-Za-z][A-Za-z\-]{2,}", context)][:400]
-            stop = {
-                "the","and","that","with","from","this","these","those","into","about","which","their","there","have","has","will","would","could","should","for","are","was","were","been","being","than","then","also","such","other","more","most","very","over","under","between","within","without","using","use","used","based","including","example","examples","because","while","when","where","what","why","how"
-            }
-            keywords = [w for w in words if w not in stop]
-            topic = keywords[0] if keywords else "this topic"
-            rel = keywords[1] if len(keywords) > 1 else topic
-            extra = keywords[2] if len(keywords) > 2 else rel
-            heuristic = [
-                f"Can you explain {topic} in more detail?",
-                f"How does {topic} relate to {rel}?",
-                f"What are the key factors that influence {extra}?",
-            ]
-            while len(heuristic) < 3:
-                heuristic.append(self._get_fallback_questions()[len(heuristic)])
-            return heuristic[:3]
+            # Too few usable questions from the model: fall back to the key terms of the content
+            return self._local_suggested_questions("", None, context)
         except Exception as e:
             print(f"❌ Error generating questions: {e}")
-            return self._get_fallback_questions()
+            metrics.count_error("suggestions")
+            return self._local_suggested_questions("", None, context or "")
+    
+    def generate_local_suggested_questions(self, message: str, chunks: Optional[List[Document]] = None, answer: str = "") -> List[str]:
+        """Suggested questions from the key terms of the retrieved chunks (no LLM call)."""
+        with metrics.scope(task="suggestions"), metrics.timed("suggestions"):
+            return self._local_suggested_questions(message, chunks, answer)
+
+    def _local_suggested_questions(self, message: str, chunks: Optional[List[Document]], answer: str) -> List[str]:
+        questions: List[str] = []
+        if self.suggestion_index is not None:
+            try:
+                questions = self.suggestion_index.suggest(message, chunks, answer)
+            except Exception as e:
+                print(f"❌ Error generating local questions: {e}")
+                metrics.count_error("suggestions")
+        # Top up from the fixed questions when the text had too few key terms
+        for question in self._get_topic_specific_questions(f"{message} {answer}"):
+            if len(questions) >= 3:
+                break
+            if question not in questions:
+                questions.append(question)
+        return questions[:3]
+
+    def _suggest_after_answer(self, level: str, message: str, chunks: Optional[List[Document]], answer: str) -> List[str]:
+        """Suggested questions for a finished answer, following the mode's strategy."""
+        if self.mode_config.get(level, {}).get("suggestions") == "local":
+            return self.generate_local_suggested_questions(message, chunks, answer)
+        return self.generate_suggested_questions(answer)
+
+    # Canned suggestions; precompute_answers.py answers them ahead of time
+    FALLBACK_QUESTIONS = [
+        "Can you explain more about this topic?",
+        "What are the key points to remember?",
+        "How does this relate to other concepts?"
+    ]
+    TOPIC_QUESTIONS = [
+        (("solar system", "planet"), [
+            "What are the eight planets in our solar system?",
+            "How do planets orbit around the Sun?",
+            "What makes Earth special compared to other planets?"
+        ]),
+        (("sun", "star"), [
+            "How does the Sun produce light and heat?",
+            "Why does the Sun appear bigger than other stars?",
+            "What would happen to Earth without the Sun?"
+        ]),
+        (("moon",), [
+            "Why does the Moon have different phases?",
+            "How does the Moon affect Earth's oceans?",
+            "How far away is the Moon from Earth?"
+        ]),
+    ]
+    
+    @classmethod
+    def canned_questions(cls) -> List[str]:
+        """Every fixed question handed out as a suggestion."""
+        questions = [q for _, topic_questions in cls.TOPIC_QUESTIONS for q in topic_questions]
+        return questions + cls.FALLBACK_QUESTIONS
     
     def _get_fallback_questions(self) -> List[str]:
         """Get fallback questions."""
-        return [
-            "Can you explain more about this topic?",
-            "What are the key points to remember?", 
-            "How does this relate to other concepts?"
-        ]
+        return list(self.FALLBACK_QUESTIONS)
     
     def _get_topic_specific_questions(self, context: str) -> List[str]:
         """Generate topic-specific questions based on context."""
         context_lower = context.lower()
         
-        if 'solar system' in context_lower or 'planet' in context_lower:
-            return [
-                "What are the eight planets in our solar system?",
-                "How do planets orbit around the Sun?",
-                "What makes Earth special compared to other planets?"
-            ]
-        elif 'sun' in context_lower or 'star' in context_lower:
-            return [
-                "How does the Sun produce light and heat?",
-                "Why does the Sun appear bigger than other stars?",
-                "What would happen to Earth without the Sun?"
-            ]
-        elif 'moon' in context_lower:
-            return [
-                "Why does the Moon have different phases?",
-                "How does the Moon affect Earth's oceans?",
-                "How far away is the Moon from Earth?"
-            ]
-        else:
-            return self._get_fallback_questions()
+        for keywords, questions in self.TOPIC_QUESTIONS:
+            if any(keyword in context_lower for keyword in keywords):
+                return list(questions)
+        return self._get_fallback_questions()
     
-    def get_chat_response(self, message: str, level: str = "textbook", history: List[Dict] = None) -> Dict[str, Any]:
+    def get_chat_response(
+        self,
+        message: str,
+        level: str = "textbook",
+        history: List[Dict] = None,
+        turn_id: Optional[str] = None,
+        chunk_ids: Optional[List[Any]] = None,
+        session_id: Optional[str] = None,
+        remember: bool = True,
+    ) -> Dict[str, Any]:
         """
         Get complete chat response with mode-specific handling.
+        Concurrent identical questions (same normalized text and level) are
+        coalesced onto a single computation.
+
+        The response carries a turn_id and the chunk_ids it was grounded on;
+        pass them back (e.g. when rewriting the answer in another mode) to
+        reuse that turn's retrieval instead of searching again.
+
+        With a session_id, the session's conversation memory goes into the
+        prompt and the turn is recorded (unless remember=False). Answers that
+        depend on earlier turns bypass the precomputed answers, the answer
+        cache and single-flight.
+        """
+        turn_id = turn_id or uuid.uuid4().hex
+        memory = self.conversation_memory.context(session_id, history, message)
+        compute = lambda: self._cached_chat_response(message, level, history, turn_id, chunk_ids)
+        with metrics.scope(mode=level), metrics.timed("request"):
+            precomputed = None
+            if self.answer_store is not None and memory.empty:
+                precomputed = self.answer_store.lookup(level, message)
+                metrics.cache_event("answer_store", "hit" if precomputed is not None else "miss")
+            if precomputed is not None:
+                response = {**precomputed, "precomputed": True}
+            elif not memory.empty:
+                response = self._compute_chat_response(message, level, history, turn_id, chunk_ids, memory)
+            elif self.single_flight is None:
+                response = compute()
+            else:
+                key = SingleFlight.make_key(level, normalize_question(message))
+                response, shared = self.single_flight.do(key, compute)
+                if shared:
+                    response["coalesced"] = True
+                    metrics.cache_event("single_flight", "coalesced")
+        if response.get("turn_id") != turn_id:
+            # Served from another turn (cached, precomputed or coalesced):
+            # this turn reuses that turn's chunks when rewritten later
+            self.retrieval_cache.link(turn_id, message, response.get("chunk_ids") or [])
+            response["turn_id"] = turn_id
+        if session_id:
+            if remember and response.get("success", True):
+                self.conversation_memory.record(session_id, message, response["answer"])
+            response["session_id"] = session_id
+        return response
+
+    def get_all_mode_responses(self, message: str, history: List[Dict] = None, turn_id: Optional[str] = None, chunk_ids: Optional[List[Any]] = None, session_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Answer the question in every mode at once.
+        Retrieval runs once at the deepest max_chunks and the modes are
+        generated concurrently, each reusing that retrieval through the turn.
+        With a session_id, the turn is remembered once, with the first
+        successful answer in mode order.
+        """
+        events = self.stream_all_mode_responses(message, history, turn_id, chunk_ids, session_id)
+        result: Dict[str, Any] = {"modes": {}}
+        for item in events:
+            if item["event"] == "retrieval":
+                result.update(item["data"])
+            elif item["event"] == "mode":
+                result["modes"][item["data"]["level"]] = item["data"]
+        result["modes"] = {mode: result["modes"][mode] for mode in self.mode_config if mode in result["modes"]}
+        return result
+
+    def stream_all_mode_responses(self, message: str, history: List[Dict] = None, turn_id: Optional[str] = None, chunk_ids: Optional[List[Any]] = None, session_id: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Event stream for get_all_mode_responses: one "retrieval" event, then one
+        "mode" event per mode in completion order, then "done".
+        """
+        return metrics.iterate_in_scope(self._stream_all_mode_responses(message, history, turn_id, chunk_ids, session_id), mode="all")
+
+    def _stream_all_mode_responses(self, message: str, history: List[Dict] = None, turn_id: Optional[str] = None, chunk_ids: Optional[List[Any]] = None, session_id: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        turn_id = turn_id or uuid.uuid4().hex
+        depth = max(config["max_chunks"] for config in self.mode_config.values())
+        chunks = self.retrieve_for_turn(turn_id, message, k=depth, chunk_ids=chunk_ids)
+        yield {"event": "retrieval", "data": {"turn_id": turn_id, "chunk_ids": chunk_ids_of(chunks), "chunks_retrieved": len(chunks), "session_id": session_id}}
+
+        futures = {
+            self.mode_executor.submit(self.get_chat_response, message, mode, history, turn_id, session_id=session_id, remember=False): mode
+            for mode in self.mode_config
+        }
+        answers: Dict[str, str] = {}
+        for future in as_completed(futures):
+            mode = futures[future]
+            try:
+                response = future.result()
+            except Exception as e:
+                print(f"❌ Error generating {mode} answer: {e}")
+                response = {
+                    "answer": f"Error generating {mode} explanation. Please try again.",
+                    "suggested_questions": self._get_fallback_questions(),
+                    "success": False,
+                    "used_mode": mode,
+                }
+            if response.get("success", True):
+                answers[mode] = response["answer"]
+            yield {"event": "mode", "data": {**response, "level": mode}}
+        remembered = next((answers[mode] for mode in self.mode_config if mode in answers), None)
+        if remembered is not None:
+            self.conversation_memory.record(session_id, message, remembered)
+        yield {"event": "done", "data": {}}
+
+    def answer_batch(self, items: List[Dict[str, Any]], on_result: Optional[Callable[[int, Dict[str, Any]], None]] = None) -> List[Dict[str, Any]]:
+        """
+        Answer a list of {"question", "level"} items, returning results in input order.
+
+        Query embeddings for all questions are fetched up front in one batched
+        call (they land in the embedding cache used by retrieval and the answer
+        cache), then items run on the bounded batch pool. Failures are reported
+        per item instead of failing the whole batch. on_result(index, result)
+        is called as each item finishes.
+        """
+        self._prefetch_query_embeddings([
+            item.get("question") for item in items
+            if isinstance(item, dict) and isinstance(item.get("question"), str)
+        ])
+        results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+        futures = {self.batch_executor.submit(self._answer_batch_item, item): index for index, item in enumerate(items)}
+        for future in as_completed(futures):
+            index = futures[future]
+            results[index] = {"index": index, **future.result()}
+            if on_result is not None:
+                on_result(index, results[index])
+        return results
+
+    def submit_batch(self, items: List[Dict[str, Any]]) -> str:
+        """Run answer_batch in the background and return a job id to poll."""
+        job_id = self.batch_jobs.create(len(items))
+
+        def _run():
+            self.batch_jobs.start(job_id)
+            try:
+                self.answer_batch(items, on_result=lambda index, result: self.batch_jobs.set_result(job_id, index, result))
+                self.batch_jobs.finish(job_id)
+            except Exception as e:
+                print(f"❌ Batch job {job_id} failed: {e}")
+                self.batch_jobs.finish(job_id, error=str(e))
+
+        threading.Thread(target=_run, name=f"batch-{job_id[:8]}", daemon=True).start()
+        print(f"📦 Started batch job {job_id} with {len(items)} questions")
+        return job_id
+
+    def _answer_batch_item(self, item: Any) -> Dict[str, Any]:
+        """Answer one batch item; never raises."""
+        if not isinstance(item, dict):
+            return {"success": False, "error": "Each item must be an object with a question and level"}
+        question = item.get("question")
+        level = item.get("level") or "textbook"
+        if not isinstance(question, str) or len(question.strip()) < 3:
+            return {"question": question, "level": level, "success": False, "error": "Please provide a valid question (at least 3 characters)"}
+        if level not in self.mode_config:
+            return {"question": question, "level": level, "success": False, "error": f"Invalid level '{level}'"}
+        try:
+            response = self.get_chat_response(question, level)
+            return {
+                "question": question,
+                "level": level,
+                "success": bool(response.get("success", True)),
+                "answer": response.get("answer"),
+                "suggested_questions": response.get("suggested_questions", []),
+                "chunk_ids": response.get("chunk_ids", []),
+            }
+        except Exception as e:
+            print(f"❌ Error answering batch item '{question}': {e}")
+            return {"question": question, "level": level, "success": False, "error": str(e)}
+
+    def _prefetch_query_embeddings(self, questions: List[str]) -> None:
+        """Embed all questions in one call to warm the embedding cache."""
+        if not questions or not isinstance(self.embeddings, CachedEmbeddings):
+            return
+        texts = list(dict.fromkeys(questions))
+        try:
+            self.embeddings.embed_documents(texts)
+        except Exception as e:
+            print(f"⚠️ Batched query embedding failed, embedding per question instead: {e}")
+
+    def _cached_chat_response(
+        self,
+        message: str,
+        level: str = "textbook",
+        history: List[Dict] = None,
+        turn_id: Optional[str] = None,
+        chunk_ids: Optional[List[Any]] = None,
+    ) -> Dict[str, Any]:
+        """Served from the semantic answer cache when a similar question was already answered."""
+        if self.answer_cache is None:
+            return self._compute_chat_response(message, level, history, turn_id, chunk_ids)
+
+        try:
+            cached, vector = self.answer_cache.lookup(level, message, self.embeddings.embed_query)
+        except Exception as e:
+            print(f"⚠️ Answer cache lookup failed: {e}")
+            cached, vector = None, None
+        if cached is not None:
+            metrics.cache_event("answer", "hit")
+            cached["cache_hit"] = True
+            return cached
+        metrics.cache_event("answer", "miss")
+
+        # Retrieval reuses the question embedding made for the lookup
+        query_vector = vector.tolist() if vector is not None else None
+        response = self._compute_chat_response(message, level, history, turn_id, chunk_ids, query_vector=query_vector)
+        if self._is_cacheable_response(response):
+            self.answer_cache.store(level, message, response, vector)
+        return response
+
+    @staticmethod
+    def _is_cacheable_response(response: Dict[str, Any]) -> bool:
+        """Only successful, non-fallback answers are worth caching."""
+        answer = response.get("answer") or ""
+        return bool(response.get("success")) and not answer.startswith((
+            "Error generating",
+            "I couldn't find",
+            "Please provide",
+        ))
+
+    def _compute_chat_response(
+        self,
+        message: str,
+        level: str = "textbook",
+        history: List[Dict] = None,
+        turn_id: Optional[str] = None,
+        chunk_ids: Optional[List[Any]] = None,
+        memory: Optional[ConversationContext] = None,
+        query_vector: Optional[List[float]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Run retrieval and generation for one question (no answer caching).
+        Retrieval goes through the per-turn cache; suggested questions follow
+        the mode's "suggestions" strategy.
         """
+        config = self.mode_config.get(level)
+        strategy = config.get("suggestions", "sequential") if config else "sequential"
+        valid_message = bool(message) and len(message.strip()) >= 3
+        chunks: Optional[List[Document]] = None
+        suggest: Callable[[str], List[str]] = self.generate_suggested_questions
+        suggestion_future: Optional[Future] = None
+        request: Optional[Dict[str, Any]] = None
+
+        if config and valid_message:
+            chunks = self.retrieve_for_turn(turn_id, message, k=config["max_chunks"], chunk_ids=chunk_ids, query_vector=query_vector)
+        metadata = {"turn_id": turn_id, "chunk_ids": chunk_ids_of(chunks or [])}
+        if config and valid_message and (chunks or level == "advanced"):
+            # Packed and token-counted once, for both the metadata and the LLM call
+            request, packed = self._prepare_mode_request(level, message, chunks, memory)
+            if strategy == "structured":
+                # The structured call reports its own (longer) prompt token count
+                return {**metadata, **self._structured_chat_response(message, level, chunks, memory, request=request, packed=packed)}
+            metadata.update(self._prompt_metadata(level, request, packed, memory))
+
+        if config and valid_message and strategy == "local":
+            suggest = lambda answer: self.generate_local_suggested_questions(message, chunks, answer)
+        elif config and valid_message and strategy == "parallel":
+            if chunks or level == "advanced":
+                # Suggestions come from the retrieved chunks, so they need not wait for the answer
+                suggestion_future = self.executor.submit(metrics.in_scope(self.generate_suggested_questions, self._chunks_text(chunks) or message))
+                suggest = lambda _answer: suggestion_future.result()
+
         if level == "textbook":
             # For textbook mode, use the structured response
-            result = self.generate_textbook_answer(message, history)
+            result = self.generate_textbook_answer(message, history, chunks=chunks, suggest=suggest, memory=memory, request=request)
+            if suggestion_future is not None and not result.get("success", True):
+                # No suggestions are served for a failed answer; skip the call if it has not started
+                suggestion_future.cancel()
             return {
                 "answer": result["answer"],
                 "suggested_questions": result.get("suggested_questions", []),
@@ -610,18 +1513,21 @@ Question: {question}
                 "success": result.get("success", True),
                 "source": result.get("source", "textbook_only"),
                 "used_mode": result.get("used_mode", "textbook"),
-                "mode_notes": result.get("mode_notes")
+                "mode_notes": result.get("mode_notes"),
+                **metadata,
             }
         
         # For other modes
-        answer = self.generate_answer(message, level, history)
+        answer = self.generate_answer(message, level, history, chunks=chunks, memory=memory, request=request)
+        return {**self._mode_response(level, answer, suggest(answer)), **metadata}
+
+    def _mode_response(self, level: str, answer: str, suggested_questions: List[str]) -> Dict[str, Any]:
+        """Response dict for detailed/advanced answers."""
         used_mode = level if level in ("textbook", "detailed", "advanced") else "textbook"
         mode_notes = (
             "Detailed mode: textbook grounded with light elaboration" if used_mode == "detailed"
             else "Advanced mode: allows deeper reasoning beyond textbook"
         )
-        suggested_questions = self.generate_suggested_questions(answer)
-        
         return {
             "answer": answer,
             "suggested_questions": suggested_questions,
@@ -631,20 +1537,221 @@ Question: {question}
             "used_mode": used_mode,
             "mode_notes": mode_notes
         }
+
+    @staticmethod
+    def _chunks_text(chunks: Optional[List[Document]]) -> str:
+        """Plain text of retrieved chunks, used as suggestion source."""
+        return "\n\n".join(chunk.page_content for chunk in (chunks or []))
+
+    def _structured_chat_response(
+        self,
+        message: str,
+        level: str,
+        chunks: List[Document],
+        memory: Optional[ConversationContext] = None,
+        request: Optional[Dict[str, Any]] = None,
+        packed: Optional[PackedContext] = None,
+    ) -> Dict[str, Any]:
+        """
+        Produce the answer and suggested questions in a single JSON completion.
+        Falls back to the raw completion plus heuristic questions if the JSON is malformed.
+        `request` and `packed` (from _prepare_mode_request) are reused when given.
+        """
+        print(f"🧩 STRUCTURED {level.upper()} MODE: answer + suggestions in one call")
+        if request is None or packed is None:
+            request, packed = self._prepare_mode_request(level, message, chunks, memory)
+        messages = [dict(m) for m in request["messages"]]
+        request = {**request, "messages": messages}
+        messages[-1]["content"] += (
+            "\nReturn a JSON object with two keys: \"answer\" (the full answer text in the format above, "
+            "as a single string) and \"suggested_questions\" (an array of exactly 3 follow-up questions a "
+            "middle school student might ask, each under 120 characters and ending with a question mark)."
+        )
+        prompt_metadata = self._prompt_metadata(level, request, packed, memory)
+        try:
+            raw = self._openai_chat(**request, response_format={"type": "json_object"})
+        except Exception as e:
+            print(f"❌ Error generating structured {level} answer: {e}")
+            raw = ""
+        try:
+            data = json.loads(raw)
+            answer = str(data.get("answer") or "").strip()
+            questions = [q.strip() for q in data.get("suggested_questions", []) if isinstance(q, str) and q.strip()]
+        except Exception:
+            answer, questions = raw.strip(), []
+        if not answer:
+            return {
+                "answer": f"Error generating {level} explanation. Please try again.",
+                "suggested_questions": self._get_topic_specific_questions(message),
+                "level": level,
+                "success": False,
+                "source": "textbook_only" if level == "textbook" else f"{level}_mode",
+                "used_mode": level,
+                "mode_notes": f"Exception occurred during {level} generation"
+            }
+        if len(questions) < 3:
+            questions = self.generate_suggested_questions(answer) if not questions else (questions + self._get_fallback_questions())[:3]
+        questions = questions[:3]
+
+        if level != "textbook":
+            return {**self._mode_response(level, answer, questions), **prompt_metadata}
+        if self._is_insufficient_textbook_answer(answer):
+            return {
+                "answer": f"The textbook doesn't contain enough information to answer: '{message}'. Please try asking about topics that are covered in your science textbook.",
+                "suggested_questions": self._get_topic_specific_questions(message),
+                "level": level,
+                "success": False,
+                "source": "textbook_only",
+                "used_mode": "textbook",
+                "mode_notes": "Insufficient textbook chunks found to confidently answer."
+            }
+        return {
+            "answer": answer,
+            "suggested_questions": questions,
+            "level": level,
+            "success": True,
+            "source": "textbook_only",
+            "used_mode": "textbook",
+            "mode_notes": "Answer generated strictly from retrieved textbook chunks.",
+            **prompt_metadata,
+        }
+    
+    def stream_chat_response(
+        self,
+        message: str,
+        level: str = "textbook",
+        history: List[Dict] = None,
+        turn_id: Optional[str] = None,
+        chunk_ids: Optional[List[Any]] = None,
+        session_id: Optional[str] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Streaming counterpart of get_chat_response.
+
+        Yields events as dicts {"event": ..., "data": ...}: one "token" event per
+        completion delta, then "suggestions", "metadata" and finally "done".
+        Errors are reported as an "error" event followed by "done".
+        """
+        return metrics.iterate_in_scope(self._stream_chat_response(message, level, history, turn_id, chunk_ids, session_id), mode=level)
+
+    def _stream_chat_response(
+        self,
+        message: str,
+        level: str = "textbook",
+        history: List[Dict] = None,
+        turn_id: Optional[str] = None,
+        chunk_ids: Optional[List[Any]] = None,
+        session_id: Optional[str] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        if level not in ("textbook", "detailed", "advanced"):
+            yield {"event": "error", "data": {"error": f"Invalid level '{level}'. Please use 'textbook', 'detailed', or 'advanced'."}}
+            yield {"event": "done", "data": {}}
+            return
+
+        print(f"📩 Question (stream): {message}")
+        print(f"🎯 Mode: {level.upper()}")
+        turn_id = turn_id or uuid.uuid4().hex
+        memory = self.conversation_memory.context(session_id, history, message)
+        chunks = self.retrieve_for_turn(turn_id, message, k=self.mode_config[level]["max_chunks"], chunk_ids=chunk_ids)
+
+        if not chunks and level != "advanced":
+            if level == "textbook":
+                answer = f"I couldn't find information about '{message}' in the textbook. This topic may not be covered in your science textbook, or you might need to rephrase your question."
+            else:
+                answer = "I couldn't find enough textbook content to provide a detailed explanation. Please try asking about topics covered in your science textbook."
+            yield {"event": "token", "data": {"text": answer}}
+            yield {"event": "suggestions", "data": {"suggested_questions": self._get_topic_specific_questions(message)}}
+            yield {"event": "metadata", "data": {"success": False, "level": level, "used_mode": level, "chunks_used": 0, "turn_id": turn_id, "chunk_ids": [], "session_id": session_id}}
+            yield {"event": "done", "data": {}}
+            return
+
+        parts: List[str] = []
+        request, packed = self._prepare_mode_request(level, message, chunks, memory)
+        try:
+            for delta in self._openai_chat_stream(**request):
+                parts.append(delta)
+                yield {"event": "token", "data": {"text": delta}}
+        except Exception as e:
+            print(f"❌ Error streaming {level} answer: {e}")
+            yield {"event": "error", "data": {"error": f"Error generating {level} explanation. Please try again."}}
+            yield {"event": "done", "data": {}}
+            return
+
+        answer = "".join(parts).strip()
+        success = True
+        if level == "textbook":
+            mode_notes = "Answer generated strictly from retrieved textbook chunks."
+            if self._is_insufficient_textbook_answer(answer):
+                success = False
+                mode_notes = "Insufficient textbook chunks found to confidently answer."
+        elif level == "detailed":
+            mode_notes = "Detailed mode: textbook grounded with light elaboration"
+        else:
+            mode_notes = "Advanced mode: allows deeper reasoning beyond textbook"
+
+        if success:
+            self.conversation_memory.record(session_id, message, answer)
+        suggested_questions = self._suggest_after_answer(level, message, chunks, answer) if success else self._get_topic_specific_questions(message)
+        yield {"event": "suggestions", "data": {"suggested_questions": suggested_questions}}
+        yield {"event": "metadata", "data": {
+            "success": success,
+            "level": level,
+            "used_mode": level,
+            "chunks_used": len(chunks),
+            "mode_notes": mode_notes,
+            "turn_id": turn_id,
+            "chunk_ids": chunk_ids_of(chunks),
+            "session_id": session_id,
+            **self._prompt_metadata(level, request, packed, memory),
+        }}
+        yield {"event": "done", "data": {}}
+    
+    def component_status(self) -> Dict[str, bool]:
+        """Which components finished loading (used by the readiness endpoint)."""
+        return {
+            "embeddings": getattr(self, "embeddings", None) is not None,
+            "llms": all(
+                self.mode_config.get(mode, {}).get("llm") is not None
+                for mode in ["textbook", "detailed", "advanced"]
+            ),
+            "prompts": bool(getattr(self, "PROMPTS", None)),
+            "textbook_vectorstore": getattr(self, "textbook_vectorstore", None) is not None,
+            "lexical_index": getattr(self, "lexical_index", None) is not None,
+            "suggestion_index": getattr(self, "suggestion_index", None) is not None,
+            "openai_pool_warmed": bool(getattr(self, "openai_pool", None) and self.openai_pool.warmed_up),
+            "answer_cache": getattr(self, "answer_cache", None) is not None,
+            "answer_store": getattr(self, "answer_store", None) is not None,
+            "embedding_cache": isinstance(getattr(self, "embeddings", None), CachedEmbeddings),
+        }
     
     def get_service_status(self) -> Dict[str, Any]:
         """Get service status with textbook database info."""
         return {
             "textbook_vectorstore_available": self.textbook_vectorstore is not None,
+            "retrieval_backend": self._effective_retrieval_backend(),
+            "retrieval_filters": default_filters(),
+            "lexical_index": self.lexical_index.info if self.lexical_index is not None else {"loaded": False},
+            "suggestion_index": self.suggestion_index.info if self.suggestion_index is not None else {"loaded": False},
             "llm_modes_initialized": all(
                 self.mode_config[mode]["llm"] is not None 
                 for mode in ["textbook", "detailed", "advanced"]
             ),
             "api_key_configured": bool(self.openai_api_key),
             "routing": self.task_router,
+            "openai_pool": self.openai_pool.status(),
+            "resilience": {"hedging": self.hedging_enabled, **self.model_health.stats()},
+            "answer_cache": self.answer_cache.stats() if self.answer_cache else {"enabled": False},
+            "answer_store": self.answer_store.stats() if self.answer_store else {"enabled": False},
+            "embedding_cache": self.embeddings.stats() if isinstance(self.embeddings, CachedEmbeddings) else {"enabled": False},
+            "single_flight": self.single_flight.stats() if self.single_flight else {"enabled": False},
+            "retrieval_cache": self.retrieval_cache.stats(),
+            "batch_jobs": self.batch_jobs.stats(),
+            "conversation_memory": self.conversation_memory.stats(),
             "mode_configurations": {
                 mode: {
                     "max_chunks": config["max_chunks"],
+                    "max_context_tokens": config.get("max_context_tokens"),
+                    "suggestions": config.get("suggestions"),
                     "description": config["description"],
                     "strict_textbook_only": config.get("strict_textbook_only", False)
                 }
@@ -653,8 +1760,90 @@ Question: {question}
         }
 
 
-# Create singleton instance
-llm_service = LLMService()
+class LazyLLMService:
+    """
+    Module-level stand-in for the LLMService singleton.
+
+    Construction (embeddings, LLM clients, Chroma and its self-test query) is
+    deferred until the first attribute access, so importing this module does
+    no network I/O and does not require OPENAI_API_KEY. Call
+    start_background_warmup() to build the service on a daemon thread instead.
+    """
+
+    def __init__(self):
+        self._instance: Optional[LLMService] = None
+        self._lock = threading.Lock()
+        self._warmup_thread: Optional[threading.Thread] = None
+        self._error: Optional[str] = None
+        self._init_ms: Optional[float] = None
+
+    def _get_instance(self) -> LLMService:
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    print("🚀 Initializing LLM service...")
+                    start = time.perf_counter()
+                    try:
+                        self._instance = LLMService()
+                        self._error = None
+                    except Exception as e:
+                        self._error = str(e)
+                        raise
+                    finally:
+                        self._init_ms = round((time.perf_counter() - start) * 1000, 1)
+                    print(f"✅ LLM service ready in {self._init_ms} ms")
+        return self._instance
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._get_instance(), name)
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._instance is not None
+
+    def start_background_warmup(self) -> threading.Thread:
+        """Build the service on a daemon thread (idempotent)."""
+        with self._lock:
+            if self._warmup_thread is None or (not self._warmup_thread.is_alive() and self._instance is None):
+                def _warm():
+                    try:
+                        self._get_instance()
+                    except Exception as e:
+                        print(f"❌ Background LLM service warm-up failed: {e}")
+
+                self._warmup_thread = threading.Thread(target=_warm, name="llm-service-warmup", daemon=True)
+                self._warmup_thread.start()
+        return self._warmup_thread
+
+    def readiness(self) -> Dict[str, Any]:
+        """
+        Report whether the service is built and which components are loaded.
+        status tells "not_loaded" (nothing has built it yet) apart from
+        "loading", "failed" (the last build raised) and "ready".
+        """
+        loading = bool(self._warmup_thread and self._warmup_thread.is_alive())
+        instance = self._instance
+        components = instance.component_status() if instance is not None else {}
+        if instance is not None:
+            status = "ready"
+        elif loading:
+            status = "loading"
+        elif self._error is not None:
+            status = "failed"
+        else:
+            status = "not_loaded"
+        return {
+            "ready": instance is not None,
+            "status": status,
+            "loading": loading,
+            "init_ms": self._init_ms,
+            "error": self._error,
+            "components": components,
+        }
+
+
+# Lazily-constructed singleton instance
+llm_service = LazyLLMService()
 
 
 # Convenience functions
@@ -666,6 +1855,6 @@ def get_suggestions(answer: str) -> List[str]:
     """Get suggested follow-up questions."""
     return llm_service.generate_suggested_questions(answer)
 
-def get_textbook_chunks(query: str, k: int = 3) -> List[Document]:
+def get_textbook_chunks(query: str, k: int = 3, filters: Optional[Dict[str, Any]] = None) -> List[Document]:
     """Get textbook chunks for a query."""
-    return llm_service.retrieve_textbook_chunks(query, k)
\ No newline at end of file
+    return llm_service.retrieve_textbook_chunks(query, k, filters=filters)
\ No newline at end of file
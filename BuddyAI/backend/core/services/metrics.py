@@ -0,0 +1,289 @@
+"""
+In-process metrics exported in the Prometheus text format at /metrics.
+
+Kept dependency-free: counters and histograms with labels, a registry that
+renders them, and helpers used across the services:
+
+- timed(stage): latency histogram + error counter for a pipeline stage
+- observe_llm_call(...): per-call latency, token counts and errors by mode/model
+- cache_event(cache, result): hits/misses of the answer, retrieval and embedding caches
+- scope(mode=..., task=...): labels that calls further down the stack pick up
+  (iterate_in_scope() does the same for generators)
+
+The mode of the current request travels in a context variable, so helpers
+deep in the stack (retrieval, embeddings, LLM calls) are labelled without
+threading it through every signature. Work submitted to thread pools should
+be wrapped with in_scope() to carry the labels over. The mode usually comes
+from the request, so values outside MODES are recorded as "other" to keep
+the number of series bounded.
+
+Each worker process keeps its own metrics; scrape every worker (or run one).
+"""
+
+import contextvars
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 40.0, math.inf)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192, math.inf)
+
+MODES = ("textbook", "detailed", "advanced", "all")
+
+_labels: contextvars.ContextVar[Dict[str, str]] = contextvars.ContextVar("metrics_labels", default={})
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[Any], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: Any) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in values
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(set(buckets) | {math.inf}))
+        # key -> [per-bucket counts..., sum, count]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    def count(self, **labels: Any) -> int:
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return int(state[-1]) if state else 0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted((key, list(state)) for key, state in self._values.items())
+        lines = self.header()
+        for key, state in values:
+            cumulative = 0
+            for bound, n in zip(self.buckets, state):
+                cumulative += n
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(round(state[-2], 6))}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {int(state[-1])}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "buddy_stage_duration_seconds",
+    "Latency of a pipeline stage (request, retrieval, embedding, suggestions, translation, media_search).",
+    ("stage", "mode"),
+))
+STAGE_ERRORS = REGISTRY.register(Counter(
+    "buddy_stage_errors_total",
+    "Errors raised by a pipeline stage.",
+    ("stage", "mode"),
+))
+LLM_SECONDS = REGISTRY.register(Histogram(
+    "buddy_llm_request_duration_seconds",
+    "Latency of a single LLM completion attempt (streams: until the last token).",
+    ("mode", "task", "model"),
+))
+LLM_FIRST_TOKEN_SECONDS = REGISTRY.register(Histogram(
+    "buddy_llm_time_to_first_token_seconds",
+    "Time until the first streamed token of an LLM completion.",
+    ("mode", "task", "model"),
+))
+LLM_TOKENS = REGISTRY.register(Histogram(
+    "buddy_llm_tokens",
+    "Prompt and completion tokens per LLM completion.",
+    ("mode", "task", "model", "kind"),
+    buckets=TOKEN_BUCKETS,
+))
+LLM_ERRORS = REGISTRY.register(Counter(
+    "buddy_llm_errors_total",
+    "Failed LLM completion attempts by error (HTTP status or exception type).",
+    ("mode", "task", "model", "error"),
+))
+CACHE_EVENTS = REGISTRY.register(Counter(
+    "buddy_cache_events_total",
+    "Cache lookups by cache and result (hit, miss, top_up, coalesced, ...).",
+    ("cache", "mode", "result"),
+))
+
+
+def current_labels() -> Dict[str, str]:
+    """mode/task of the current request ("none"/"answer" outside one)."""
+    labels = _labels.get()
+    return {"mode": labels.get("mode", "none"), "task": labels.get("task", "answer")}
+
+
+def mode_label(mode: Any) -> str:
+    """The mode as a metrics label: one of MODES, else "other"."""
+    return mode if mode in MODES else "other"
+
+
+def _merged(labels: Dict[str, Any]) -> Dict[str, str]:
+    if "mode" in labels:
+        labels = {**labels, "mode": mode_label(labels["mode"])}
+    return {**_labels.get(), **labels}
+
+
+@contextmanager
+def scope(**labels: str) -> Iterator[None]:
+    """Label everything measured inside the block, e.g. scope(mode="detailed")."""
+    token = _labels.set(_merged(labels))
+    try:
+        yield
+    finally:
+        _labels.reset(token)
+
+
+def in_scope(fn: Callable, *args: Any, **kwargs: Any) -> Callable[[], Any]:
+    """Bind fn to the current labels, for submission to a thread pool."""
+    context = contextvars.copy_context()
+    return lambda: context.run(fn, *args, **kwargs)
+
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    """Record the block's latency (and any exception) under `stage`."""
+    mode = current_labels()["mode"]
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.inc(stage=stage, mode=mode)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage, mode=mode)
+
+
+def count_error(stage: str) -> None:
+    """Count an error a stage handled itself (e.g. by serving a fallback)."""
+    STAGE_ERRORS.inc(stage=stage, mode=current_labels()["mode"])
+
+
+def cache_event(cache: str, result: str, n: int = 1) -> None:
+    if n:
+        CACHE_EVENTS.inc(n, cache=cache, mode=current_labels()["mode"], result=result)
+
+
+def observe_llm_call(
+    model: str,
+    seconds: float,
+    prompt_tokens: Optional[int] = None,
+    completion_tokens: Optional[int] = None,
+    error: Optional[str] = None,
+) -> None:
+    """Record one LLM completion attempt."""
+    labels = {**current_labels(), "model": model}
+    LLM_SECONDS.observe(seconds, **labels)
+    if error is not None:
+        LLM_ERRORS.inc(**labels, error=error)
+        return
+    if prompt_tokens is not None:
+        LLM_TOKENS.observe(prompt_tokens, **labels, kind="prompt")
+    if completion_tokens is not None:
+        LLM_TOKENS.observe(completion_tokens, **labels, kind="completion")
+
+
+def observe_first_token(model: str, seconds: float) -> None:
+    LLM_FIRST_TOKEN_SECONDS.observe(seconds, **current_labels(), model=model)
+
+
+def iterate_in_scope(iterator: Iterator[Any], **labels: str) -> Iterator[Any]:
+    """
+    Drive a generator with the given labels. Unlike scope(), this is safe
+    around yields: the generator runs in its own context on every step.
+    """
+    context = contextvars.copy_context()
+    context.run(_labels.set, _merged(labels))
+    while True:
+        try:
+            item = context.run(next, iterator)
+        except StopIteration:
+            return
+        yield item
+
+
+def render() -> str:
+    return REGISTRY.render()
@@ -0,0 +1,227 @@
+"""
+Process-wide pooled OpenAI clients.
+
+All chat completions in the backend share one client, so HTTP keep-alive connections (and their TLS sessions) are reused across
+requests instead of being rebuilt for every completion. Per-model semaphores
+cap how many requests are in flight against a single model at once.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+import httpx
+from openai import OpenAI
+
+DEFAULT_BASE_URL = "https://api.openai.com/v1"
+
+
+class ModelSlotTimeout(TimeoutError):
+    """No concurrency slot for the model freed up in time; the request never reached the API."""
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _parse_model_limits(raw: Optional[str]) -> Dict[str, int]:
+    """Parse "gpt-4o=8,gpt-4o-mini=16" into {"gpt-4o": 8, "gpt-4o-mini": 16}."""
+    limits: Dict[str, int] = {}
+    for item in (raw or "").split(","):
+        if "=" not in item:
+            continue
+        model, _, value = item.partition("=")
+        try:
+            limits[model.strip()] = max(1, int(value))
+        except ValueError:
+            continue
+    return limits
+
+
+class OpenAIClientPool:
+    """
+    Shared OpenAI client backed by a bounded httpx connection pool.
+
+    Configuration (environment variables):
+    - OPENAI_MAX_CONNECTIONS: total connections in the pool (default 32)
+    - OPENAI_MAX_KEEPALIVE: idle keep-alive connections kept open (default 16)
+    - OPENAI_KEEPALIVE_EXPIRY: seconds an idle connection is kept (default 60)
+    - OPENAI_TIMEOUT: request timeout in seconds (default 60)
+    - OPENAI_MODEL_CONCURRENCY: per-model limits, e.g. "gpt-4o=8,gpt-4o-mini=16"
+    - OPENAI_DEFAULT_MODEL_CONCURRENCY: limit for models not listed (default 16)
+    - OPENAI_MODEL_QUEUE_TIMEOUT: max seconds to wait for a model slot (default 30)
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        base_url: Optional[str] = None,
+        *,
+        max_connections: Optional[int] = None,
+        max_keepalive: Optional[int] = None,
+        keepalive_expiry: Optional[float] = None,
+        timeout: Optional[float] = None,
+        model_limits: Optional[Dict[str, int]] = None,
+        default_model_limit: Optional[int] = None,
+        queue_timeout: Optional[float] = None,
+    ):
+        self.api_key = api_key
+        self.base_url = base_url or os.getenv("OPENAI_API_BASE") or DEFAULT_BASE_URL
+        self.max_connections = max_connections or _env_int("OPENAI_MAX_CONNECTIONS", 32)
+        self.max_keepalive = max_keepalive or _env_int("OPENAI_MAX_KEEPALIVE", 16)
+        self.keepalive_expiry = keepalive_expiry or _env_float("OPENAI_KEEPALIVE_EXPIRY", 60.0)
+        self.timeout = timeout or _env_float("OPENAI_TIMEOUT", 60.0)
+        self.model_limits = model_limits if model_limits is not None else _parse_model_limits(os.getenv("OPENAI_MODEL_CONCURRENCY"))
+        self.default_model_limit = default_model_limit or _env_int("OPENAI_DEFAULT_MODEL_CONCURRENCY", 16)
+        self.queue_timeout = queue_timeout or _env_float("OPENAI_MODEL_QUEUE_TIMEOUT", 30.0)
+
+        self._lock = threading.Lock()
+        self._client: Optional[OpenAI] = None
+        self._direct_client: Optional[OpenAI] = None
+        self._semaphores: Dict[str, threading.BoundedSemaphore] = {}
+        self._in_flight: Dict[str, int] = {}
+        self._queued_waits = 0
+        self._queue_timeouts = 0
+        self.warmed_up = False
+        self.warmup_ms: Optional[float] = None
+
+    def _limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+    @property
+    def client(self) -> OpenAI:
+        """The shared synchronous client (created on first use)."""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    http_client = httpx.Client(limits=self._limits(), timeout=self.timeout)
+                    self._client = OpenAI(api_key=self.api_key, base_url=self.base_url, http_client=http_client)
+        return self._client
+
+    @property
+    def direct_client(self) -> OpenAI:
+        """The shared client with SDK-level retries disabled, for callers that retry themselves."""
+        if self._direct_client is None:
+            client = self.client
+            with self._lock:
+                if self._direct_client is None:
+                    self._direct_client = client.with_options(max_retries=0)
+        return self._direct_client
+
+    def limit_for(self, model: str) -> int:
+        return self.model_limits.get(model, self.default_model_limit)
+
+    def _semaphore(self, model: str) -> threading.BoundedSemaphore:
+        sem = self._semaphores.get(model)
+        if sem is None:
+            with self._lock:
+                sem = self._semaphores.setdefault(model, threading.BoundedSemaphore(self.limit_for(model)))
+        return sem
+
+    def _track(self, model: str, delta: int) -> None:
+        with self._lock:
+            self._in_flight[model] = self._in_flight.get(model, 0) + delta
+
+    @contextmanager
+    def model_slot(self, model: str):
+        """Hold one of the model's concurrency slots for the duration of a call."""
+        sem = self._semaphore(model)
+        if not sem.acquire(blocking=False):
+            with self._lock:
+                self._queued_waits += 1
+            if not sem.acquire(timeout=self.queue_timeout):
+                with self._lock:
+                    self._queue_timeouts += 1
+                raise ModelSlotTimeout(f"Timed out waiting for a free {model} slot")
+        self._track(model, 1)
+        try:
+            yield
+        finally:
+            self._track(model, -1)
+            sem.release()
+
+    def warm_up(self, connections: Optional[int] = None) -> bool:
+        """
+        Open keep-alive connections ahead of the first real request.
+
+        Issues a few concurrent lightweight `models.list()` calls so that the
+        first burst of questions does not pay DNS/TCP/TLS setup. The pings
+        are not retried and time out after OPENAI_POOL_WARMUP_TIMEOUT seconds
+        (default 5), so an unreachable API cannot hold up start-up.
+        """
+        connections = max(1, connections or _env_int("OPENAI_POOL_WARMUP_CONNECTIONS", 2))
+        client = self.client.with_options(max_retries=0, timeout=_env_float("OPENAI_POOL_WARMUP_TIMEOUT", 5.0))
+        start = time.perf_counter()
+
+        def _ping(_):
+            client.models.list()
+
+        try:
+            with ThreadPoolExecutor(max_workers=connections) as executor:
+                list(executor.map(_ping, range(connections)))
+            self.warmed_up = True
+        except Exception as e:
+            print(f"⚠️ OpenAI pool warm-up failed: {e}")
+            self.warmed_up = False
+        self.warmup_ms = round((time.perf_counter() - start) * 1000, 1)
+        return self.warmed_up
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            in_flight = dict(self._in_flight)
+            queued_waits = self._queued_waits
+            queue_timeouts = self._queue_timeouts
+        return {
+            "base_url": self.base_url,
+            "max_connections": self.max_connections,
+            "max_keepalive": self.max_keepalive,
+            "keepalive_expiry": self.keepalive_expiry,
+            "model_limits": {model: self.limit_for(model) for model in set(self.model_limits) | set(self._semaphores)},
+            "default_model_limit": self.default_model_limit,
+            "in_flight": in_flight,
+            "queued_waits": queued_waits,
+            "queue_timeouts": queue_timeouts,
+            "warmed_up": self.warmed_up,
+            "warmup_ms": self.warmup_ms,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+                self._direct_client = None
+
+
+_pool: Optional[OpenAIClientPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_openai_pool(api_key: Optional[str] = None, base_url: Optional[str] = None) -> OpenAIClientPool:
+    """Return the process-wide client pool, creating it on first call."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                key = api_key or os.getenv("OPENAI_API_KEY")
+                if not key:
+                    raise ValueError("OPENAI_API_KEY is not set.")
+                _pool = OpenAIClientPool(api_key=key, base_url=base_url)
+    return _pool
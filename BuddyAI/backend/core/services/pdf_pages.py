@@ -0,0 +1,69 @@
+"""
+Streaming PDF page extraction.
+
+iter_pdf_pages() yields one Document per page (the same page_content and
+source/page metadata as PyPDFLoader), in page order, without ever holding
+the whole book. Small PDFs are read page by page in this process; larger
+ones are split into page ranges extracted by a process pool, with only a
+bounded number of ranges in flight so memory stays flat however long the
+book is.
+
+Configuration (environment variables):
+- PDF_EXTRACT_WORKERS: extraction processes (default: CPU count, at most 4;
+  1 disables the pool)
+- PDF_PARALLEL_MIN_PAGES: smallest page count worth a pool (default 64)
+- PDF_PAGES_PER_TASK: pages extracted per pool task (default: about four
+  tasks per worker, 16-64 pages; every task re-opens the PDF)
+"""
+
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional, Tuple
+
+from langchain.schema import Document
+
+
+def _reader(path: str):
+    # pypdf is what PyPDFLoader uses; only needed when a PDF is actually read
+    from pypdf import PdfReader
+    return PdfReader(path)
+
+
+def page_count(path: str) -> int:
+    return len(_reader(path).pages)
+
+
+def _extract_range(path: str, start: int, stop: int) -> List[Tuple[int, str]]:
+    """Worker task: texts of pages [start, stop) of the PDF."""
+    reader = _reader(path)
+    return [(number, reader.pages[number].extract_text() or "") for number in range(start, stop)]
+
+
+def _page_document(path: str, number: int, text: str) -> Document:
+    return Document(page_content=text, metadata={"source": path, "page": number})
+
+
+def iter_pdf_pages(path: str, workers: Optional[int] = None) -> Iterator[Document]:
+    """Yield the PDF's pages lazily, in order."""
+    reader = _reader(path)
+    total = len(reader.pages)
+    workers = workers or int(os.getenv("PDF_EXTRACT_WORKERS", "0")) or min(4, os.cpu_count() or 1)
+    if workers <= 1 or total < int(os.getenv("PDF_PARALLEL_MIN_PAGES", "64")):
+        for number in range(total):
+            yield _page_document(path, number, reader.pages[number].extract_text() or "")
+        return
+
+    del reader
+    per_task = int(os.getenv("PDF_PAGES_PER_TASK", "0")) or min(64, max(16, total // (workers * 4)))
+    ranges = iter([(start, min(start + per_task, total)) for start in range(0, total, per_task)])
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Two ranges per worker in flight: busy workers, bounded memory
+        pending = deque(pool.submit(_extract_range, path, *r) for _, r in zip(range(workers * 2), ranges))
+        while pending:
+            pages = pending.popleft().result()
+            next_range = next(ranges, None)
+            if next_range is not None:
+                pending.append(pool.submit(_extract_range, path, *next_range))
+            for number, text in pages:
+                yield _page_document(path, number, text)
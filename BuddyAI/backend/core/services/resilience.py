@@ -0,0 +1,233 @@
+"""
+Retry, circuit-breaker and latency bookkeeping for chat completions.
+
+- retry_delay: jittered exponential backoff that honours Retry-After
+- CircuitBreaker: per-model breaker; while open, calls go straight to the
+  fallback model instead of waiting on an unhealthy primary
+- LatencyTracker: rolling per-model latencies whose p95 is the deadline for
+  hedged requests
+- ModelHealth: registry of the above plus counters for get_service_status
+"""
+
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def status_code(error: Exception) -> Optional[int]:
+    """HTTP status of an OpenAI SDK error, if it has one."""
+    code = getattr(error, "status_code", None)
+    return code if isinstance(code, int) else None
+
+
+def is_retryable(error: Exception) -> bool:
+    """Rate limits, server errors, timeouts and connection failures are worth retrying."""
+    code = status_code(error)
+    if code is not None:
+        return code in RETRYABLE_STATUS
+    return type(error).__name__ in ("APIConnectionError", "APITimeoutError", "TimeoutError", "ConnectError", "ReadTimeout")
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Server-requested wait from Retry-After / retry-after-ms headers."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        return None
+    return None
+
+
+def retry_delay(attempt: int, retry_after: Optional[float] = None, base: float = 0.5, cap: float = 8.0) -> float:
+    """
+    Seconds to wait before retry number `attempt` (0-based).
+    Full-jitter exponential backoff, but never less than Retry-After.
+    """
+    delay = random.uniform(0, min(cap, base * (2 ** attempt)))
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    closed: calls allowed. After `failure_threshold` consecutive failures it
+    opens for `cooldown` seconds, during which calls are refused. Then it is
+    half-open: one probe call is allowed; success closes it, failure re-opens.
+
+    available() is a read-only check for choosing models; allow() claims the
+    half-open probe and must only be called right before the real call.
+    """
+
+    def __init__(self, failure_threshold: int = 5, cooldown: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probe_in_flight = False
+        self.opened_count = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at < self.cooldown:
+            return "open"
+        return "half_open"
+
+    def available(self) -> bool:
+        """Whether allow() would currently let a call through (does not claim the probe)."""
+        with self._lock:
+            state = self._state()
+            return state == "closed" or (state == "half_open" and not self._probe_in_flight)
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probe_in_flight = False
+
+    def release(self) -> None:
+        """Give back a probe whose call never reached the model (no success or failure to record)."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._probe_in_flight or (self._opened_at is None and self._failures >= self.failure_threshold):
+                self._opened_at = time.monotonic()
+                self.opened_count += 1
+            self._probe_in_flight = False
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies (seconds)."""
+
+    def __init__(self, window: int = 200):
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, max(0, int(round(pct / 100 * len(samples))) - 1))
+        return samples[index]
+
+
+class ModelHealth:
+    """
+    Per-model breakers and latency trackers plus resilience counters.
+
+    Configuration (environment variables):
+    - LLM_BREAKER_FAILURES: consecutive failures that open a breaker (default 5)
+    - LLM_BREAKER_COOLDOWN: seconds a breaker stays open (default 30)
+    - LLM_HEDGE_MIN_SAMPLES: latencies needed before using the p95 (default 20)
+    - LLM_HEDGE_DEFAULT_DEADLINE: hedge deadline in seconds until then (default 8)
+    - LLM_HEDGE_MIN_DEADLINE: lower bound of the hedge deadline in seconds (default 1)
+    """
+
+    def __init__(self):
+        self.failure_threshold = int(_env_float("LLM_BREAKER_FAILURES", 5))
+        self.cooldown = _env_float("LLM_BREAKER_COOLDOWN", 30.0)
+        self.hedge_min_samples = int(_env_float("LLM_HEDGE_MIN_SAMPLES", 20))
+        self.hedge_default_deadline = _env_float("LLM_HEDGE_DEFAULT_DEADLINE", 8.0)
+        self.hedge_min_deadline = _env_float("LLM_HEDGE_MIN_DEADLINE", 1.0)
+        self._lock = threading.Lock()
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._latency: Dict[str, LatencyTracker] = {}
+        self.counters = {
+            "calls": 0,
+            "failures": 0,
+            "retries": 0,
+            "retry_after_honoured": 0,
+            "fallbacks": 0,
+            "breaker_skips": 0,
+            "hedges_fired": 0,
+            "hedges_won": 0,
+        }
+
+    def breaker(self, model: str) -> CircuitBreaker:
+        with self._lock:
+            if model not in self._breakers:
+                self._breakers[model] = CircuitBreaker(self.failure_threshold, self.cooldown)
+            return self._breakers[model]
+
+    def latency(self, model: str) -> LatencyTracker:
+        with self._lock:
+            if model not in self._latency:
+                self._latency[model] = LatencyTracker()
+            return self._latency[model]
+
+    def count(self, counter: str, n: int = 1) -> None:
+        with self._lock:
+            self.counters[counter] += n
+
+    def hedge_deadline(self, model: str) -> float:
+        """Seconds to wait on the primary before firing a hedged request."""
+        tracker = self.latency(model)
+        if len(tracker) < self.hedge_min_samples:
+            return self.hedge_default_deadline
+        return max(self.hedge_min_deadline, tracker.percentile(95))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self.counters)
+            models = sorted(set(self._breakers) | set(self._latency))
+        per_model = {}
+        for model in models:
+            tracker = self.latency(model)
+            p50, p95 = tracker.percentile(50), tracker.percentile(95)
+            breaker = self.breaker(model)
+            per_model[model] = {
+                "breaker": breaker.state,
+                "breaker_opened": breaker.opened_count,
+                "samples": len(tracker),
+                "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+                "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            }
+        return {**counters, "models": per_model}
@@ -0,0 +1,141 @@
+"""
+Per-turn cache of retrieved textbook chunks.
+
+A chat turn retrieves chunks once; rewriting the answer in another mode or
+opening the chapter view for the same question reuses them instead of
+searching again. Entries are keyed on (turn id, normalized query) and hold
+the chunks in rank order plus the depth they were retrieved to, so a larger
+k only triggers a top-up search whose new chunks are appended. A turn
+answered from a cache is linked to the chunk ids of the answer it reused;
+those chunks are only looked up when the turn needs them.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from langchain.schema import Document
+
+from . import metrics
+from .answer_cache import normalize_question
+from .lexical_index import chunk_key, chunk_ref
+
+
+def chunk_ids_of(chunks: List[Document]) -> List[Any]:
+    """
+    Client-facing ids of retrieved chunks (lexical_index.chunk_ref): the
+    content_hash set at ingest, which is scoped to the source and survives
+    a re-ingest, or source:chunk_id on a database built before it.
+    """
+    return [ref for ref in (chunk_ref(chunk.metadata) for chunk in chunks) if ref]
+
+
+class TurnRetrievalCache:
+    """
+    LRU + TTL cache of ranked chunks per (turn id, query).
+
+    Configuration (environment variables):
+    - RETRIEVAL_CACHE_MAX_ENTRIES: LRU capacity (default 2000)
+    - RETRIEVAL_CACHE_TTL: entry lifetime in seconds (default 3600)
+    """
+
+    def __init__(self, max_entries: Optional[int] = None, ttl_seconds: Optional[float] = None):
+        self.max_entries = max_entries or int(os.getenv("RETRIEVAL_CACHE_MAX_ENTRIES", "2000"))
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else float(os.getenv("RETRIEVAL_CACHE_TTL", "3600"))
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, str], Dict[str, Any]]" = OrderedDict()
+        self.counters = {
+            "hits": 0,
+            "top_ups": 0,
+            "misses": 0,
+            "rehydrated": 0,
+        }
+
+    def _get(self, key: Tuple[str, str]) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if self.ttl_seconds > 0 and time.time() - entry["created_at"] > self.ttl_seconds:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def _put(self, key: Tuple[str, str], chunks: Optional[List[Document]], depth: int, chunk_ids: Optional[List[Any]] = None) -> None:
+        with self._lock:
+            self._entries[key] = {"chunks": chunks, "chunk_ids": chunk_ids, "depth": depth, "created_at": time.time()}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            self.counters[counter] += 1
+        metrics.cache_event("retrieval", counter)
+
+    def link(self, turn_id: str, query: str, chunk_ids: List[Any]) -> None:
+        """Let a turn reuse the chunks (by id) of the turn whose answer it was served, unless it retrieved its own."""
+        key = (turn_id, normalize_question(query))
+        if chunk_ids and self._get(key) is None:
+            self._put(key, None, len(chunk_ids), chunk_ids=list(chunk_ids))
+
+    def get_or_retrieve(
+        self,
+        turn_id: str,
+        query: str,
+        k: int,
+        retrieve: Callable[[str, int], List[Document]],
+        chunk_ids: Optional[List[Any]] = None,
+        lookup: Optional[Callable[[List[Any]], List[Document]]] = None,
+    ) -> List[Document]:
+        """
+        Top-k chunks for the turn, searching only when the cache cannot serve k.
+
+        lookup(chunk_ids) rebuilds the entry from the ids of a linked turn or
+        from chunk_ids the client sent back (e.g. after the entry expired or
+        the request landed on another worker).
+        """
+        key = (turn_id, normalize_question(query))
+        entry = self._get(key)
+        if entry is not None and entry["chunks"] is None:
+            chunk_ids, entry = entry["chunk_ids"], None
+        if entry is None and chunk_ids and lookup is not None:
+            chunks = lookup(chunk_ids)
+            if chunks:
+                self._count("rehydrated")
+                entry = {"chunks": chunks, "depth": len(chunks)}
+                self._put(key, chunks, len(chunks))
+
+        if entry is not None and entry["depth"] >= k:
+            self._count("hits")
+            return entry["chunks"][:k]
+
+        fresh = retrieve(query, k)
+        if entry is None:
+            self._count("misses")
+            merged = fresh
+        else:
+            # Top-up: keep the chunks we already served first, append the new ones
+            self._count("top_ups")
+            seen = {chunk_key(chunk) for chunk in entry["chunks"]}
+            merged = entry["chunks"] + [chunk for chunk in fresh if chunk_key(chunk) not in seen]
+        if merged:
+            # Empty results are usually a failed search; retry on the next call
+            self._put(key, merged, k)
+        return merged[:k]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self.counters)
+            size = len(self._entries)
+        lookups = counters["hits"] + counters["top_ups"] + counters["misses"]
+        return {
+            **counters,
+            "entries": size,
+            "hit_rate": round(counters["hits"] / lookups, 3) if lookups else 0.0,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+        }
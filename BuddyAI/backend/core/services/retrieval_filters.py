@@ -0,0 +1,112 @@
+"""
+Metadata filters for textbook retrieval.
+
+Filters are evaluated inside the index query rather than on its results,
+so a search always returns the top k chunks among the matching ones. The
+same filter dict works on every backend:
+- Chroma: translated to a `where` clause (to_chroma_where)
+- NumPy and BM25 indexes: a boolean row mask over the index metadatas,
+  cached per filter (FilterMasks)
+
+Supported keys: source, chapter, section and grade (a value or a list of
+values) and page_min / page_max (inclusive 1-based page range). A chunk
+matches the page range when any of its pages, page_number through
+page_number_end, falls inside it.
+"""
+
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+MATCH_KEYS = ("source", "chapter", "section", "grade")
+# A chunk overlaps [page_min, page_max] when it ends at or after page_min
+# and starts at or before page_max
+RANGE_KEYS = {"page_min": ("page_number_end", "$gte"), "page_max": ("page_number", "$lte")}
+
+
+def default_filters() -> Dict[str, Any]:
+    """Filters applied to every textbook query (RETRIEVAL_SOURCE, empty to search all sources)."""
+    source = os.getenv("RETRIEVAL_SOURCE", "textbook.pdf")
+    return {"source": source} if source else {}
+
+
+def normalize_filters(filters: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Drop empty values and unknown keys; chapters are compared as strings."""
+    normalized: Dict[str, Any] = {}
+    for key, value in (filters or {}).items():
+        if value is None or value == "" or value == []:
+            continue
+        if key in MATCH_KEYS:
+            values = list(value) if isinstance(value, (list, tuple, set)) else [value]
+            if key == "chapter":
+                values = [str(v) for v in values]
+            elif key == "grade":
+                values = [int(v) for v in values]
+            normalized[key] = values[0] if len(values) == 1 else sorted(values)
+        elif key in RANGE_KEYS:
+            normalized[key] = int(value)
+        else:
+            raise ValueError(f"Unknown retrieval filter: {key}")
+    return normalized
+
+
+def to_chroma_where(filters: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    conditions = []
+    for key, value in filters.items():
+        if key in RANGE_KEYS:
+            field, op = RANGE_KEYS[key]
+            condition = {field: {op: value}}
+            if field != "page_number":
+                # Chunks stored without page_number_end end on their first page
+                condition = {"$or": [condition, {"page_number": {op: value}}]}
+            conditions.append(condition)
+        elif isinstance(value, list):
+            conditions.append({key: {"$in": value}})
+        else:
+            conditions.append({key: value})
+    if not conditions:
+        return None
+    return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+
+def matches(metadata: Dict[str, Any], filters: Dict[str, Any]) -> bool:
+    for key, value in filters.items():
+        if key in RANGE_KEYS:
+            page = metadata.get(RANGE_KEYS[key][0], metadata.get("page_number"))
+            if page is None or (page < value if key == "page_min" else page > value):
+                return False
+            continue
+        stored = metadata.get(key)
+        if key == "chapter" and stored is not None:
+            stored = str(stored)
+        if stored not in (value if isinstance(value, list) else [value]):
+            return False
+    return True
+
+
+class FilterMasks:
+    """Boolean row masks of an index's metadatas, one per distinct filter."""
+
+    def __init__(self, metadatas: List[Dict[str, Any]], max_entries: int = 64):
+        self.metadatas = metadatas
+        self.max_entries = max_entries
+        self._masks: Dict[str, np.ndarray] = {}
+        self._lock = threading.Lock()
+
+    def get(self, filters: Dict[str, Any]) -> Optional[np.ndarray]:
+        """Mask of the matching rows, or None when nothing is filtered."""
+        if not filters:
+            return None
+        key = json.dumps(filters, sort_keys=True)
+        with self._lock:
+            mask = self._masks.get(key)
+        if mask is None:
+            mask = np.fromiter((matches(m or {}, filters) for m in self.metadatas), dtype=bool, count=len(self.metadatas))
+            with self._lock:
+                if len(self._masks) >= self.max_entries:
+                    self._masks.pop(next(iter(self._masks)))
+                self._masks[key] = mask
+        return mask
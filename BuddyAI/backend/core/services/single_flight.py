@@ -0,0 +1,204 @@
+"""
+Single-flight coalescing of identical concurrent calls.
+
+When many students send the same question at the same moment, only the first
+call runs the retrieval + LLM pipeline; the others wait for it and receive a
+copy of its result. Within a process this uses one Future per key. With
+cross-process mode enabled, workers on the same host additionally serialize
+on a file lock and share the finished result through a small sqlite table, so
+a worker that waited on the lock reuses the result instead of recomputing it.
+Keys hash onto a fixed set of lock files, so the lock directory never grows;
+two different questions that share a lock file merely run one after the
+other across processes.
+"""
+
+import copy
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from .cache_paths import cache_path
+
+try:
+    import fcntl
+except ImportError:  # Windows: cross-process coalescing is unavailable
+    fcntl = None
+
+
+class SingleFlight:
+    """
+    Run at most one computation per key at a time and share its result.
+
+    Configuration (environment variables):
+    - SINGLE_FLIGHT_CROSS_PROCESS: also coalesce across worker processes (default 0)
+    - SINGLE_FLIGHT_PATH: sqlite file for shared results (default .buddy_cache/single_flight.sqlite3)
+    - SINGLE_FLIGHT_TIMEOUT: max seconds to wait for another worker's lock (default 120)
+    - SINGLE_FLIGHT_RESULT_TTL: seconds a shared result stays reusable (default 30)
+    - SINGLE_FLIGHT_LOCK_FILES: number of lock files keys are hashed onto (default 256)
+    """
+
+    def __init__(
+        self,
+        cross_process: Optional[bool] = None,
+        path: Optional[str] = None,
+        timeout: Optional[float] = None,
+        result_ttl: Optional[float] = None,
+        lock_files: Optional[int] = None,
+    ):
+        if cross_process is None:
+            cross_process = os.getenv("SINGLE_FLIGHT_CROSS_PROCESS", "0").lower() in ("1", "true", "yes")
+        if cross_process and fcntl is None:
+            print("⚠️ Cross-process single-flight needs fcntl; coalescing within this process only")
+            cross_process = False
+        self.cross_process = cross_process
+        self.path = path or os.getenv("SINGLE_FLIGHT_PATH") or cache_path("single_flight.sqlite3")
+        self.timeout = timeout if timeout is not None else float(os.getenv("SINGLE_FLIGHT_TIMEOUT", "120"))
+        self.result_ttl = result_ttl if result_ttl is not None else float(os.getenv("SINGLE_FLIGHT_RESULT_TTL", "30"))
+        self.lock_files = max(1, lock_files if lock_files is not None else int(os.getenv("SINGLE_FLIGHT_LOCK_FILES", "256")))
+
+        self._lock = threading.Lock()
+        self._in_flight: Dict[str, Future] = {}
+        self._local = threading.local()
+        self.counters = {
+            "calls": 0,
+            "executions": 0,
+            "coalesced": 0,
+            "coalesced_cross_process": 0,
+            "errors": 0,
+        }
+        if self.cross_process:
+            self.lock_dir = f"{self.path}.locks"
+            os.makedirs(self.lock_dir, exist_ok=True)
+            with self._connection() as conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS results ("
+                    " key TEXT PRIMARY KEY,"
+                    " value TEXT NOT NULL,"
+                    " created_at REAL NOT NULL)"
+                )
+
+    @staticmethod
+    def make_key(*parts: str) -> str:
+        return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            self.counters[counter] += 1
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Return (result, shared) for fn(), coalescing concurrent calls with the same key.
+
+        shared is True when the result was computed by another caller. Every
+        caller gets its own deep copy, so callers may mutate the result.
+        Exceptions raised by fn propagate to all waiting callers.
+        """
+        arrived_at = time.time()
+        with self._lock:
+            self.counters["calls"] += 1
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._in_flight[key] = future
+            else:
+                self.counters["coalesced"] += 1
+        if not leader:
+            return copy.deepcopy(future.result()), True
+
+        try:
+            if self.cross_process:
+                result, shared = self._do_cross_process(key, fn, arrived_at)
+            else:
+                result, shared = self._execute(fn), False
+            future.set_result(result)
+            return copy.deepcopy(result), shared
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def _execute(self, fn: Callable[[], Any]) -> Any:
+        self._count("executions")
+        try:
+            return fn()
+        except Exception:
+            self._count("errors")
+            raise
+
+    # ---- cross-process -------------------------------------------------
+
+    def _connection(self) -> sqlite3.Connection:
+        """One connection per thread; sqlite connections are not thread-safe."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _lock_path(self, key: str) -> str:
+        slot = int(hashlib.sha256(key.encode("utf-8")).hexdigest()[:8], 16) % self.lock_files
+        return os.path.join(self.lock_dir, f"slot-{slot}.lock")
+
+    @contextmanager
+    def _file_lock(self, key: str):
+        """Exclusive lock on the key's lock file, shared by all processes on this host."""
+        with open(self._lock_path(key), "a") as handle:
+            deadline = time.monotonic() + self.timeout
+            while True:
+                try:
+                    fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if time.monotonic() >= deadline:
+                        raise TimeoutError("Timed out waiting for an identical request in another worker")
+                    time.sleep(0.02)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def _do_cross_process(self, key: str, fn: Callable[[], Any], arrived_at: float) -> Tuple[Any, bool]:
+        with self._file_lock(key):
+            # A result finished after we arrived was computed while we waited on the lock
+            row = self._connection().execute(
+                "SELECT value FROM results WHERE key = ? AND created_at >= ?",
+                (key, arrived_at),
+            ).fetchone()
+            if row is not None:
+                self._count("coalesced_cross_process")
+                return json.loads(row[0]), True
+
+            result = self._execute(fn)
+            try:
+                now = time.time()
+                with self._connection() as conn:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO results (key, value, created_at) VALUES (?, ?, ?)",
+                        (key, json.dumps(result, default=str), now),
+                    )
+                    conn.execute("DELETE FROM results WHERE created_at < ?", (now - self.result_ttl,))
+            except (sqlite3.Error, TypeError, ValueError) as e:
+                print(f"⚠️ Could not share single-flight result: {e}")
+            return result, False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self.counters)
+            in_flight = len(self._in_flight)
+        shared = counters["coalesced"] + counters["coalesced_cross_process"]
+        return {
+            **counters,
+            "in_flight": in_flight,
+            "coalesce_rate": round(shared / counters["calls"], 3) if counters["calls"] else 0.0,
+            "cross_process": self.cross_process,
+        }
@@ -0,0 +1,260 @@
+"""
+LLM-free suggested follow-up questions from the retrieved textbook chunks.
+
+At ingest time every chunk gets its key terms (words and two-word phrases)
+ranked by TF-IDF over the whole textbook, saved as JSON next to the vector
+store. At answer time the key terms of the retrieved chunks are merged
+(weighted by rank, boosted when the answer mentions them) and filled into
+question templates, which takes well under a millisecond and no API call.
+
+The question's own terms are kept as the focus ("How is X related to
+<focus>?") rather than suggested again, so follow-ups lead somewhere new.
+"""
+
+import json
+import math
+import os
+import re
+import time
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from langchain.schema import Document
+
+from .lexical_index import STOPWORDS, _stem, chunk_ref
+
+INDEX_FILE = "key_terms.json"
+# Version 3 keys chunks on lexical_index.chunk_ref, which retrieved chunks carry too
+INDEX_VERSION = 3
+TERMS_PER_CHUNK = 15
+
+_WORD_RE = re.compile(r"[A-Za-z][A-Za-z'\-]*[A-Za-z]")
+# Phrases never span punctuation, digits or list bullets
+_SEGMENT_SPLIT_RE = re.compile(r"[^A-Za-z'\-\s]+")
+# Words frequent in the textbook layout but useless as topics
+_EXTRA_STOPWORDS = {
+    "fig", "figure", "activity", "let", "us", "chapter", "page", "example", "examples", "like", "just",
+    "think", "look", "find", "make", "made", "called", "know", "see", "seen", "used", "using", "use",
+    "one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten", "first", "second", "known", "get", "got", "way", "ways", "even", "still", "thing",
+    "things", "often", "always", "around", "different", "same", "because", "while", "during", "after",
+    "before", "over", "under", "between", "without", "within", "only", "well", "both", "every", "here",
+    "able", "try", "tried", "write", "draw", "given", "shown", "shows", "show", "important", "near", "far",
+    "said", "says", "tell", "ever", "much", "upon", "onto", "whether", "either", "neither",
+    # Common verbs, adjectives and other words that never make a topic on their own
+    "appear", "appears", "help", "helps", "need", "needs", "want", "take", "takes", "took", "give", "gives",
+    "keep", "keeps", "come", "comes", "came", "goes", "went", "move", "moves", "choose", "indicate", "indicates",
+    "mean", "means", "seem", "seems", "become", "becomes", "became", "call", "calls", "form", "forms", "name",
+    "names", "number", "numbers", "part", "parts", "kind", "kinds", "type", "types", "lot", "lots", "time",
+    "times", "place", "places", "side", "end", "little", "small", "big", "bigger", "large", "larger", "long",
+    "longer", "short", "high", "low", "good", "better", "best", "bad", "new", "old", "great", "clear", "open",
+    "blue", "red", "white", "black", "green", "yellow", "bright", "dim", "easy", "hard", "real", "true",
+    "possible", "certain", "several", "various", "whole", "next", "last", "early", "late", "many", "few",
+    "less", "least", "another", "others", "something", "anything", "nothing", "everything", "someone",
+    "people", "person", "students", "student", "teacher", "friends", "elders", "answer", "question",
+    "questions", "reason", "idea", "ideas", "fact", "facts", "case", "point", "points", "area", "areas",
+    "though", "although", "however", "therefore", "identify", "plan", "dark", "including",
+}
+_STOP = STOPWORDS | _EXTRA_STOPWORDS
+
+
+def _topic_word(word: str) -> bool:
+    """Rough filter for noun-like words (no POS tagger available)."""
+    lower = word.lower()
+    if lower in _STOP or len(word) < 3:
+        return False
+    if lower.endswith("ly") or (lower.endswith("ed") and not lower.endswith("eed")):
+        return False
+    return True
+
+_PHRASE_BOOST = (1.0, 1.3, 1.5)
+
+_DEFINE_TEMPLATES = ["Can you tell me more about {t}?", "What is meant by {t}?", "What should I know about {t}?"]
+_RELATE_TEMPLATES = ["How is {a} related to {b}?", "What is the connection between {a} and {b}?"]
+_EXPLORE_TEMPLATES = ["Why {be} {t} important?", "Can you give an example of {t}?", "How do scientists study {t}?"]
+
+
+def _is_plural(term: str) -> bool:
+    last = term.split()[-1].lower()
+    return last.endswith("s") and not last.endswith(("ss", "us", "is"))
+
+
+def _terms(text: str) -> Iterable[Tuple[str, str]]:
+    """(key, surface form) of every eligible word and two-word phrase in text."""
+    for segment in _SEGMENT_SPLIT_RE.split(text or ""):
+        words = _WORD_RE.findall(segment)
+        keys = [_stem(word.lower()) for word in words]
+        topical = [_topic_word(word) and not word.lower().endswith("ing") for word in words]
+        capitalized = [word[0].isupper() for word in words]
+        # Inside names common words are fine ("Big Dipper")
+        in_name = [cap and word.lower() not in STOPWORDS for word, cap in zip(words, capitalized)]
+        for i, word in enumerate(words):
+            if topical[i] and len(word) >= 4:
+                yield keys[i], word
+            if i + 1 >= len(words):
+                continue
+            # Phrases do not mix case ("constellation Ursa"); names may run to three words
+            if capitalized[i] and capitalized[i + 1]:
+                if in_name[i] and in_name[i + 1] and (topical[i] or topical[i + 1]):
+                    yield f"{keys[i]} {keys[i + 1]}", f"{word} {words[i + 1]}"
+                    if i + 2 < len(words) and in_name[i + 2] and capitalized[i + 2]:
+                        yield f"{keys[i]} {keys[i + 1]} {keys[i + 2]}", " ".join(words[i:i + 3])
+            elif not capitalized[i] and not capitalized[i + 1] and topical[i] and topical[i + 1]:
+                yield f"{keys[i]} {keys[i + 1]}", f"{word} {words[i + 1]}"
+
+
+def _chunk_name(metadata: Dict[str, Any], fallback: Any = None) -> Optional[str]:
+    """Index key of a chunk: its chunk_ref, the same at build time and on retrieved chunks."""
+    ref = chunk_ref(metadata)
+    if ref:
+        return ref
+    return f"id:{fallback}" if fallback is not None else None
+
+
+class KeyTermIndex:
+    """TF-IDF key terms per textbook chunk, plus the corpus statistics to rank new text."""
+
+    def __init__(self, chunk_terms: Dict[str, List[List[Any]]], idf: Dict[str, float], display: Dict[str, str], info: Optional[Dict[str, Any]] = None):
+        self.chunk_terms = chunk_terms
+        self.idf = idf
+        self.display = display
+        self.info = info or {}
+        self._default_idf = max(idf.values()) if idf else 1.0
+
+    def __len__(self) -> int:
+        return len(self.chunk_terms)
+
+    @staticmethod
+    def default_path(textbook_db_path: str) -> str:
+        return os.getenv("SUGGESTION_INDEX_PATH") or os.path.join(textbook_db_path, "suggestion_index")
+
+    @staticmethod
+    def exists(index_dir: str) -> bool:
+        return os.path.exists(os.path.join(index_dir, INDEX_FILE))
+
+    @staticmethod
+    def is_stale(index_dir: str, textbook_db_path: str) -> bool:
+        """True when the index is missing or older than the Chroma database."""
+        index_file = os.path.join(index_dir, INDEX_FILE)
+        if not os.path.exists(index_file):
+            return True
+        chroma_file = os.path.join(textbook_db_path, "chroma.sqlite3")
+        return os.path.exists(chroma_file) and os.path.getmtime(chroma_file) > os.path.getmtime(index_file)
+
+    @classmethod
+    def build(cls, ids: List[str], documents: List[str], metadatas: List[Dict[str, Any]]) -> "KeyTermIndex":
+        per_chunk: List[Counter] = []
+        doc_freq: Counter = Counter()
+        totals: Counter = Counter()
+        surfaces: Dict[str, Counter] = {}
+        for text in documents:
+            counts: Counter = Counter()
+            for key, surface in _terms(text):
+                counts[key] += 1
+                surfaces.setdefault(key, Counter())[surface] += 1
+            per_chunk.append(counts)
+            doc_freq.update(counts.keys())
+            totals.update(counts)
+
+        n = len(documents)
+        # Terms seen once in the whole book are mostly layout noise and names
+        idf = {key: math.log((n + 1) / (df + 1)) + 1 for key, df in doc_freq.items() if totals[key] >= 2}
+        display = {}
+        for key in idf:
+            forms = surfaces[key]
+            lowercase = Counter({form: count for form, count in forms.items() if form == form.lower()})
+            # Lowercase unless the term is always capitalized, like "Pole Star"
+            display[key] = (lowercase or forms).most_common(1)[0][0]
+
+        chunk_terms = {}
+        for i, counts in enumerate(per_chunk):
+            scored = [
+                [key, round((1 + math.log(tf)) * idf[key] * _PHRASE_BOOST[key.count(" ")], 4)]
+                for key, tf in counts.items()
+                if key in idf
+            ]
+            scored.sort(key=lambda item: item[1], reverse=True)
+            chunk_terms[_chunk_name(metadatas[i] or {}, ids[i])] = scored[:TERMS_PER_CHUNK]
+        info = {"version": INDEX_VERSION, "count": n, "terms": len(idf), "created_at": time.time()}
+        return cls(chunk_terms, idf, display, info)
+
+    @classmethod
+    def from_lexical_index(cls, lexical_index) -> "KeyTermIndex":
+        return cls.build(lexical_index.ids, lexical_index.documents, lexical_index.metadatas)
+
+    def save(self, index_dir: str) -> None:
+        os.makedirs(index_dir, exist_ok=True)
+        payload = {**self.info, "idf": self.idf, "display": self.display, "chunk_terms": self.chunk_terms}
+        tmp_path = os.path.join(index_dir, f"{INDEX_FILE}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False)
+        os.replace(tmp_path, os.path.join(index_dir, INDEX_FILE))
+        print(f"✅ Saved key-term index ({len(self.chunk_terms)} chunks, {len(self.idf)} terms) to {index_dir}")
+
+    @classmethod
+    def load(cls, index_dir: str) -> "KeyTermIndex":
+        with open(os.path.join(index_dir, INDEX_FILE), "r", encoding="utf-8") as f:
+            data = json.load(f)
+        info = {k: data[k] for k in ("version", "count", "terms", "created_at") if k in data}
+        return cls(data["chunk_terms"], data["idf"], data["display"], info)
+
+    def terms_for_text(self, text: str, limit: int = TERMS_PER_CHUNK) -> List[List[Any]]:
+        """Key terms of arbitrary text, ranked with the corpus IDF."""
+        counts = Counter(key for key, _ in _terms(text))
+        scored = [
+            [key, (1 + math.log(tf)) * self.idf.get(key, self._default_idf) * _PHRASE_BOOST[key.count(" ")]]
+            for key, tf in counts.items()
+            if key in self.idf
+        ]
+        scored.sort(key=lambda item: item[1], reverse=True)
+        return scored[:limit]
+
+    def terms_for_chunk(self, chunk: Document) -> List[List[Any]]:
+        terms = self.chunk_terms.get(_chunk_name(chunk.metadata))
+        return terms if terms is not None else self.terms_for_text(chunk.page_content)
+
+    def suggest(self, question: str, chunks: Optional[List[Document]] = None, answer: str = "", count: int = 3) -> List[str]:
+        """Up to `count` follow-up questions about the chunks' key terms (fewer if the text has none)."""
+        scores: Dict[str, float] = {}
+        for rank, chunk in enumerate(chunks or []):
+            for key, score in self.terms_for_chunk(chunk):
+                scores[key] = scores.get(key, 0.0) + score / (1 + 0.5 * rank)
+        answer_keys = {key for key, _ in _terms(answer)}
+        if not scores:
+            # No chunks (e.g. advanced mode without textbook hits): rank the answer itself
+            scores = {key: score for key, score in self.terms_for_text(answer)}
+        for key in answer_keys & scores.keys():
+            scores[key] *= 1.5
+
+        question_keys = {key for key, _ in _terms(question)}
+        question_words = {word for key in question_keys for word in key.split()}
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        # The most specific of the question's terms found in the chunks
+        in_chunks = [(key.count(" "), score, key) for key, score in ranked if key in question_keys]
+        focus = max(in_chunks)[2] if in_chunks else None
+        if focus is None and question_keys:
+            focus = max(question_keys, key=lambda key: (self.idf.get(key, 0.0), " " in key))
+            if focus not in self.display:
+                focus = None
+
+        chosen: List[str] = []
+        for key, _ in ranked:
+            words = set(key.split())
+            if words & question_words:
+                continue
+            if any(words & set(other.split()) for other in chosen):
+                continue
+            chosen.append(key)
+            if len(chosen) == count:
+                break
+
+        terms = [self.display.get(key, key) for key in chosen]
+        questions: List[str] = []
+        if terms:
+            questions.append(_DEFINE_TEMPLATES[len(terms[0]) % len(_DEFINE_TEMPLATES)].format(t=terms[0]))
+        if len(terms) > 1:
+            other = self.display.get(focus, focus) if focus else terms[0]
+            questions.append(_RELATE_TEMPLATES[len(terms[1]) % len(_RELATE_TEMPLATES)].format(a=terms[1], b=other))
+        if len(terms) > 2:
+            template = _EXPLORE_TEMPLATES[len(terms[2]) % len(_EXPLORE_TEMPLATES)]
+            questions.append(template.format(t=terms[2], be="are" if _is_plural(terms[2]) else "is"))
+        return questions
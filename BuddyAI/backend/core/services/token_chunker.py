@@ -0,0 +1,130 @@
+"""
+Token-aware sentence chunking for textbook ingestion.
+
+An alternative to the character-based RecursiveCharacterTextSplitter
+(TEXTBOOK_CHUNKER=token, or ingest_textbook.py --chunker token): whole
+sentences are packed into chunks of at most chunk_tokens tokens of the
+embedding model's encoding, and each chunk starts with the trailing
+sentences of the previous one, up to overlap_tokens. Sentences flow across
+page breaks, so a chunk can span pages; it records the page it starts on
+(page, like the character splitter) and the page it ends on (page_end),
+both 0-based like PyPDFLoader's page.
+
+Token counts come from the cached encoders in tokens.py, one batch per page.
+"""
+
+import os
+import re
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from langchain.schema import Document
+
+from .tokens import count_tokens_batch, encoding_name_for_model, get_encoder
+
+TOKEN_CHUNK_SIZE = int(os.getenv("TEXTBOOK_TOKEN_CHUNK_SIZE", "250"))
+TOKEN_CHUNK_OVERLAP = int(os.getenv("TEXTBOOK_TOKEN_CHUNK_OVERLAP", "40"))
+
+# Sentence ends, keeping the whitespace after them with the sentence
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+")
+
+# (text, tokens, 0-based page)
+Sentence = Tuple[str, int, int]
+
+
+def split_sentences(text: str) -> List[str]:
+    """Sentences of a page, each with its trailing whitespace (joining them gives the text back)."""
+    sentences, start = [], 0
+    for match in _SENTENCE_END_RE.finditer(text):
+        sentences.append(text[start:match.end()])
+        start = match.end()
+    if start < len(text):
+        sentences.append(text[start:])
+    return [s for s in sentences if s.strip()]
+
+
+class TokenSentenceChunker:
+    """Pack sentences into token-bounded, overlapping chunks across a stream of pages."""
+
+    def __init__(self, chunk_tokens: int = TOKEN_CHUNK_SIZE, overlap_tokens: int = TOKEN_CHUNK_OVERLAP, model: Optional[str] = None):
+        if overlap_tokens >= chunk_tokens:
+            raise ValueError("overlap_tokens must be smaller than chunk_tokens")
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = overlap_tokens
+        self.model = model or os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-small")
+
+    def _fit(self, sentences: List[str], page: int) -> List[Sentence]:
+        """Count sentence tokens in one batch and cut sentences longer than a chunk."""
+        fitted: List[Sentence] = []
+        for text, tokens in zip(sentences, count_tokens_batch(sentences, self.model)):
+            if tokens <= self.chunk_tokens:
+                fitted.append((text, tokens, page))
+                continue
+            # Tables and lists have no sentence ends: try lines first, then hard token cuts
+            lines = text.splitlines(keepends=True)
+            if len(lines) > 1:
+                fitted.extend(self._fit(lines, page))
+            else:
+                fitted.extend((piece, count, page) for piece, count in self._cut(text, tokens))
+        return fitted
+
+    def _cut(self, text: str, tokens: int) -> List[Tuple[str, int]]:
+        encoder = get_encoder(encoding_name_for_model(self.model))
+        if encoder is None:
+            # Same characters/4 estimate as the token counts
+            size = self.chunk_tokens * 4
+            return [(text[i:i + size], min(self.chunk_tokens, -(-len(text[i:i + size]) // 4))) for i in range(0, len(text), size)]
+        ids = encoder.encode(text, disallowed_special=())
+        return [
+            (encoder.decode(ids[i:i + self.chunk_tokens]), len(ids[i:i + self.chunk_tokens]))
+            for i in range(0, len(ids), self.chunk_tokens)
+        ]
+
+    def _chunk(self, sentences: List[Sentence], base_metadata: dict) -> Document:
+        text = "".join(s[0] for s in sentences).strip()
+        metadata = dict(base_metadata)
+        metadata.update({
+            "page": sentences[0][2],
+            "page_end": sentences[-1][2],
+            "tokens": sum(s[1] for s in sentences),
+        })
+        return Document(page_content=text, metadata=metadata)
+
+    def _overlap(self, sentences: List[Sentence]) -> List[Sentence]:
+        """Trailing sentences of a chunk that fit in the overlap."""
+        carried: List[Sentence] = []
+        total = 0
+        for sentence in reversed(sentences):
+            if total + sentence[1] > self.overlap_tokens:
+                break
+            carried.insert(0, sentence)
+            total += sentence[1]
+        return carried
+
+    def split_pages(self, pages: Iterable[Document]) -> Iterator[Document]:
+        """Chunks of a stream of pages (with PyPDFLoader's 0-based "page" metadata), lazily."""
+        buffer: List[Sentence] = []
+        buffered = 0
+        fresh = 0  # buffered sentences not yet emitted in a chunk
+        base_metadata: dict = {}
+        for page in pages:
+            page_number = int(page.metadata.get("page", 0))
+            if not base_metadata:
+                base_metadata = {k: v for k, v in page.metadata.items() if k != "page"}
+            sentences = split_sentences(page.page_content)
+            if sentences:
+                # Keep a line break at the page boundary
+                sentences[-1] = sentences[-1].rstrip() + "\n"
+            for sentence in self._fit(sentences, page_number):
+                if buffered + sentence[1] > self.chunk_tokens and fresh:
+                    yield self._chunk(buffer, base_metadata)
+                    buffer = self._overlap(buffer)
+                    # Overlap never pushes a chunk over the limit
+                    while buffer and sum(s[1] for s in buffer) + sentence[1] > self.chunk_tokens:
+                        buffer.pop(0)
+                    buffered = sum(s[1] for s in buffer)
+                    fresh = 0
+                buffer.append(sentence)
+                buffered += sentence[1]
+                fresh += 1
+        if fresh:
+            yield self._chunk(buffer, base_metadata)
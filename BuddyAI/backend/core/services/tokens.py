@@ -0,0 +1,68 @@
+"""
+Token counting with cached tiktoken encoders.
+
+Loading an encoder parses a large BPE file, so encoders are created once per
+process and reused. If tiktoken or its encoding files are unavailable (e.g.
+offline on first run), counts fall back to a characters/4 estimate.
+"""
+
+import math
+from functools import lru_cache
+from typing import List, Optional
+
+DEFAULT_ENCODING = "cl100k_base"
+
+_warned = False
+
+
+@lru_cache(maxsize=None)
+def get_encoder(name: str = DEFAULT_ENCODING):
+    """The tiktoken encoding called `name`, or None if it cannot be loaded."""
+    global _warned
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(name)
+    except Exception as e:
+        if not _warned:
+            print(f"⚠️ tiktoken encoding '{name}' unavailable, estimating token counts: {e}")
+            _warned = True
+        return None
+
+
+@lru_cache(maxsize=None)
+def encoding_name_for_model(model: Optional[str]) -> str:
+    """tiktoken encoding used by an OpenAI model, or `model` itself if it names an encoding (cl100k_base if unknown)."""
+    if not model:
+        return DEFAULT_ENCODING
+    try:
+        import tiktoken
+        if model in tiktoken.list_encoding_names():
+            return model
+        return tiktoken.encoding_name_for_model(model)
+    except Exception:
+        return DEFAULT_ENCODING
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """Number of tokens in text for the given model's encoding."""
+    if not text:
+        return 0
+    encoder = get_encoder(encoding_name_for_model(model))
+    if encoder is None:
+        return math.ceil(len(text) / 4)
+    return len(encoder.encode(text, disallowed_special=()))
+
+
+def count_tokens_batch(texts: List[str], model: Optional[str] = None) -> List[int]:
+    """Token counts of many texts in one call (tiktoken encodes the batch in parallel)."""
+    encoder = get_encoder(encoding_name_for_model(model))
+    if encoder is None:
+        return [math.ceil(len(text) / 4) for text in texts]
+    return [len(tokens) for tokens in encoder.encode_batch(texts, disallowed_special=())]
+
+
+def count_chat_tokens(system: str, messages: list, model: Optional[str] = None) -> int:
+    """Prompt tokens of a chat request, including per-message framing overhead."""
+    contents = [system] + [m.get("content") or "" for m in messages]
+    # ~3 framing tokens per message plus 3 priming the assistant reply
+    return sum(count_tokens(c, model) + 3 for c in contents) + 3
@@ -219,6 +219,7 @@ def get_translator() -> TranslatorProviderBase:
         or os.getenv("DEEPSEEK_API_BASE")
         or os.getenv("OPENROUTER_BASE_URL")
         or os.getenv("OPENAI_BASE_URL")
+        or os.getenv("OPENAI_API_BASE")
     )
     # If DeepSeek key is configured but no base is provided, default to DeepSeek API base
     if not llm_base_url and os.getenv("DEEPSEEK_API_KEY"):
@@ -0,0 +1,148 @@
+"""
+In-process NumPy vector index exported from the textbook Chroma database.
+
+The textbook corpus is small (a few thousand chunks at most), so exact
+search with one matrix-vector product is faster than Chroma's per-query
+overhead. Embeddings are normalized once at export time and written as a
+contiguous float32 matrix that is memory-mapped at load time.
+
+Files in the index directory:
+- vectors-<build id>.f32: row-major float32 matrix of unit-length embeddings
+- index.json: ids, documents, metadatas, the matrix shape, the build id
+  and the name of the vectors file
+
+The build id (see answer_store.textbook_build_id) is the freshness key: the
+index is current when it matches the fingerprint of the Chroma collection
+ids, so unrelated writes to chroma.sqlite3 do not force a re-export.
+index.json is written last and names its own vectors file, so a crash
+mid-export leaves the previous, consistent index in place.
+"""
+
+import glob
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain.schema import Document
+
+from .answer_store import textbook_build_id
+from .retrieval_filters import FilterMasks
+
+VECTORS_FILE = "vectors.f32"
+META_FILE = "index.json"
+INDEX_VERSION = 2
+
+
+class NumpyVectorIndex:
+    """Exact cosine-similarity search over a memory-mapped embedding matrix."""
+
+    def __init__(self, matrix: np.ndarray, ids: List[str], documents: List[str], metadatas: List[Dict[str, Any]], info: Optional[Dict[str, Any]] = None):
+        self.matrix = matrix
+        self.ids = ids
+        self.documents = documents
+        self.metadatas = metadatas
+        self.info = info or {}
+        self.filter_masks = FilterMasks(metadatas)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @staticmethod
+    def default_path(textbook_db_path: str) -> str:
+        return os.getenv("NUMPY_INDEX_PATH") or os.path.join(textbook_db_path, "numpy_index")
+
+    @staticmethod
+    def exists(index_dir: str) -> bool:
+        return os.path.exists(os.path.join(index_dir, META_FILE))
+
+    def is_stale(self, build_id: Optional[str]) -> bool:
+        """True when the index was exported from a different build than build_id."""
+        return self.info.get("version") != INDEX_VERSION or self.info.get("build_id") != build_id
+
+    @classmethod
+    def export_from_chroma(cls, vectorstore, index_dir: str, model_name: Optional[str] = None) -> "NumpyVectorIndex":
+        """Dump all embeddings of a Chroma vector store into index_dir."""
+        data = vectorstore._collection.get(include=["embeddings", "documents", "metadatas"])
+        embeddings = np.asarray(data["embeddings"], dtype=np.float32)
+        if embeddings.ndim != 2 or not len(embeddings):
+            raise ValueError("Chroma collection has no embeddings to export")
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        embeddings = np.ascontiguousarray(embeddings / norms, dtype=np.float32)
+
+        build_id = textbook_build_id(data["ids"], model_name)
+        vectors_file = f"vectors-{build_id}.f32"
+
+        os.makedirs(index_dir, exist_ok=True)
+        tmp_vectors = os.path.join(index_dir, f"{vectors_file}.tmp")
+        embeddings.tofile(tmp_vectors)
+        os.replace(tmp_vectors, os.path.join(index_dir, vectors_file))
+
+        info = {
+            "version": INDEX_VERSION,
+            "count": int(embeddings.shape[0]),
+            "dim": int(embeddings.shape[1]),
+            "model": model_name,
+            "build_id": build_id,
+            "created_at": time.time(),
+        }
+        meta = {
+            **info,
+            "vectors_file": vectors_file,
+            "ids": list(data["ids"]),
+            "documents": list(data["documents"]),
+            "metadatas": [m or {} for m in data["metadatas"]],
+        }
+        tmp_meta = os.path.join(index_dir, f"{META_FILE}.tmp")
+        with open(tmp_meta, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp_meta, os.path.join(index_dir, META_FILE))
+        # Readers that mapped an older file keep it alive until they drop it
+        for path in glob.glob(os.path.join(index_dir, "vectors*.f32")):
+            if os.path.basename(path) != vectors_file:
+                os.remove(path)
+        print(f"✅ Exported {info['count']} embeddings ({info['dim']} dims) to {index_dir}")
+        return cls.load(index_dir)
+
+    @classmethod
+    def load(cls, index_dir: str) -> "NumpyVectorIndex":
+        """Memory-map an exported index."""
+        with open(os.path.join(index_dir, META_FILE), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        matrix = np.memmap(
+            os.path.join(index_dir, meta.get("vectors_file", VECTORS_FILE)),
+            dtype=np.float32,
+            mode="r",
+            shape=(meta["count"], meta["dim"]),
+        )
+        info = {k: meta[k] for k in ("version", "count", "dim", "model", "build_id", "created_at") if k in meta}
+        return cls(matrix, meta["ids"], meta["documents"], meta["metadatas"], info)
+
+    def search_by_vector(self, vector: List[float], k: int = 3, filters: Optional[Dict[str, Any]] = None) -> List[Tuple[Document, float]]:
+        """Top-k (document, cosine similarity) pairs among the rows matching filters, best first."""
+        mask = self.filter_masks.get(filters)
+        rows = np.flatnonzero(mask) if mask is not None else None
+        n = len(self.ids) if rows is None else len(rows)
+        if n == 0 or k <= 0:
+            return []
+        query = np.asarray(vector, dtype=np.float32)
+        norm = float(np.linalg.norm(query))
+        if norm:
+            query = query / norm
+        scores = (self.matrix if rows is None else self.matrix[rows]) @ query
+        k = min(k, n)
+        if k < n:
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(n)
+        top = top[np.argsort(-scores[top])]
+        return [
+            (Document(page_content=self.documents[i], metadata=dict(self.metadatas[i])), float(scores[j]))
+            for j, i in zip(top, top if rows is None else rows[top])
+        ]
+
+    def search(self, query: str, k: int, embeddings, filters: Optional[Dict[str, Any]] = None) -> List[Document]:
+        """Embed the query and return the top-k documents."""
+        return [doc for doc, _ in self.search_by_vector(embeddings.embed_query(query), k, filters)]
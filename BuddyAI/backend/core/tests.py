@@ -1,3 +1,1602 @@
-from django.test import TestCase
+import importlib.util
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase
+from langchain.schema import Document
+
+from benchmarks.benchmark_retrieval_quality import pages_from_chunks, parse_chunking, score
+from benchmarks.fake_openai_server import FakeOpenAI, build_parser, make_handler
+from core.services.answer_cache import SemanticAnswerCache, normalize_question
+from core.services.answer_store import PrecomputedAnswerStore, textbook_build_id
+from core.services.batch_embedder import BatchEmbedder
+from core.services.batch_jobs import BatchJobStore
+from core.services.context_packer import pack_context, strip_overlap, truncate_to_sentences
+from core.services.conversation_memory import ConversationMemory
+from core.services import metrics
+from core.services.embedding_cache import CachedEmbeddings
+from core.services.ingestion import (
+    assign_chunk_ids,
+    is_up_to_date,
+    iter_textbook_chunks,
+    load_manifest,
+    metadata_params,
+    save_manifest,
+    sync_chunk_stream,
+    sync_chunks,
+)
+from core.apps import _warmup_enabled
+from core.services.lexical_index import BM25Index, reciprocal_rank_fusion, tokenize
+from core.services.llm_service import LazyLLMService, LLMService
+from core.services.openai_pool import ModelSlotTimeout, OpenAIClientPool, _parse_model_limits
+from core.services.pdf_pages import iter_pdf_pages, page_count
+from core.services.resilience import CircuitBreaker, LatencyTracker, ModelHealth, is_retryable, retry_after_seconds, retry_delay
+from core.services.retrieval_cache import TurnRetrievalCache, chunk_ids_of
+from core.services.retrieval_filters import FilterMasks, matches, normalize_filters, to_chroma_where
+from core.services.single_flight import SingleFlight
+from core.services.suggestion_generator import INDEX_VERSION as KEY_TERM_INDEX_VERSION, KeyTermIndex
+from core.services.token_chunker import TokenSentenceChunker, split_sentences
+from core.services.tokens import count_chat_tokens, count_tokens, encoding_name_for_model
+from core.services.vector_index import NumpyVectorIndex
+from core.views.streaming import format_sse, sse_response
+
+
+class FakeEmbeddings:
+    """Deterministic bag-of-letters embeddings that count their calls."""
+
+    def __init__(self):
+        self.calls = []
+
+    def embed_query(self, text):
+        self.calls.append(text)
+        vector = [0.0] * 26
+        for char in text.lower():
+            if "a" <= char <= "z":
+                vector[ord(char) - ord("a")] += 1.0
+        return vector
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+
+def bare_service(**attrs):
+    """An LLMService without the network-bound start-up, for exercising its orchestration."""
+    service = LLMService.__new__(LLMService)
+    service.mode_config = {}
+    service.answer_store = None
+    service.answer_cache = None
+    service.single_flight = None
+    service.retrieval_cache = TurnRetrievalCache()
+    service.conversation_memory = ConversationMemory(lambda summary, turns: summary)
+    for name, value in attrs.items():
+        setattr(service, name, value)
+    return service
+
+
+def mode_service(strategy="sequential", chunks=None, **attrs):
+    """bare_service() with the three modes configured and retrieval returning `chunks`."""
+    service = bare_service(
+        task_router={"chat": {mode: {"model": "gpt-4o-mini"} for mode in ("textbook", "detailed", "advanced")}},
+        executor=ThreadPoolExecutor(max_workers=2),
+        suggestion_index=None,
+        **attrs,
+    )
+    service._initialize_prompts()
+    service.mode_config = {
+        mode: {"max_chunks": 3, "system": f"{mode} system", "max_output_tokens": 100, "max_context_tokens": 500, "suggestions": strategy}
+        for mode in ("textbook", "detailed", "advanced")
+    }
+    service.retrieve_for_turn = lambda turn_id, query, k=3, **kwargs: list(chunks or [])[:k]
+    return service
+
+
+def chunk(text, **metadata):
+    return Document(page_content=text, metadata={"source": "textbook.pdf", **metadata})
+
+
+def _where_matches(metadata, where):
+    for key, condition in (where or {}).items():
+        if key == "$and":
+            if not all(_where_matches(metadata, part) for part in condition):
+                return False
+        elif key == "$or":
+            if not any(_where_matches(metadata, part) for part in condition):
+                return False
+        elif isinstance(condition, dict):
+            (op, operand), = condition.items()
+            value = metadata.get(key)
+            if op == "$in" and value not in operand:
+                return False
+            if op == "$gte" and (value is None or value < operand):
+                return False
+            if op == "$lte" and (value is None or value > operand):
+                return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+
+class FakeCollection:
+    """In-memory stand-in for a Chroma collection (get/add/update/delete)."""
+
+    def __init__(self):
+        self.rows = {}
+
+    def add(self, ids, documents=None, metadatas=None, embeddings=None):
+        for i, chunk_id in enumerate(ids):
+            if chunk_id not in self.rows:
+                self.rows[chunk_id] = {
+                    "document": documents[i] if documents else None,
+                    "metadata": metadatas[i] if metadatas else {},
+                    "embedding": embeddings[i] if embeddings else None,
+                }
+
+    def update(self, ids, metadatas=None, **kwargs):
+        for i, chunk_id in enumerate(ids):
+            if metadatas:
+                self.rows[chunk_id]["metadata"] = metadatas[i]
+
+    def delete(self, ids=None, **kwargs):
+        for chunk_id in ids or []:
+            self.rows.pop(chunk_id, None)
+
+    def get(self, ids=None, where=None, include=None, **kwargs):
+        keys = [i for i in (ids if ids is not None else self.rows) if i in self.rows]
+        keys = [i for i in keys if _where_matches(self.rows[i]["metadata"], where)]
+        return {
+            "ids": keys,
+            "documents": [self.rows[i]["document"] for i in keys],
+            "metadatas": [self.rows[i]["metadata"] for i in keys],
+            "embeddings": [self.rows[i]["embedding"] for i in keys],
+        }
+
+    def count(self):
+        return len(self.rows)
+
+
+class FakeVectorStore:
+    def __init__(self, rows=()):
+        """rows: (id, text, metadata, embedding) tuples."""
+        self._collection = FakeCollection()
+        for chunk_id, text, metadata, embedding in rows:
+            self._collection.add([chunk_id], [text], [metadata], [embedding])
+
+    def add_texts(self, texts, metadatas=None, ids=None):
+        self._collection.add(ids, texts, metadatas, [FakeEmbeddings().embed_query(text) for text in texts])
+        return ids
+
+
+class OpenAIClientPoolTests(SimpleTestCase):
+    def make_pool(self, **kwargs):
+        return OpenAIClientPool(api_key="sk-test", base_url="http://localhost:9/v1", **kwargs)
+
+    def test_parse_model_limits_skips_malformed_items(self):
+        self.assertEqual(
+            _parse_model_limits("gpt-4o=8, gpt-4o-mini=16,broken,bad=x,zero=0"),
+            {"gpt-4o": 8, "gpt-4o-mini": 16, "zero": 1},
+        )
+        self.assertEqual(_parse_model_limits(None), {})
+
+    def test_limit_for_falls_back_to_default(self):
+        pool = self.make_pool(model_limits={"gpt-4o": 2}, default_model_limit=5)
+        self.assertEqual(pool.limit_for("gpt-4o"), 2)
+        self.assertEqual(pool.limit_for("other"), 5)
+
+    def test_model_slot_tracks_in_flight_calls(self):
+        pool = self.make_pool(model_limits={"gpt-4o": 2})
+        with pool.model_slot("gpt-4o"):
+            self.assertEqual(pool.status()["in_flight"]["gpt-4o"], 1)
+        self.assertEqual(pool.status()["in_flight"]["gpt-4o"], 0)
+
+    def test_model_slot_times_out_when_model_is_saturated(self):
+        pool = self.make_pool(model_limits={"gpt-4o": 1}, queue_timeout=0.05)
+        holding, release = threading.Event(), threading.Event()
+
+        def hold():
+            with pool.model_slot("gpt-4o"):
+                holding.set()
+                release.wait(5)
+
+        worker = threading.Thread(target=hold)
+        worker.start()
+        holding.wait(5)
+        try:
+            with self.assertRaises(ModelSlotTimeout):
+                with pool.model_slot("gpt-4o"):
+                    pass
+        finally:
+            release.set()
+            worker.join()
+        status = pool.status()
+        self.assertEqual(status["queued_waits"], 1)
+        self.assertEqual(status["queue_timeouts"], 1)
+
+    def test_warm_up_failure_is_reported_not_raised(self):
+        pool = self.make_pool()
+        self.assertFalse(pool.warm_up(connections=1))
+        self.assertFalse(pool.status()["warmed_up"])
+        pool.close()
+
+
+class ServerSentEventsTests(SimpleTestCase):
+    @staticmethod
+    def frames(response):
+        return [frame for frame in b"".join(response.streaming_content).decode("utf-8").split("\n\n") if frame]
+
+    def test_format_sse_frame(self):
+        self.assertEqual(format_sse("token", {"text": "Hé"}), 'event: token\ndata: {"text": "Hé"}\n\n')
+
+    def test_sse_response_streams_events_in_order(self):
+        response = sse_response(iter([{"event": "token", "data": {"text": "a"}}, {"event": "done"}]))
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        self.assertEqual(response["X-Accel-Buffering"], "no")
+        self.assertEqual(self.frames(response), ['event: token\ndata: {"text": "a"}', "event: done\ndata: {}"])
+
+    def test_sse_response_reports_errors_and_finishes(self):
+        def events():
+            yield {"event": "token", "data": {"text": "a"}}
+            raise RuntimeError("boom")
+
+        frames = self.frames(sse_response(events()))
+        self.assertEqual(frames[1], "event: error\ndata: " + json.dumps({"error": "boom"}))
+        self.assertEqual(frames[2], "event: done\ndata: {}")
+
+
+class SemanticAnswerCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, "answers.json")
+        self.embeddings = FakeEmbeddings()
+
+    def make_cache(self, **kwargs):
+        return SemanticAnswerCache(path=self.path, threshold=0.99, save_interval=0, **kwargs)
+
+    def test_normalize_question(self):
+        self.assertEqual(normalize_question("  What IS the Sun?! "), "what is the sun")
+
+    def test_miss_embeds_the_question_itself(self):
+        cache = self.make_cache()
+        response, vector = cache.lookup("textbook", "What is the Sun?", self.embeddings.embed_query)
+        self.assertIsNone(response)
+        self.assertEqual(self.embeddings.calls, ["What is the Sun?"])
+        self.assertAlmostEqual(float((vector @ vector)), 1.0, places=5)
+
+    def test_exact_and_semantic_hits_are_per_mode(self):
+        cache = self.make_cache()
+        _, vector = cache.lookup("textbook", "What is the Sun?", self.embeddings.embed_query)
+        cache.store("textbook", "What is the Sun?", {"answer": "A star."}, vector)
+
+        hit, _ = cache.lookup("textbook", "what is the sun", self.embeddings.embed_query)
+        self.assertEqual(hit, {"answer": "A star."})
+        hit, _ = cache.lookup("textbook", "Sun: what is the?", self.embeddings.embed_query)
+        self.assertEqual(hit, {"answer": "A star."})
+        miss, _ = cache.lookup("detailed", "What is the Sun?", self.embeddings.embed_query)
+        self.assertIsNone(miss)
+        stats = cache.stats()
+        self.assertEqual((stats["exact_hits"], stats["semantic_hits"], stats["misses"]), (1, 1, 2))
+
+    def test_evicts_least_recently_used(self):
+        cache = self.make_cache(max_entries=2)
+        for question in ("sun", "moon", "star"):
+            _, vector = cache.lookup("textbook", question, self.embeddings.embed_query)
+            cache.store("textbook", question, {"answer": question}, vector)
+        self.assertEqual(cache.stats()["entries"], 2)
+        self.assertIsNone(cache.lookup("textbook", "sun", lambda text: [0.0] * 26)[0])
+
+    def test_persisted_entries_are_dropped_for_another_build(self):
+        cache = self.make_cache(build_id="build-1")
+        _, vector = cache.lookup("textbook", "What is the Sun?", self.embeddings.embed_query)
+        cache.store("textbook", "What is the Sun?", {"answer": "A star."}, vector)
+
+        self.assertEqual(self.make_cache(build_id="build-1").stats()["entries"], 1)
+        rebuilt = self.make_cache(build_id="build-2")
+        self.assertEqual(rebuilt.stats()["entries"], 0)
+        rebuilt.save()
+        with open(self.path, encoding="utf-8") as f:
+            self.assertEqual(json.load(f)["build_id"], "build-2")
+
+
+class ChatResponseCachingTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.embeddings = FakeEmbeddings()
+        self.computed = []
+        self.service = bare_service(
+            embeddings=self.embeddings,
+            answer_cache=SemanticAnswerCache(path=os.path.join(tmp.name, "answers.json"), save_interval=0),
+        )
+        self.service._compute_chat_response = self.compute
+
+    def compute(self, message, level, history, turn_id, chunk_ids, query_vector=None):
+        self.computed.append(query_vector)
+        return {"answer": "The Sun is a star.", "success": True, "turn_id": turn_id, "chunk_ids": ["c1", "c2"]}
+
+    def test_miss_reuses_the_lookup_embedding_for_retrieval(self):
+        self.service.get_chat_response("What is the Sun?")
+        self.assertEqual(len(self.embeddings.calls), 1)
+        self.assertEqual(len(self.computed), 1)
+        self.assertIsNotNone(self.computed[0])
+
+    def test_hit_gets_a_new_turn_linked_to_the_cached_chunks(self):
+        first = self.service.get_chat_response("What is the Sun?")
+        second = self.service.get_chat_response("what is the sun")
+        self.assertTrue(second["cache_hit"])
+        self.assertEqual(len(self.computed), 1)
+        self.assertNotEqual(second["turn_id"], first["turn_id"])
+
+        looked_up = []
+        chunks = self.service.retrieval_cache.get_or_retrieve(
+            second["turn_id"], "what is the sun", 2,
+            retrieve=lambda query, k: self.fail("retrieval should not run"),
+            lookup=lambda ids: looked_up.append(ids) or [chunk("a", chunk_id=0), chunk("b", chunk_id=1)],
+        )
+        self.assertEqual(looked_up, [["c1", "c2"]])
+        self.assertEqual(len(chunks), 2)
+
+    def test_client_turn_id_is_kept_on_a_hit(self):
+        self.service.get_chat_response("What is the Sun?")
+        response = self.service.get_chat_response("What is the Sun?", turn_id="client-turn")
+        self.assertEqual(response["turn_id"], "client-turn")
+
+
+class SuggestionStrategyTests(SimpleTestCase):
+    ANSWER = "Answer:\nThe Sun is a star.\n\nKey Points:\n1. It is hot.\n2. It is big.\n3. It is bright."
+
+    def test_parallel_skips_suggestions_when_nothing_was_retrieved(self):
+        service = mode_service("parallel", chunks=[])
+        calls = []
+        service._openai_chat = lambda **request: calls.append(request) or "[]"
+        response = service._compute_chat_response("What is the Sun?", "textbook", turn_id="t1")
+        self.assertFalse(response["success"])
+        self.assertEqual(calls, [])
+
+    def test_parallel_runs_suggestions_alongside_the_answer(self):
+        service = mode_service("parallel", chunks=[chunk("The Sun is a star at the centre of the solar system.", chunk_id=0)])
+        questions = ["Why is the Sun hot?", "How big is the Sun?", "What is a star?"]
+
+        def chat(model, system, messages, **kwargs):
+            return json.dumps(questions) if "follow-up" in system else self.ANSWER
+
+        service._openai_chat = chat
+        response = service._compute_chat_response("What is the Sun?", "textbook", turn_id="t1")
+        self.assertTrue(response["success"])
+        self.assertEqual(response["suggested_questions"], questions)
+
+    def test_structured_falls_back_to_the_raw_completion(self):
+        service = mode_service("structured", chunks=[chunk("The Sun is a star.", chunk_id=0)])
+        service._openai_chat = lambda **request: "not json"
+        response = service._compute_chat_response("What is the Sun?", "detailed", turn_id="t1")
+        self.assertEqual(response["answer"], "not json")
+        self.assertEqual(len(response["suggested_questions"]), 3)
+
+
+class CachedEmbeddingsTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.underlying = FakeEmbeddings()
+        self.cache = CachedEmbeddings(self.underlying, "fake-model", path=os.path.join(tmp.name, "embeddings.sqlite3"))
+
+    def test_repeated_query_is_served_from_the_store(self):
+        first = self.cache.embed_query("What is the Sun?")
+        second = self.cache.embed_query("What is the Sun?")
+        self.assertEqual(first, second)
+        self.assertEqual(self.underlying.calls, ["What is the Sun?"])
+        self.assertEqual(self.cache.stats()["hits"], 1)
+
+    def test_documents_only_embed_missing_unique_texts(self):
+        self.cache.embed_query("sun")
+        vectors = self.cache.embed_documents(["sun", "moon", "moon"])
+        self.assertEqual(self.underlying.calls, ["sun", "moon"])
+        self.assertEqual(vectors[1], vectors[2])
+
+    def test_concurrent_misses_share_one_call(self):
+        started, release = threading.Event(), threading.Event()
+        original = self.underlying.embed_query
+
+        def slow(text):
+            started.set()
+            release.wait(5)
+            return original(text)
+
+        self.underlying.embed_query = slow
+        results = []
+        leader = threading.Thread(target=lambda: results.append(self.cache.embed_query("sun")))
+        leader.start()
+        started.wait(5)
+        follower = threading.Thread(target=lambda: results.append(self.cache.embed_query("sun")))
+        follower.start()
+        while self.cache.stats()["coalesced"] == 0 and follower.is_alive():
+            threading.Event().wait(0.01)
+        release.set()
+        leader.join()
+        follower.join()
+        self.assertEqual(self.underlying.calls, ["sun"])
+        self.assertEqual(results[0], results[1])
+
+    def test_cached_vectors_and_store_vectors(self):
+        self.assertEqual(self.cache.cached_vectors(["sun"]), [None])
+        self.cache.store_vectors(["sun"], [[1.0, 2.0]])
+        self.assertEqual(self.cache.cached_vectors(["sun", "moon"]), [[1.0, 2.0], None])
+        self.assertEqual(self.underlying.calls, [])
+
+
+class LazyLLMServiceTests(SimpleTestCase):
+    def test_readiness_tells_not_loaded_from_failed(self):
+        lazy = LazyLLMService()
+        self.assertEqual(lazy.readiness()["status"], "not_loaded")
+        with mock.patch("core.services.llm_service.LLMService", side_effect=ValueError("OPENAI_API_KEY is not set.")):
+            lazy.start_background_warmup().join(5)
+        readiness = lazy.readiness()
+        self.assertEqual(readiness["status"], "failed")
+        self.assertFalse(readiness["ready"])
+        self.assertFalse(lazy.is_loaded)
+
+    def test_first_attribute_access_builds_the_service_once(self):
+        lazy = LazyLLMService()
+        with mock.patch("core.services.llm_service.LLMService") as factory:
+            factory.return_value.component_status.return_value = {"embeddings": True}
+            lazy.get_service_status()
+            lazy.get_service_status()
+        factory.assert_called_once_with()
+        self.assertTrue(lazy.is_loaded)
+        self.assertEqual(lazy.readiness()["status"], "ready")
+
+    def test_warm_up_default_depends_on_the_process(self):
+        cases = [
+            (["gunicorn", "backend.wsgi"], {}, True),
+            (["manage.py", "test", "core"], {}, False),
+            (["manage.py", "migrate"], {}, False),
+            (["manage.py", "runserver"], {}, False),
+            (["manage.py", "runserver"], {"RUN_MAIN": "true"}, True),
+            (["manage.py", "runserver", "--noreload"], {}, True),
+            (["manage.py", "test"], {"LLM_SERVICE_WARMUP": "1"}, True),
+            (["gunicorn"], {"LLM_SERVICE_WARMUP": "0"}, False),
+        ]
+        for argv, env, expected in cases:
+            with self.subTest(argv=argv, env=env), mock.patch("sys.argv", argv), mock.patch.dict(os.environ, env):
+                for name in ("RUN_MAIN", "LLM_SERVICE_WARMUP"):
+                    if name not in env:
+                        os.environ.pop(name, None)
+                self.assertEqual(_warmup_enabled(), expected)
+
+
+class NumpyVectorIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.index_dir = os.path.join(self.tmp.name, "numpy_index")
+        self.store = FakeVectorStore([
+            ("a", "planets orbit", {"source": "science.pdf", "page_number": 1}, [1.0, 0.0, 0.0]),
+            ("b", "plants grow", {"source": "biology.pdf", "page_number": 2}, [0.0, 2.0, 0.0]),
+            ("c", "rocks erode", {"source": "science.pdf", "page_number": 3}, [0.0, 0.0, 3.0]),
+        ])
+
+    def test_search_by_vector_ranks_by_cosine_and_applies_filters(self):
+        index = NumpyVectorIndex.export_from_chroma(self.store, self.index_dir, model_name="m")
+        hits = index.search_by_vector([0.0, 1.0, 0.1], k=2)
+        self.assertEqual([doc.page_content for doc, _ in hits], ["plants grow", "rocks erode"])
+        self.assertAlmostEqual(hits[0][1], 1.0 / (1.01 ** 0.5), places=5)
+        filtered = index.search_by_vector([0.0, 1.0, 0.1], k=3, filters={"source": "science.pdf"})
+        self.assertEqual([doc.page_content for doc, _ in filtered], ["rocks erode", "planets orbit"])
+
+    def test_export_round_trips_and_records_the_build_id(self):
+        exported = NumpyVectorIndex.export_from_chroma(self.store, self.index_dir, model_name="m")
+        loaded = NumpyVectorIndex.load(self.index_dir)
+        self.assertEqual(loaded.ids, exported.ids)
+        self.assertEqual(loaded.info["build_id"], exported.info["build_id"])
+        self.assertEqual(loaded.search_by_vector([1.0, 0.0, 0.0], k=1)[0][0].page_content, "planets orbit")
+        self.assertFalse(loaded.is_stale(exported.info["build_id"]))
+        self.assertTrue(loaded.is_stale("another-build"))
+
+    def test_re_export_replaces_the_vectors_file(self):
+        first = NumpyVectorIndex.export_from_chroma(self.store, self.index_dir, model_name="m")
+        self.store._collection.delete(ids=["c"])
+        second = NumpyVectorIndex.export_from_chroma(self.store, self.index_dir, model_name="m")
+        self.assertNotEqual(first.info["build_id"], second.info["build_id"])
+        vector_files = [name for name in os.listdir(self.index_dir) if name.endswith(".f32")]
+        self.assertEqual(vector_files, [f"vectors-{second.info['build_id']}.f32"])
+        self.assertEqual(len(NumpyVectorIndex.load(self.index_dir)), 2)
+
+    def test_service_reuses_a_current_index_despite_newer_chroma_writes(self):
+        NumpyVectorIndex.export_from_chroma(self.store, self.index_dir, model_name="text-embedding-3-small")
+        with open(os.path.join(self.tmp.name, "chroma.sqlite3"), "w") as f:
+            f.write("touched after the export")
+        service = bare_service(textbook_db_path=self.tmp.name, textbook_vectorstore=self.store, vector_index=None)
+        with mock.patch.dict(os.environ, {"OPENAI_EMBEDDING_MODEL": "text-embedding-3-small", "NUMPY_INDEX_PATH": ""}), \
+                mock.patch.object(NumpyVectorIndex, "export_from_chroma") as export:
+            service._initialize_numpy_index()
+        export.assert_not_called()
+        self.assertEqual(len(service.vector_index), 3)
+
+        self.store._collection.add(["d"], ["tides rise"], [{"source": "science.pdf"}], [[1.0, 1.0, 0.0]])
+        with mock.patch.dict(os.environ, {"OPENAI_EMBEDDING_MODEL": "text-embedding-3-small", "NUMPY_INDEX_PATH": ""}):
+            service._initialize_numpy_index()
+        self.assertEqual(len(service.vector_index), 4)
+
+
+class LexicalIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.index = BM25Index.build(
+            ["a", "b", "c"],
+            ["Planets orbit the Sun.", "Plants grow towards the light.", "The planet Mars has two moons."],
+            [{"source": "science.pdf", "page_number": 1}, {"source": "biology.pdf", "page_number": 2}, {"source": "science.pdf", "page_number": 3}],
+        )
+
+    def test_tokenize_drops_stopwords_and_folds_plurals(self):
+        self.assertEqual(tokenize("What are the planets and their moons?"), ["planet", "moon"])
+        self.assertEqual(tokenize("Bodies, glass and a virus"), ["body", "glass", "virus"])
+
+    def test_search_ranks_matching_chunks_and_applies_filters(self):
+        self.assertEqual([doc.page_content for doc in self.index.search("planet", k=3)][0], "Planets orbit the Sun.")
+        self.assertEqual(self.index.search("towards light", k=3, filters={"source": "science.pdf"}), [])
+        self.assertEqual(self.index.search("nothing matches", k=3), [])
+
+    def test_reciprocal_rank_fusion_rewards_agreement(self):
+        a, b, c = chunk("a", chunk_id=1), chunk("b", chunk_id=2), chunk("c", chunk_id=3)
+        fused = reciprocal_rank_fusion([[a, b], [b, c]])
+        self.assertEqual([doc.page_content for doc in fused], ["b", "a", "c"])
+
+    def test_save_load_round_trip(self):
+        self.index.save(self.tmp.name)
+        loaded = BM25Index.load(self.tmp.name)
+        self.assertEqual(loaded.ids, self.index.ids)
+        self.assertEqual(
+            [doc.page_content for doc in loaded.search("mars moons", k=1)],
+            [doc.page_content for doc in self.index.search("mars moons", k=1)],
+        )
+
+    def test_is_stale_compares_with_the_chroma_database(self):
+        self.assertTrue(BM25Index.is_stale(self.tmp.name, self.tmp.name))
+        self.index.save(self.tmp.name)
+        self.assertFalse(BM25Index.is_stale(self.tmp.name, self.tmp.name))
+        chroma_file = os.path.join(self.tmp.name, "chroma.sqlite3")
+        open(chroma_file, "w").close()
+        index_mtime = os.path.getmtime(os.path.join(self.tmp.name, "bm25.json"))
+        os.utime(chroma_file, (index_mtime + 10, index_mtime + 10))
+        self.assertTrue(BM25Index.is_stale(self.tmp.name, self.tmp.name))
+
+    def test_stale_index_is_rebuilt_for_the_dense_backend_too(self):
+        self.index.save(self.tmp.name)
+        chroma_file = os.path.join(self.tmp.name, "chroma.sqlite3")
+        open(chroma_file, "w").close()
+        index_mtime = os.path.getmtime(os.path.join(self.tmp.name, "bm25.json"))
+        os.utime(chroma_file, (index_mtime + 10, index_mtime + 10))
+        store = FakeVectorStore([("z", "Comets have tails.", {"source": "science.pdf"}, [1.0])])
+        service = bare_service(textbook_db_path=self.tmp.name, textbook_vectorstore=store, lexical_index=None, retrieval_backend="chroma")
+        with mock.patch.dict(os.environ, {"LEXICAL_INDEX_PATH": self.tmp.name}):
+            service._initialize_lexical_index()
+        self.assertEqual(service.lexical_index.ids, ["z"])
+        self.assertEqual(BM25Index.load(self.tmp.name).ids, ["z"])
+
+
+class SingleFlightTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_concurrent_calls_share_one_execution(self):
+        flight = SingleFlight(cross_process=False)
+        started, release = threading.Event(), threading.Event()
+        calls = []
+
+        def compute():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return {"answer": "42"}
+
+        leader = threading.Thread(target=lambda: flight.do("k", compute))
+        leader.start()
+        started.wait(5)
+        follower = ThreadPoolExecutor(max_workers=1).submit(flight.do, "k", compute)
+        while flight.stats()["coalesced"] == 0:
+            threading.Event().wait(0.01)
+        release.set()
+        leader.join(5)
+        result, shared = follower.result(5)
+        self.assertEqual((result, shared), ({"answer": "42"}, True))
+        self.assertEqual(len(calls), 1)
+
+    def test_errors_propagate_and_the_key_is_released(self):
+        flight = SingleFlight(cross_process=False)
+        with self.assertRaises(ValueError):
+            flight.do("k", mock.Mock(side_effect=ValueError("boom")))
+        self.assertEqual(flight.do("k", lambda: 1), (1, False))
+        self.assertEqual(flight.stats()["errors"], 1)
+        self.assertEqual(flight.stats()["in_flight"], 0)
+
+    def test_cross_process_waiter_reuses_the_shared_result(self):
+        path = os.path.join(self.tmp.name, "flight.sqlite3")
+        first, second = SingleFlight(cross_process=True, path=path), SingleFlight(cross_process=True, path=path)
+        calls = []
+        barrier = threading.Barrier(2, timeout=5)
+
+        def compute():
+            calls.append(1)
+            try:
+                barrier.wait()
+            except threading.BrokenBarrierError:
+                pass
+            threading.Event().wait(0.1)
+            return {"answer": "shared"}
+
+        # The waiter arrives while the leader holds the lock
+        def arrive_then_call():
+            barrier.wait()
+            return second.do("k", compute)
+
+        waiter = ThreadPoolExecutor(max_workers=1).submit(arrive_then_call)
+        leader_result = first.do("k", compute)
+        self.assertEqual(leader_result, ({"answer": "shared"}, False))
+        self.assertEqual(waiter.result(5), ({"answer": "shared"}, True))
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(second.stats()["coalesced_cross_process"], 1)
+
+    def test_lock_files_are_bounded(self):
+        flight = SingleFlight(cross_process=True, path=os.path.join(self.tmp.name, "flight.sqlite3"), lock_files=4)
+        for i in range(50):
+            flight.do(SingleFlight.make_key("textbook", f"question {i}"), lambda: i)
+        self.assertLessEqual(len(os.listdir(flight.lock_dir)), 4)
+
+
+class TurnRetrievalCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.cache = TurnRetrievalCache(max_entries=10, ttl_seconds=0)
+        self.searches = []
+
+    def retrieve(self, query, k):
+        self.searches.append(k)
+        return [chunk(f"chunk {i}", content_hash=f"h{i}") for i in range(k)]
+
+    def test_chunk_ids_are_content_hashes_or_legacy_positions(self):
+        chunks = [chunk("a", content_hash="h1", chunk_id=7), chunk("b", chunk_id=8), Document(page_content="c")]
+        self.assertEqual(chunk_ids_of(chunks), ["h1", "textbook.pdf:8"])
+
+    def test_same_turn_is_served_from_the_cache(self):
+        first = self.cache.get_or_retrieve("t1", "What is the Sun?", 3, self.retrieve)
+        again = self.cache.get_or_retrieve("t1", "what is the sun", 2, self.retrieve)
+        self.assertEqual(self.searches, [3])
+        self.assertEqual(again, first[:2])
+        self.assertEqual(self.cache.stats()["hits"], 1)
+
+    def test_larger_k_tops_up_keeping_the_served_order(self):
+        first = self.cache.get_or_retrieve("t1", "sun", 2, self.retrieve)
+        deeper = self.cache.get_or_retrieve("t1", "sun", 4, self.retrieve)
+        self.assertEqual(self.searches, [2, 4])
+        self.assertEqual(deeper[:2], first)
+        self.assertEqual([c.metadata["content_hash"] for c in deeper], ["h0", "h1", "h2", "h3"])
+        self.assertEqual(self.cache.stats()["top_ups"], 1)
+
+    def test_client_chunk_ids_rehydrate_an_unknown_turn(self):
+        lookup = mock.Mock(return_value=[chunk("a", content_hash="x"), chunk("b", content_hash="y")])
+        chunks = self.cache.get_or_retrieve("t9", "sun", 2, self.retrieve, chunk_ids=["x", "y"], lookup=lookup)
+        lookup.assert_called_once_with(["x", "y"])
+        self.assertEqual(self.searches, [])
+        self.assertEqual(chunk_ids_of(chunks), ["x", "y"])
+        self.assertEqual(self.cache.stats()["rehydrated"], 1)
+
+    def test_linked_turn_looks_up_its_chunks_only_when_needed(self):
+        lookup = mock.Mock(return_value=[chunk("a", content_hash="x")])
+        self.cache.link("t2", "sun", ["x"])
+        lookup.assert_not_called()
+        self.assertEqual(chunk_ids_of(self.cache.get_or_retrieve("t2", "sun", 1, self.retrieve, lookup=lookup)), ["x"])
+        # A turn that retrieved its own chunks is not overwritten by a link
+        self.cache.get_or_retrieve("t3", "sun", 1, self.retrieve)
+        self.cache.link("t3", "sun", ["x"])
+        self.assertEqual(chunk_ids_of(self.cache.get_or_retrieve("t3", "sun", 1, self.retrieve)), ["h0"])
+
+
+class ChunkLookupTests(SimpleTestCase):
+    ROWS = [
+        ("id-a", "The Sun is a star.", {"source": "textbook.pdf", "content_hash": "a", "chapter": "1", "page_number": 1}),
+        ("id-b", "Plants need light.", {"source": "biology.pdf", "content_hash": "b", "chapter": "1", "page_number": 1}),
+        ("id-c", "The Moon orbits Earth.", {"source": "textbook.pdf", "content_hash": "c", "chapter": "2", "page_number": 9}),
+    ]
+
+    def setUp(self):
+        patcher = mock.patch.dict(os.environ, {"RETRIEVAL_SOURCE": "textbook.pdf"})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def services(self):
+        store = FakeVectorStore([(i, text, meta, [1.0]) for i, text, meta in self.ROWS])
+        lexical = BM25Index.build([r[0] for r in self.ROWS], [r[1] for r in self.ROWS], [r[2] for r in self.ROWS])
+        return {
+            "local index": bare_service(lexical_index=lexical, vector_index=None, textbook_vectorstore=store),
+            "chroma": bare_service(lexical_index=None, vector_index=None, textbook_vectorstore=store),
+        }
+
+    def test_lookup_keeps_the_requested_order(self):
+        for name, service in self.services().items():
+            with self.subTest(name):
+                chunks = service.get_chunks_by_ids(["c", "a", "missing"])
+                self.assertEqual([c.page_content for c in chunks], ["The Moon orbits Earth.", "The Sun is a star."])
+
+    def test_lookup_applies_the_source_and_active_filters(self):
+        for name, service in self.services().items():
+            with self.subTest(name):
+                self.assertEqual(service.get_chunks_by_ids(["b"]), [])
+                chunks = service.get_chunks_by_ids(["a", "c"], filters={"chapter": "2"})
+                self.assertEqual(chunk_ids_of(chunks), ["c"])
+
+    def test_retrieve_for_turn_rehydrates_within_its_filters(self):
+        service = self.services()["chroma"]
+        service.retrieve_textbook_chunks = mock.Mock(return_value=[])
+        chunks = service.retrieve_for_turn("t1", "moon", k=2, chunk_ids=["a", "c"], filters={"chapter": "2"})
+        self.assertEqual(chunk_ids_of(chunks), ["c"])
+
+
+class LegacyChunkLookupTests(ChunkLookupTests):
+    """A database built before content hashes: chunks are only numbered per source."""
+
+    ROWS = [
+        ("uuid-1", "The Sun is a star.", {"source": "textbook.pdf", "chunk_id": 0, "chapter": "1", "page_number": 1}),
+        ("uuid-2", "Plants need light.", {"source": "biology.pdf", "chunk_id": 0, "chapter": "1", "page_number": 1}),
+        ("uuid-3", "The Moon orbits Earth.", {"source": "textbook.pdf", "chunk_id": 1, "chapter": "2", "page_number": 9}),
+    ]
+
+    def test_lookup_keeps_the_requested_order(self):
+        for name, service in self.services().items():
+            with self.subTest(name):
+                chunks = service.get_chunks_by_ids(["textbook.pdf:1", "textbook.pdf:0", "textbook.pdf:7"])
+                self.assertEqual([c.page_content for c in chunks], ["The Moon orbits Earth.", "The Sun is a star."])
+                self.assertEqual(chunk_ids_of(chunks), ["textbook.pdf:1", "textbook.pdf:0"])
+
+    def test_lookup_applies_the_source_and_active_filters(self):
+        for name, service in self.services().items():
+            with self.subTest(name):
+                self.assertEqual(service.get_chunks_by_ids(["biology.pdf:0"]), [])
+                chunks = service.get_chunks_by_ids(["textbook.pdf:0", "textbook.pdf:1"], filters={"chapter": "2"})
+                self.assertEqual(chunk_ids_of(chunks), ["textbook.pdf:1"])
+
+    def test_retrieve_for_turn_rehydrates_within_its_filters(self):
+        service = self.services()["chroma"]
+        service.retrieve_textbook_chunks = mock.Mock(return_value=[])
+        chunks = service.retrieve_for_turn("t1", "moon", k=2, chunk_ids=["textbook.pdf:0", "textbook.pdf:1"], filters={"chapter": "2"})
+        self.assertEqual(chunk_ids_of(chunks), ["textbook.pdf:1"])
+
+
+class ContextPackerTests(SimpleTestCase):
+    SENTENCES = "The Sun is a star. It gives us light and heat. Planets orbit the Sun. " * 6
+
+    def test_strip_overlap_drops_the_repeated_prefix(self):
+        previous = "Earth is the third planet. The Moon orbits the Earth every month."
+        self.assertEqual(strip_overlap("The Moon orbits the Earth every month. Tides follow it.", [previous]), "Tides follow it.")
+        self.assertEqual(strip_overlap("Unrelated text about comets and their tails.", [previous]), "Unrelated text about comets and their tails.")
+
+    def test_truncate_to_sentences_keeps_whole_sentences(self):
+        budget = count_tokens("The Sun is a star. ") + count_tokens("It gives us light and heat. ")
+        self.assertEqual(truncate_to_sentences(self.SENTENCES, budget), "The Sun is a star. It gives us light and heat.")
+        self.assertEqual(truncate_to_sentences(self.SENTENCES, 1), "")
+
+    def test_pack_context_stays_within_budget_best_first(self):
+        chunks = [chunk(self.SENTENCES, page_number=n) for n in (1, 2, 3)]
+        render = lambda c, text: f"[Page {c.metadata['page_number']}]: {text}"
+        budget = count_tokens(render(chunks[0], self.SENTENCES.strip())) + 60
+        packed = pack_context(chunks, budget, render)
+        self.assertLessEqual(packed.tokens, budget)
+        self.assertTrue(packed.text.startswith("[Page 1]: The Sun is a star."))
+        self.assertEqual(packed.chunks[0], chunks[0])
+        self.assertEqual(len(packed.chunks) + packed.dropped, 3)
+
+    def test_pack_context_truncates_a_chunk_that_does_not_fit(self):
+        render = lambda c, text: text
+        budget = count_tokens(self.SENTENCES) // 2
+        packed = pack_context([chunk(self.SENTENCES)], budget, render)
+        self.assertEqual(packed.truncated, 1)
+        self.assertTrue(packed.text.endswith("."))
+        self.assertLessEqual(packed.tokens, budget)
+
+    def test_chat_response_packs_the_context_once(self):
+        service = mode_service("sequential", chunks=[chunk("The Sun is a star at the centre of the solar system.", page_number=4)])
+        service._openai_chat = mock.Mock(side_effect=["The Sun is a star.", json.dumps(["Q1?", "Q2?", "Q3?"])])
+        with mock.patch.object(service, "_pack_context", wraps=service._pack_context) as pack:
+            response = service._compute_chat_response("What is the Sun?", "detailed", [], turn_id="t1")
+        self.assertEqual(pack.call_count, 1)
+        request = service._openai_chat.call_args_list[0].kwargs
+        self.assertIn("[Textbook Page 4]", request["messages"][-1]["content"])
+        self.assertEqual(response["prompt_tokens"], count_chat_tokens(request["system"], request["messages"], request["model"]))
+        self.assertEqual(response["context_chunks"], 1)
+
+
+class AllModesTests(SimpleTestCase):
+    def make_service(self, chunks):
+        service = mode_service("sequential", mode_executor=ThreadPoolExecutor(max_workers=3))
+        service.mode_config["detailed"]["max_chunks"] = 5
+        del service.retrieve_for_turn
+        service.retrieve_textbook_chunks = mock.Mock(side_effect=lambda query, k=3, **kwargs: list(chunks)[:k])
+
+        def chat(model, system, messages, **kwargs):
+            if "follow-up" in system:
+                return json.dumps(["Q1?", "Q2?", "Q3?"])
+            return f"{system} answer"
+
+        service._openai_chat = chat
+        return service
+
+    def test_retrieval_runs_once_for_all_modes(self):
+        chunks = [chunk(f"The Sun is star number {i}.", content_hash=f"h{i}", page_number=i) for i in range(6)]
+        service = self.make_service(chunks)
+        result = service.get_all_mode_responses("What is the Sun?", turn_id="t1")
+        service.retrieve_textbook_chunks.assert_called_once()
+        self.assertEqual(service.retrieve_textbook_chunks.call_args.kwargs["k"], 5)
+        self.assertEqual(result["chunk_ids"], ["h0", "h1", "h2", "h3", "h4"])
+        self.assertEqual(list(result["modes"]), ["textbook", "detailed", "advanced"])
+        self.assertEqual(result["modes"]["detailed"]["answer"], "detailed system answer")
+        self.assertEqual(result["modes"]["textbook"]["chunk_ids"], ["h0", "h1", "h2"])
+        self.assertTrue(all(response["turn_id"] == "t1" for response in result["modes"].values()))
+
+    def test_stream_emits_retrieval_then_each_mode_then_done(self):
+        service = self.make_service([chunk("The Sun is a star.", content_hash="h0")])
+        events = [item["event"] for item in service.stream_all_mode_responses("What is the Sun?", turn_id="t1")]
+        self.assertEqual(events, ["retrieval", "mode", "mode", "mode", "done"])
+
+    def test_a_failing_mode_does_not_fail_the_others(self):
+        service = self.make_service([chunk("The Sun is a star.", content_hash="h0")])
+        original = service.get_chat_response
+
+        def get_chat_response(message, level="textbook", *args, **kwargs):
+            if level == "advanced":
+                raise RuntimeError("boom")
+            return original(message, level, *args, **kwargs)
+
+        service.get_chat_response = get_chat_response
+        result = service.get_all_mode_responses("What is the Sun?", turn_id="t1")
+        self.assertFalse(result["modes"]["advanced"]["success"])
+        self.assertTrue(result["modes"]["textbook"]["success"])
+
+
+class BatchAnswerTests(SimpleTestCase):
+    def make_service(self):
+        service = bare_service(
+            mode_config={"textbook": {}, "detailed": {}},
+            batch_executor=ThreadPoolExecutor(max_workers=2),
+            batch_jobs=BatchJobStore(),
+            embeddings=FakeEmbeddings(),
+        )
+
+        def get_chat_response(question, level):
+            if "boom" in question:
+                raise RuntimeError("model down")
+            return {"answer": f"{level}: {question}", "success": True, "chunk_ids": ["h1"]}
+
+        service.get_chat_response = get_chat_response
+        return service
+
+    def test_results_keep_input_order_and_report_failures_per_item(self):
+        results = self.make_service().answer_batch([
+            {"question": "What is the Sun?", "level": "detailed"},
+            {"question": "ab"},
+            {"question": "What is boom?"},
+            {"question": "What is a star?", "level": "expert"},
+            "not an item",
+        ])
+        self.assertEqual([r["index"] for r in results], [0, 1, 2, 3, 4])
+        self.assertEqual(results[0]["answer"], "detailed: What is the Sun?")
+        self.assertEqual(results[0]["chunk_ids"], ["h1"])
+        self.assertEqual([r["success"] for r in results], [True, False, False, False, False])
+        self.assertEqual(results[2]["error"], "model down")
+
+    def test_background_job_reports_progress_and_results(self):
+        service = self.make_service()
+        job_id = service.submit_batch([{"question": "What is the Sun?"}, {"question": "What is boom?"}])
+        deadline = time.monotonic() + 5
+        while service.batch_jobs.get(job_id)["status"] != "completed" and time.monotonic() < deadline:
+            time.sleep(0.01)
+        job = service.batch_jobs.get(job_id)
+        self.assertEqual(job["status"], "completed")
+        self.assertEqual((job["completed"], job["failed"]), (2, 1))
+        self.assertEqual(job["results"][0]["answer"], "textbook: What is the Sun?")
+
+    def test_store_prunes_the_oldest_finished_jobs(self):
+        store = BatchJobStore(ttl_seconds=3600, max_jobs=2)
+        first = store.create(1)
+        store.finish(first)
+        second = store.create(1)
+        third = store.create(1)
+        self.assertIsNone(store.get(first))
+        self.assertEqual(store.get(second)["status"], "queued")
+        self.assertEqual(store.stats()["jobs"], 2)
+        self.assertIsNotNone(store.get(third))
+
+
+class APIError(Exception):
+    def __init__(self, message, status_code=None, headers=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.response = mock.Mock(headers=headers or {})
+
+
+class APIConnectionError(Exception):
+    pass
+
+
+class ResilienceTests(SimpleTestCase):
+    def test_is_retryable_uses_the_status_and_the_error_type_only(self):
+        self.assertTrue(is_retryable(APIError("rate limited", 429)))
+        self.assertTrue(is_retryable(APIError("bad gateway", 502)))
+        self.assertFalse(is_retryable(APIError("bad request", 400)))
+        self.assertTrue(is_retryable(APIConnectionError("reset")))
+        self.assertFalse(is_retryable(ValueError("context length 4290 tokens exceeds 500")))
+
+    def test_retry_delay_is_capped_and_honours_retry_after(self):
+        for attempt in range(6):
+            self.assertLessEqual(retry_delay(attempt, base=0.5, cap=2.0), 2.0)
+        self.assertGreaterEqual(retry_delay(0, retry_after=3.0), 3.0)
+
+    def test_breaker_opens_after_consecutive_failures(self):
+        breaker = CircuitBreaker(failure_threshold=2, cooldown=60)
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "closed")
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "open")
+        self.assertFalse(breaker.available())
+        self.assertFalse(breaker.allow())
+
+    def test_half_open_breaker_allows_a_single_probe(self):
+        breaker = CircuitBreaker(failure_threshold=1, cooldown=0)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "half_open")
+        # Checking availability does not claim the probe
+        self.assertTrue(breaker.available())
+        self.assertTrue(breaker.available())
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        self.assertFalse(breaker.available())
+        breaker.release()
+        self.assertTrue(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, "closed")
+
+    def test_latency_percentiles(self):
+        tracker = LatencyTracker(window=10)
+        self.assertIsNone(tracker.percentile(50))
+        for seconds in range(1, 21):
+            tracker.record(float(seconds))
+        self.assertEqual(len(tracker), 10)
+        self.assertEqual(tracker.percentile(50), 15.0)
+        self.assertEqual(tracker.percentile(95), 20.0)
+
+
+class ChatRetryTests(SimpleTestCase):
+    def make_service(self, cooldown=30.0):
+        with mock.patch.dict(os.environ, {"LLM_BREAKER_FAILURES": "1", "LLM_BREAKER_COOLDOWN": str(cooldown)}):
+            health = ModelHealth()
+        return bare_service(model_health=health, max_attempts=2, retry_budget=5, hedging_enabled=False)
+
+    def test_model_selection_leaves_the_half_open_probe_to_the_call(self):
+        service = self.make_service(cooldown=0)
+        service.model_health.breaker("gpt-4o").record_failure()
+        self.assertEqual(service._healthy_models("gpt-4o"), ["gpt-4o", "gpt-4o-mini"])
+        self.assertEqual(service._healthy_models("gpt-4o"), ["gpt-4o", "gpt-4o-mini"])
+        service._chat_once = mock.Mock(return_value="ok")
+        self.assertEqual(service._openai_chat("gpt-4o", "system", [], max_output_tokens=10), "ok")
+        self.assertEqual(service._chat_once.call_args.args[0], "gpt-4o")
+        self.assertEqual(service.model_health.breaker("gpt-4o").state, "closed")
+
+    def test_retryable_failure_opens_the_breaker_and_falls_back(self):
+        service = self.make_service()
+        service._chat_once = mock.Mock(side_effect=[APIError("overloaded", 503), "fallback answer"])
+        self.assertEqual(service._openai_chat("gpt-4o", "system", [], max_output_tokens=10), "fallback answer")
+        self.assertEqual([c.args[0] for c in service._chat_once.call_args_list], ["gpt-4o", "gpt-4o-mini"])
+        self.assertEqual(service.model_health.breaker("gpt-4o").state, "open")
+        self.assertEqual(service._healthy_models("gpt-4o"), ["gpt-4o-mini"])
+
+    def test_slot_timeout_is_not_a_model_failure(self):
+        service = self.make_service(cooldown=0)
+        breaker = service.model_health.breaker("gpt-4o")
+        breaker.record_failure()
+        service._chat_once = mock.Mock(side_effect=[ModelSlotTimeout("no free slot"), "fallback answer"])
+        self.assertEqual(service._openai_chat("gpt-4o", "system", [], max_output_tokens=10), "fallback answer")
+        self.assertEqual(breaker.opened_count, 1)
+        # The probe was handed back rather than left in flight
+        self.assertTrue(breaker.available())
+        self.assertEqual(service.model_health.counters["failures"], 0)
+
+    def test_fallback_takes_over_without_sleeping_on_the_request_thread(self):
+        service = self.make_service()
+        service.model_health = ModelHealth()
+        service._chat_once = mock.Mock(side_effect=[APIError("rate limited", 429, {"retry-after": "1"}), "fallback answer"])
+        with mock.patch("core.services.llm_service.time.sleep") as sleep:
+            self.assertEqual(service._openai_chat("gpt-4o", "system", [], max_output_tokens=10), "fallback answer")
+        sleep.assert_not_called()
+        self.assertEqual([c.args[0] for c in service._chat_once.call_args_list], ["gpt-4o", "gpt-4o-mini"])
+
+    def test_backoff_stays_within_the_request_deadline(self):
+        service = bare_service(model_health=ModelHealth(), max_attempts=50, retry_budget=0.5, hedging_enabled=False)
+        service._chat_once = mock.Mock(side_effect=APIError("rate limited", 429))
+        start = time.monotonic()
+        with mock.patch("core.services.llm_service.retry_delay", return_value=0.15), self.assertRaises(RuntimeError):
+            service._openai_chat("gpt-4o-mini", "system", [], max_output_tokens=10)
+        self.assertLess(time.monotonic() - start, 0.5)
+        # Slept 0.15s three times; a fourth wait would have crossed the deadline
+        self.assertEqual(service._chat_once.call_count, 4)
+
+
+class MetricsTests(SimpleTestCase):
+    def test_counter_and_histogram_render_in_prometheus_format(self):
+        counter = metrics.Counter("test_events_total", "Events.", ("kind",))
+        counter.inc(kind='say "hi"')
+        counter.inc(2, kind='say "hi"')
+        self.assertEqual(counter.render()[-1], 'test_events_total{kind="say \\"hi\\""} 3')
+        histogram = metrics.Histogram("test_seconds", "Latency.", ("stage",), buckets=(0.1, 1.0))
+        histogram.observe(0.05, stage="a")
+        histogram.observe(0.5, stage="a")
+        lines = histogram.render()
+        self.assertIn('test_seconds_bucket{stage="a",le="0.1"} 1', lines)
+        self.assertIn('test_seconds_bucket{stage="a",le="+Inf"} 2', lines)
+        self.assertIn('test_seconds_count{stage="a"} 2', lines)
+
+    def test_scope_labels_reach_helpers_and_thread_pools(self):
+        with metrics.scope(mode="detailed", task="suggestions"):
+            self.assertEqual(metrics.current_labels(), {"mode": "detailed", "task": "suggestions"})
+            bound = metrics.in_scope(metrics.current_labels)
+        self.assertEqual(metrics.current_labels(), {"mode": "none", "task": "answer"})
+        self.assertEqual(ThreadPoolExecutor(max_workers=1).submit(bound).result()["mode"], "detailed")
+
+    def test_unknown_modes_are_labelled_other(self):
+        with metrics.scope(mode="'; DROP TABLE --"):
+            self.assertEqual(metrics.current_labels()["mode"], "other")
+
+        def generator():
+            yield metrics.current_labels()["mode"]
+
+        self.assertEqual(list(metrics.iterate_in_scope(generator(), mode="expert")), ["other"])
+        self.assertEqual(list(metrics.iterate_in_scope(generator(), mode="all")), ["all"])
+
+    def test_timed_records_latency_and_errors(self):
+        before = metrics.STAGE_ERRORS.value(stage="test_stage", mode="textbook")
+        with metrics.scope(mode="textbook"):
+            with self.assertRaises(ValueError):
+                with metrics.timed("test_stage"):
+                    raise ValueError("boom")
+        self.assertEqual(metrics.STAGE_ERRORS.value(stage="test_stage", mode="textbook"), before + 1)
+        self.assertGreaterEqual(metrics.STAGE_SECONDS.count(stage="test_stage", mode="textbook"), 1)
+
+
+class ConversationMemoryTests(SimpleTestCase):
+    def make_memory(self, **env):
+        summaries = []
+
+        def summarize(summary, turns):
+            summaries.append(turns)
+            return (summary + " " + " / ".join(turn["content"] for turn in turns)).strip()
+
+        with mock.patch.dict(os.environ, {key: str(value) for key, value in env.items()}):
+            memory = ConversationMemory(summarize)
+        return memory, summaries
+
+    def test_turns_are_recorded_per_session(self):
+        memory, _ = self.make_memory()
+        memory.record("s1", "What is the Sun?", "A star.")
+        context = memory.context("s1")
+        self.assertEqual(context.turns, [{"role": "user", "content": "What is the Sun?"}, {"role": "assistant", "content": "A star."}])
+        self.assertTrue(memory.context("s2").empty)
+        self.assertTrue(memory.context(None).empty)
+
+    def test_old_turns_are_folded_into_the_summary(self):
+        memory, summaries = self.make_memory(CONVERSATION_MEMORY_TOKENS=40, CONVERSATION_KEEP_TURNS=2)
+        for i in range(4):
+            memory.record("s1", f"Question number {i} about the planets?", f"Answer number {i} about the planets.")
+        context = memory.context("s1")
+        self.assertTrue(summaries)
+        self.assertIn("Question number 0", context.summary)
+        self.assertEqual(context.turns[-1]["content"], "Answer number 3 about the planets.")
+        self.assertNotIn("Question number 0 about the planets?", [turn["content"] for turn in context.turns])
+        self.assertGreaterEqual(memory.stats()["compactions"], 1)
+
+    def test_failed_summary_drops_the_oldest_turns(self):
+        memory, _ = self.make_memory(CONVERSATION_MEMORY_TOKENS=40)
+        memory.summarize = mock.Mock(side_effect=RuntimeError("model down"))
+        for i in range(4):
+            memory.record("s1", f"Question number {i} about the planets?", f"Answer number {i} about the planets.")
+        context = memory.context("s1")
+        self.assertEqual(context.summary, "")
+        self.assertEqual(context.turns[-1]["content"], "Answer number 3 about the planets.")
+        self.assertGreaterEqual(memory.stats()["compaction_errors"], 1)
+
+    def test_unknown_session_is_seeded_from_the_client_history(self):
+        memory, _ = self.make_memory()
+        history = [
+            {"role": "user", "content": "What is the Sun?"},
+            {"role": "assistant", "content": "A star."},
+            {"role": "system", "content": "ignored"},
+            {"role": "user", "content": "How hot is it?"},
+        ]
+        context = memory.context("s1", history, "How hot is it?")
+        self.assertEqual([turn["content"] for turn in context.turns], ["What is the Sun?", "A star."])
+        self.assertEqual(memory.stats()["seeded"], 1)
+
+    def test_sessions_are_evicted_least_recently_used_first(self):
+        memory, _ = self.make_memory(CONVERSATION_MAX_SESSIONS=2)
+        for session_id in ("a", "b", "c"):
+            memory.record(session_id, "What is the Sun?", "A star.")
+        self.assertTrue(memory.context("a").empty)
+        self.assertFalse(memory.context("c").empty)
+        self.assertEqual(memory.stats()["evicted"], 1)
+
+    def test_memory_goes_into_the_mode_prompt(self):
+        service = mode_service("sequential", chunks=[chunk("The Sun is a star.")])
+        memory, _ = self.make_memory()
+        memory.record("s1", "What is the Sun?", "A star.")
+        context = memory.context("s1")
+        context.summary = "The student asked about stars."
+        request = service._build_mode_request("detailed", "How hot is it?", [chunk("The Sun is a star.")], context)
+        self.assertIn("The student asked about stars.", request["system"])
+        self.assertEqual([m["role"] for m in request["messages"]], ["user", "assistant", "user"])
+
+
+class FakeOpenAIServerTests(SimpleTestCase):
+    def start(self, *argv):
+        args = build_parser().parse_args(["--latency-ms", "0", "--token-ms", "0", "--embedding-latency-ms", "0", "--embedding-dim", "8", *argv])
+        fake = FakeOpenAI(args)
+        server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(fake))
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        pool = OpenAIClientPool(api_key="sk-fake", base_url=f"http://127.0.0.1:{server.server_address[1]}/v1")
+        return fake, pool.direct_client
+
+    def test_chat_completion_stream_and_embeddings(self):
+        fake, client = self.start()
+        resp = client.chat.completions.create(model="gpt-4o-mini", messages=[{"role": "user", "content": "What is the Sun?"}])
+        self.assertIn("solar system", resp.choices[0].message.content)
+        self.assertGreater(resp.usage.prompt_tokens, 0)
+        stream = client.chat.completions.create(model="gpt-4o-mini", messages=[{"role": "user", "content": "Hi"}], stream=True)
+        text = "".join(event.choices[0].delta.content or "" for event in stream if event.choices)
+        self.assertEqual(text, resp.choices[0].message.content)
+        vectors = client.embeddings.create(model="text-embedding-3-small", input=["sun", "sun", "moon"]).data
+        self.assertEqual(vectors[0].embedding, vectors[1].embedding)
+        self.assertEqual(len(vectors[2].embedding), 8)
+        self.assertEqual((fake.stats["chat"], fake.stats["chat_stream"], fake.stats["embedded_inputs"]), (1, 1, 3))
+
+    def test_injected_rate_limits_carry_retry_after(self):
+        _, client = self.start("--rate-limit-rate", "1", "--retry-after-ms", "250")
+        with self.assertRaises(Exception) as raised:
+            client.chat.completions.create(model="gpt-4o-mini", messages=[{"role": "user", "content": "Hi"}])
+        self.assertEqual(raised.exception.status_code, 429)
+        self.assertTrue(is_retryable(raised.exception))
+        self.assertEqual(retry_after_seconds(raised.exception), 0.25)
+
+
+class RetrievalQualityBenchmarkTests(SimpleTestCase):
+    def test_score_reports_recall_hit_and_reciprocal_rank(self):
+        docs = [Document(page_content=str(page), metadata={"page_number": page}) for page in (7, 3, 9, 4)]
+        row = score(docs, [3, 4], [1, 3])
+        self.assertEqual((row["rr"], row["first_relevant_rank"]), (0.5, 2))
+        self.assertEqual((row["recall@1"], row["hit@1"]), (0.0, 0.0))
+        self.assertEqual((row["recall@3"], row["hit@3"]), (0.5, 1.0))
+        self.assertEqual(score(docs, [42], [3])["rr"], 0.0)
+
+    def test_pages_are_reassembled_in_chunk_order_without_overlap(self):
+        overlap = "the overlapping sentence shared by both chunks."
+        pages = pages_from_chunks(
+            [f"{overlap} Second part.", "Other page.", f"First part, then {overlap}"],
+            [{"page_number": 2, "chunk_id": 1}, {"page_number": 3, "chunk_id": 0}, {"page_number": 2, "chunk_id": 0}],
+        )
+        self.assertEqual([page.metadata["page"] for page in pages], [1, 2])
+        self.assertEqual(pages[0].page_content.count(overlap), 1)
+        self.assertTrue(pages[0].page_content.startswith("First part"))
+
+    def test_parse_chunking_normalizes_and_validates(self):
+        self.assertEqual(parse_chunking("existing, 1000:200,token:300,"), ["existing", "1000:200", "token:300:0"])
+        with self.assertRaises(SystemExit):
+            parse_chunking("200:200")
+
+
+class PrecomputedAnswerStoreTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "answer_store.json")
+        answer = {"answer": "The Sun is a star.", "success": True, "chunk_ids": ["h1", "h2"]}
+        PrecomputedAnswerStore.write(self.path, "build-1", {"textbook": {normalize_question("What is the Sun?"): answer}})
+
+    def test_build_id_ignores_order_and_tracks_the_embedding_model(self):
+        self.assertEqual(textbook_build_id(["b", "a"], "m"), textbook_build_id(["a", "b"], "m"))
+        self.assertNotEqual(textbook_build_id(["a", "b"], "m"), textbook_build_id(["a", "b"], "other"))
+        self.assertNotEqual(textbook_build_id(["a", "b"], "m"), textbook_build_id(["a", "c"], "m"))
+
+    def test_lookup_matches_normalized_questions_of_the_same_build(self):
+        store = PrecomputedAnswerStore(path=self.path, build_id="build-1")
+        self.assertEqual(store.lookup("textbook", "what is the sun")["chunk_ids"], ["h1", "h2"])
+        self.assertIsNone(store.lookup("detailed", "What is the Sun?"))
+        self.assertEqual((store.stats()["hits"], store.stats()["misses"]), (1, 0))
+
+    def test_store_of_another_build_is_ignored(self):
+        store = PrecomputedAnswerStore(path=self.path, build_id="build-2")
+        self.assertEqual(store.status, "stale")
+        self.assertIsNone(store.lookup("textbook", "What is the Sun?"))
+
+    def test_hit_registers_the_turn_with_the_stored_chunks(self):
+        service = bare_service(answer_store=PrecomputedAnswerStore(path=self.path, build_id="build-1"))
+        response = service.get_chat_response("What is the Sun?", level="textbook", turn_id="turn-1")
+        self.assertTrue(response["precomputed"])
+        self.assertEqual(response["turn_id"], "turn-1")
+        chunks = service.retrieval_cache.get_or_retrieve(
+            "turn-1", "What is the Sun?", 2,
+            retrieve=lambda query, k: self.fail("retrieval should not run"),
+            lookup=lambda ids: [chunk(chunk_id, chunk_id=i) for i, chunk_id in enumerate(ids)],
+        )
+        self.assertEqual([doc.page_content for doc in chunks], ["h1", "h2"])
+
+    def test_service_build_id_comes_from_the_chroma_collection(self):
+        store = FakeVectorStore([("c1", "a", {}, [1.0]), ("c2", "b", {}, [0.0])])
+        stale_lexical = SimpleNamespace(ids=["old-1"])
+        service = bare_service(textbook_vectorstore=store, vector_index=None, lexical_index=stale_lexical)
+        model = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-small")
+        self.assertEqual(service.textbook_build_id(), textbook_build_id(["c1", "c2"], model))
+        service.textbook_vectorstore = None
+        self.assertEqual(service.textbook_build_id(), textbook_build_id(["old-1"], model))
+
+
+class KeyTermIndexTests(SimpleTestCase):
+    DOCUMENTS = [
+        "The solar system has eight planets. The planets move around the sun in fixed orbits.",
+        "Mercury is the planet nearest to the sun. The orbits of planets are elliptical.",
+        "A constellation is a group of stars. The pole star stays fixed in the night sky.",
+        "Stars twinkle in the night sky. A constellation like the Great Bear has seven stars.",
+        "Satellites orbit the planets. The moon is the natural satellite of the earth.",
+        "Artificial satellites orbit the earth. The moon reflects the light of the sun.",
+    ]
+
+    def build(self):
+        metadatas = [{"content_hash": f"h{i}"} for i in range(len(self.DOCUMENTS))]
+        return KeyTermIndex.build([f"c{i}" for i in range(len(self.DOCUMENTS))], self.DOCUMENTS, metadatas)
+
+    def test_chunks_are_keyed_on_their_content_hash(self):
+        index = self.build()
+        self.assertEqual(sorted(index.chunk_terms), [f"h{i}" for i in range(len(self.DOCUMENTS))])
+        self.assertEqual(index.info["version"], KEY_TERM_INDEX_VERSION)
+        unhashed = KeyTermIndex.build(["c0"], self.DOCUMENTS[:1], [{}])
+        self.assertEqual(list(unhashed.chunk_terms), ["id:c0"])
+
+    def test_suggestions_follow_the_chunks_and_skip_the_question_terms(self):
+        index = self.build()
+        chunks = [chunk(text, content_hash=f"h{i}") for i, text in enumerate(self.DOCUMENTS[2:4], 2)]
+        questions = index.suggest("What is a constellation?", chunks)
+        self.assertTrue(1 <= len(questions) <= 3)
+        self.assertTrue(all(question.endswith("?") for question in questions))
+        self.assertFalse(any("constellation" in question.lower() for question in questions[:1]))
+        self.assertTrue(any("star" in question.lower() or "sky" in question.lower() for question in questions))
+
+    def test_chunks_without_a_content_hash_hit_the_index(self):
+        ids = [f"uuid-{i}" for i in range(len(self.DOCUMENTS))]
+        metadatas = [{"source": "textbook.pdf", "chunk_id": i} for i in range(len(self.DOCUMENTS))]
+        index = KeyTermIndex.build(ids, self.DOCUMENTS, metadatas)
+        self.assertIn("textbook.pdf:4", index.chunk_terms)
+        retrieved = chunk(self.DOCUMENTS[4], chunk_id=4)
+        with mock.patch.object(index, "terms_for_text", side_effect=AssertionError("recomputed")):
+            self.assertEqual(index.terms_for_chunk(retrieved), index.chunk_terms["textbook.pdf:4"])
+            self.assertTrue(index.suggest("Tell me more", [retrieved]))
+
+    def test_unknown_chunks_are_ranked_from_their_text(self):
+        index = self.build()
+        known = index.suggest("Tell me more", [chunk(self.DOCUMENTS[4], content_hash="h4")])
+        unknown = index.suggest("Tell me more", [chunk(self.DOCUMENTS[4], content_hash="new")])
+        self.assertTrue(known)
+        self.assertEqual(len(unknown), len(known))
+
+    def test_save_and_load_round_trip(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        index = self.build()
+        index.save(tmp.name)
+        loaded = KeyTermIndex.load(tmp.name)
+        self.assertEqual(loaded.chunk_terms, index.chunk_terms)
+        self.assertEqual(loaded.info["version"], KEY_TERM_INDEX_VERSION)
+        chunks = [chunk(self.DOCUMENTS[0], content_hash="h0")]
+        self.assertEqual(loaded.suggest("What is the solar system?", chunks), index.suggest("What is the solar system?", chunks))
+
+
+class IngestionTests(SimpleTestCase):
+    PARAMS = {"chunker": "recursive", "chunk_size": 1000, "chunk_overlap": 200}
+
+    def chunks(self, texts, **metadata):
+        return [chunk(text, page_number=i + 1, **metadata) for i, text in enumerate(texts)]
+
+    def test_ids_are_content_hashes_with_occurrence_suffixes(self):
+        first = assign_chunk_ids(self.chunks(["Sun", "Moon", "Sun"]), self.PARAMS, "model")
+        again = assign_chunk_ids(self.chunks(["Sun", "Moon", "Sun"]), self.PARAMS, "model")
+        self.assertEqual(first, again)
+        self.assertEqual(first[2], f"{first[0]}-2")
+        self.assertNotEqual(first, assign_chunk_ids(self.chunks(["Sun", "Moon", "Sun"]), self.PARAMS, "other-model"))
+        docs = self.chunks(["Sun"])
+        assign_chunk_ids(docs, self.PARAMS, "model")
+        self.assertEqual(docs[0].metadata["content_hash"], first[0])
+
+    def test_resync_only_touches_what_changed(self):
+        store = FakeVectorStore()
+        docs = self.chunks(["Sun", "Moon", "Stars"])
+        report = sync_chunks(store, docs, assign_chunk_ids(docs, self.PARAMS, "model"))
+        self.assertEqual((report.added, report.total), (3, 3))
+
+        # "Sun" is dropped: the others move up a page and "Comets" is new
+        docs = self.chunks(["Moon", "Stars", "Comets"])
+        report = sync_chunks(store, docs, assign_chunk_ids(docs, self.PARAMS, "model"))
+        self.assertEqual((report.added, report.updated, report.deleted, report.unchanged), (1, 2, 1, 0))
+        stored = store._collection.get()
+        self.assertEqual(sorted(stored["documents"]), ["Comets", "Moon", "Stars"])
+        self.assertEqual({m["page_number"] for m in stored["metadatas"]}, {1, 2, 3})
+
+        report = sync_chunks(store, docs, assign_chunk_ids(docs, self.PARAMS, "model"))
+        self.assertEqual((report.added, report.updated, report.deleted, report.unchanged), (0, 0, 0, 3))
+
+    def test_sync_with_a_source_leaves_other_textbooks_alone(self):
+        store = FakeVectorStore([("other-1", "Cells", {"source": "biology.pdf"}, [0.0])])
+        docs = self.chunks(["Sun"])
+        report = sync_chunks(store, docs, assign_chunk_ids(docs, self.PARAMS, "model"), source="textbook.pdf")
+        self.assertEqual(report.deleted, 0)
+        self.assertEqual(store._collection.count(), 2)
+
+    def test_stream_sync_matches_the_batch_sync(self):
+        texts = [f"Chunk number {i}" for i in range(7)] + ["Chunk number 0"]
+        batch_store, stream_store = FakeVectorStore(), FakeVectorStore()
+        docs = self.chunks(texts)
+        sync_chunks(batch_store, docs, assign_chunk_ids(docs, self.PARAMS, "model"))
+        report = sync_chunk_stream(stream_store, iter(self.chunks(texts)), self.PARAMS, "model", window=3)
+        self.assertEqual(report.added, 8)
+        self.assertEqual(sorted(stream_store._collection.rows), sorted(batch_store._collection.rows))
+
+        report = sync_chunk_stream(stream_store, iter(self.chunks(texts[:5])), self.PARAMS, "model", window=3)
+        self.assertEqual((report.added, report.deleted, report.unchanged), (0, 3, 5))
+
+    def test_dry_run_reports_without_writing(self):
+        store = FakeVectorStore()
+        docs = self.chunks(["Sun", "Moon"])
+        report = sync_chunks(store, docs, assign_chunk_ids(docs, self.PARAMS, "model"), dry_run=True)
+        self.assertEqual(report.added, 2)
+        self.assertEqual(store._collection.count(), 0)
+
+    def test_manifest_round_trip_decides_up_to_date(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.assertEqual(load_manifest(tmp.name), {})
+        save_manifest(tmp.name, {"source_sha256": "abc", "chunk_params": self.PARAMS, "embedding_model": "model", "metadata": metadata_params()})
+        manifest = load_manifest(tmp.name)
+        self.assertTrue(is_up_to_date(manifest, "abc", self.PARAMS, "model"))
+        self.assertFalse(is_up_to_date(manifest, "def", self.PARAMS, "model"))
+        self.assertFalse(is_up_to_date(manifest, "abc", {**self.PARAMS, "chunk_size": 500}, "model"))
+        self.assertFalse(is_up_to_date(manifest, "abc", self.PARAMS, "model", metadata_params(grade=7)))
+
+
+class BatchEmbedderTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.underlying = FakeEmbeddings()
+        self.cache = CachedEmbeddings(self.underlying, "fake-model", path=os.path.join(tmp.name, "embeddings.sqlite3"))
+        self.texts = [f"chunk {letter}" for letter in "abcdefg"]
+
+    def test_batches_are_embedded_and_checkpointed(self):
+        embedder = BatchEmbedder(self.cache, batch_size=3, concurrency=2)
+        vectors = embedder.embed(self.texts)
+        self.assertEqual(vectors, [self.underlying.embed_query(text) for text in self.texts])
+        report = embedder.last_report
+        self.assertEqual((report.total, report.embedded, report.batches, report.resumed), (7, 7, 3, 0))
+        self.assertEqual(self.cache.cached_vectors(self.texts), vectors)
+
+    def test_interrupted_run_resumes_from_the_checkpoint(self):
+        original = self.underlying.embed_documents
+
+        def failing(texts):
+            if "chunk g" in texts:
+                raise APIError("bad request", 400)
+            return original(texts)
+
+        self.underlying.embed_documents = failing
+        with self.assertRaises(APIError):
+            BatchEmbedder(self.cache, batch_size=3, concurrency=1).embed(self.texts)
+
+        self.underlying.embed_documents = original
+        embedder = BatchEmbedder(self.cache, batch_size=3, concurrency=1)
+        embedder.embed(self.texts)
+        self.assertEqual((embedder.last_report.resumed, embedder.last_report.embedded), (6, 1))
+
+    def test_rate_limits_are_retried(self):
+        original = self.underlying.embed_documents
+        failures = [APIError("rate limited", 429)]
+
+        def flaky(texts):
+            if failures:
+                raise failures.pop()
+            return original(texts)
+
+        self.underlying.embed_documents = flaky
+        embedder = BatchEmbedder(self.cache, batch_size=10, concurrency=1)
+        with mock.patch("core.services.batch_embedder.retry_delay", return_value=0.0):
+            embedder.embed(self.texts)
+        self.assertEqual((embedder.last_report.retries, embedder.last_report.embedded), (1, 7))
+
+    def test_sync_writes_the_precomputed_vectors(self):
+        store = FakeVectorStore()
+        docs = [chunk(text, page_number=1) for text in self.texts[:2]]
+        ids = assign_chunk_ids(docs, IngestionTests.PARAMS, "fake-model")
+        report = sync_chunks(store, docs, ids, embedder=BatchEmbedder(self.cache, batch_size=1, concurrency=2))
+        self.assertEqual(report.embedding["embedded"], 2)
+        self.assertEqual(store._collection.get(ids=ids[:1])["embeddings"], [self.underlying.embed_query(self.texts[0])])
+
+
+class RetrievalFilterTests(SimpleTestCase):
+    METADATAS = [
+        {"source": "textbook.pdf", "chapter": 1, "section": "1.1", "page_number": 2},
+        {"source": "textbook.pdf", "chapter": 2, "section": "2.3", "page_number": 9},
+        {"source": "atlas.pdf", "chapter": 2, "page_number": 4},
+        {"source": "atlas.pdf", "chapter": 3, "page_number": 5, "page_number_end": 7},
+    ]
+
+    def test_normalize_drops_empty_values_and_rejects_unknown_keys(self):
+        self.assertEqual(
+            normalize_filters({"source": "textbook.pdf", "chapter": [2, 1], "section": "", "grade": "7", "page_max": "9"}),
+            {"source": "textbook.pdf", "chapter": ["1", "2"], "grade": 7, "page_max": 9},
+        )
+        with self.assertRaises(ValueError):
+            normalize_filters({"colour": "red"})
+
+    def test_chroma_where_and_local_masks_agree(self):
+        for filters in (
+            {"source": "textbook.pdf"},
+            {"chapter": ["2"]},
+            {"chapter": "2", "source": "textbook.pdf"},
+            {"page_min": 3, "page_max": 9},
+            {"page_min": 6},
+            {"page_min": 6, "page_max": 6},
+        ):
+            normalized = normalize_filters(filters)
+            where = to_chroma_where({key: int(v) if key == "chapter" else v for key, v in normalized.items()})
+            expected = [_where_matches(m, where) for m in self.METADATAS]
+            self.assertEqual([matches(m, normalized) for m in self.METADATAS], expected, filters)
+            self.assertEqual(list(FilterMasks(self.METADATAS).get(normalized)), expected)
+        self.assertIsNone(to_chroma_where({}))
+        self.assertIsNone(FilterMasks(self.METADATAS).get({}))
+
+    def test_page_range_matches_chunks_spanning_into_it(self):
+        spanning = self.METADATAS[3]
+        self.assertTrue(matches(spanning, {"page_min": 7, "page_max": 9}))
+        self.assertTrue(matches(spanning, {"page_min": 1, "page_max": 5}))
+        self.assertFalse(matches(spanning, {"page_min": 8}))
+        self.assertFalse(matches(spanning, {"page_max": 4}))
+
+    def test_the_same_passage_in_two_sources_gets_two_ids(self):
+        params = IngestionTests.PARAMS
+        store = FakeVectorStore()
+        for source in ("textbook.pdf", "atlas.pdf"):
+            docs = [chunk("The Earth rotates on its axis.", source=source, page_number=1)]
+            report = sync_chunks(store, docs, assign_chunk_ids(docs, params, "model"), source=source)
+            self.assertEqual(report.added, 1)
+        self.assertEqual(store._collection.count(), 2)
+        hashes = {m["content_hash"] for m in store._collection.get()["metadatas"]}
+        self.assertEqual(len(hashes), 2)
+
+        docs = [chunk("Other text.", source="atlas.pdf", page_number=1)]
+        report = sync_chunks(store, docs, assign_chunk_ids(docs, params, "model"), source="atlas.pdf")
+        self.assertEqual(report.deleted, 1)
+        self.assertEqual(len(store._collection.get(where={"source": "textbook.pdf"})["ids"]), 1)
+
+
+class FakePdfReader:
+    def __init__(self, texts):
+        self.pages = [mock.Mock(**{"extract_text.return_value": text}) for text in texts]
+
+
+def load_script(name):
+    """A module from the repository's top-level scripts/ folder (not a package on sys.path)."""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "scripts", f"{name}.py")
+    spec = importlib.util.spec_from_file_location(f"scripts_{name}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class PdfPagesTests(SimpleTestCase):
+    TEXTS = [f"Page {number} text" for number in range(10)] + [None]
+
+    def setUp(self):
+        patcher = mock.patch("core.services.pdf_pages._reader", side_effect=lambda path: FakePdfReader(self.TEXTS))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_preprocess_script_streams_the_pages(self):
+        preprocess = load_script("preprocess_pdf")
+        texts = preprocess.iter_page_texts("book.pdf", workers=1)
+        self.assertEqual(next(texts), "Page 0 text")
+        self.assertEqual(preprocess.extract_text_from_pdf("book.pdf", workers=1), "".join(t or "" for t in self.TEXTS))
+
+    def test_small_pdfs_are_read_in_process(self):
+        pages = list(iter_pdf_pages("book.pdf", workers=1))
+        self.assertEqual(page_count("book.pdf"), 11)
+        self.assertEqual([page.metadata for page in pages], [{"source": "book.pdf", "page": n} for n in range(11)])
+        self.assertEqual(pages[3].page_content, "Page 3 text")
+        self.assertEqual(pages[-1].page_content, "")
+
+    def test_pool_extracts_ranges_in_order_with_bounded_lookahead(self):
+        submitted = []
+
+        class RecordingPool(ThreadPoolExecutor):
+            def submit(self, fn, *args):
+                submitted.append(args[1:])
+                return super().submit(fn, *args)
+
+        env = {"PDF_PARALLEL_MIN_PAGES": "1", "PDF_PAGES_PER_TASK": "2"}
+        with mock.patch.dict(os.environ, env), mock.patch("core.services.pdf_pages.ProcessPoolExecutor", RecordingPool):
+            pages = iter_pdf_pages("book.pdf", workers=2)
+            first = next(pages)
+            self.assertEqual(len(submitted), 5)
+            rest = list(pages)
+        self.assertEqual([page.metadata["page"] for page in [first, *rest]], list(range(11)))
+        self.assertEqual(submitted, [(0, 2), (2, 4), (4, 6), (6, 8), (8, 10), (10, 11)])
+        self.assertEqual([page.page_content for page in rest[:2]], ["Page 1 text", "Page 2 text"])
+
+
+class TokenChunkerTests(SimpleTestCase):
+    def pages(self, *texts):
+        return [Document(page_content=text, metadata={"source": "book.pdf", "page": number}) for number, text in enumerate(texts)]
+
+    def sentences(self, page, count):
+        return " ".join(f"Sentence {count * page + i} is about page {page} of the book." for i in range(count))
+
+    def test_sentences_keep_their_whitespace(self):
+        text = "The Sun is a star.  It is hot!\nIs it big? Yes"
+        self.assertEqual(split_sentences(text), ["The Sun is a star.  ", "It is hot!\n", "Is it big? ", "Yes"])
+        self.assertEqual("".join(split_sentences(text)), text)
+
+    def test_chunks_respect_the_budget_and_overlap(self):
+        chunker = TokenSentenceChunker(chunk_tokens=40, overlap_tokens=15, model="text-embedding-3-small")
+        chunks = list(chunker.split_pages(self.pages(self.sentences(0, 12))))
+        self.assertGreater(len(chunks), 2)
+        self.assertTrue(all(c.metadata["tokens"] <= 40 for c in chunks))
+        for previous, current in zip(chunks, chunks[1:]):
+            # Each sentence is well under the overlap, so the last one is carried over
+            self.assertTrue(current.page_content.startswith(split_sentences(previous.page_content)[-1].strip()))
+
+    def test_page_metadata_is_zero_based_and_spans_pages(self):
+        chunker = TokenSentenceChunker(chunk_tokens=60, overlap_tokens=10, model="text-embedding-3-small")
+        chunks = list(chunker.split_pages(self.pages(self.sentences(0, 3), self.sentences(1, 3), self.sentences(2, 3))))
+        self.assertEqual(chunks[0].metadata["page"], 0)
+        self.assertEqual(chunks[-1].metadata["page_end"], 2)
+        self.assertTrue(any(c.metadata["page_end"] > c.metadata["page"] for c in chunks))
+        for c in chunks:
+            self.assertIn(f"page {c.metadata['page']} ", c.page_content)
+            self.assertIn(f"page {c.metadata['page_end']} ", c.page_content)
+
+    def test_chunking_script_wraps_the_chunker(self):
+        chunking = load_script("chunking")
+        chunks = chunking.dynamic_chunking_with_metadata(self.sentences(0, 12), token_limit=40, page_number=3)
+        expected = list(TokenSentenceChunker(40, 8, model="cl100k_base").split_pages(self.pages(self.sentences(0, 12))))
+        self.assertEqual([c["text"] for c in chunks], [c.page_content for c in expected])
+        self.assertEqual([c["chunk_id"] for c in chunks], [f"3-{i}" for i in range(len(expected))])
+        self.assertTrue(all(c["page_number"] == 3 and c["tokens"] <= 40 for c in chunks))
+        self.assertEqual(encoding_name_for_model("cl100k_base"), "cl100k_base")
+
+    def test_long_sentences_are_cut_to_fit(self):
+        chunker = TokenSentenceChunker(chunk_tokens=20, overlap_tokens=5, model="text-embedding-3-small")
+        chunks = list(chunker.split_pages(self.pages("word " * 200)))
+        self.assertGreater(len(chunks), 1)
+        self.assertTrue(all(c.metadata["tokens"] <= 20 for c in chunks))
+
+    def test_ingested_token_chunks_carry_one_based_page_numbers(self):
+        pages = self.pages(self.sentences(0, 3), self.sentences(1, 3))
+        chunks = list(iter_textbook_chunks(pages, chunk_size=60, chunk_overlap=10, chunker="token"))
+        for c in chunks:
+            self.assertEqual(c.metadata["page_number"], c.metadata["page"] + 1)
+            self.assertEqual(c.metadata["page_number_end"], c.metadata["page_end"] + 1)
+        spanning = next(c for c in chunks if c.metadata["page_number_end"] > c.metadata["page_number"])
+        self.assertTrue(matches(spanning.metadata, normalize_filters({"page_min": 2, "page_max": 2})))
+
+        recursive = list(iter_textbook_chunks(pages, chunk_size=100, chunk_overlap=10, chunker="recursive"))
+        self.assertTrue(all(c.metadata["page_number_end"] == c.metadata["page_number"] for c in recursive))
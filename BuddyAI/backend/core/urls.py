@@ -4,13 +4,21 @@ from .views import practice_view
 from .views import curiosity_view
 from .views import test_api
 from .views import media_search_views
+from .views import chat_views
+from .views import batch_view
 
 urlpatterns = [
     path('get-answer/', llm_view.get_answer, name='get_answer'),
+    path('get-answer/stream/', llm_view.get_answer_stream, name='get_answer_stream'),
     path('chat/', llm_view.chat, name='chat'),
+    path('chat/stream/', llm_view.chat_stream, name='chat_stream'),
+    path('chat/all-modes/', llm_view.chat_all_modes, name='chat_all_modes'),
+    path('ready/', chat_views.readiness_view, name='readiness'),
     path('translate/status/', translate_view.translate_status_view, name='translate_status'),
     path('translate/', translate_view.translate_view, name='translate'),
     path('rewrite-answer/', llm_view.rewrite_answer, name='rewrite_answer'),
+    path('batch/answers/', batch_view.batch_answers, name='batch_answers'),
+    path('batch/answers/<str:job_id>/', batch_view.batch_job_status, name='batch_job_status'),
     path('chapters/<str:chapter_id>/generate-questions', practice_view.generate_questions, name='generate_questions'),
     path('questions/<str:question_id>/score', practice_view.score_question, name='score_question'),
     # Curiosity
@@ -6,7 +6,7 @@ and responses for the Django application.
 """
 
 from .llm_view import get_answer
-from .chat_views import chat_view, save_chat_view, load_chat_view, health_check_view, index_view
+from .chat_views import chat_view, save_chat_view, load_chat_view, health_check_view, readiness_view, index_view
 from .chapter_view import get_chapter_content
 
 
@@ -16,6 +16,7 @@ __all__ = [
     'save_chat_view', 
     'load_chat_view',
     'health_check_view',
+    'readiness_view',
     'index_view',
     'get_chapter_content',
     'extract_text_from_image',
@@ -0,0 +1,89 @@
+# batch_view.py
+import json
+import os
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+from core.services import llm_service
+
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "200"))
+# Batches larger than this always run as a background job
+BATCH_SYNC_MAX_ITEMS = int(os.getenv("BATCH_SYNC_MAX_ITEMS", "10"))
+
+
+@require_http_methods(["POST"])
+@csrf_exempt
+def batch_answers(request):
+    """
+    Answer many questions in one request (e.g. for worksheet preparation).
+
+    Body:
+    - items: list of {"question": str, "level": "textbook" | "detailed" | "advanced"}
+    - async: run as a background job even for small batches (optional)
+
+    Small batches return {"results": [...]} in input order, each with its own
+    success flag and error. Larger batches return 202 with a job_id; poll
+    GET batch/answers/<job_id>/ for progress and results.
+    """
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({
+            'success': False,
+            'error': 'Invalid JSON data.'
+        }, status=400)
+
+    items = data.get('items')
+    if not isinstance(items, list) or not items:
+        return JsonResponse({
+            'success': False,
+            'error': 'Provide a non-empty list of items ({"question", "level"}).'
+        }, status=400)
+    if len(items) > BATCH_MAX_ITEMS:
+        return JsonResponse({
+            'success': False,
+            'error': f'Too many items ({len(items)}); the limit is {BATCH_MAX_ITEMS} per batch.'
+        }, status=400)
+
+    try:
+        if data.get('async') or len(items) > BATCH_SYNC_MAX_ITEMS:
+            job_id = llm_service.submit_batch(items)
+            return JsonResponse({
+                'success': True,
+                'job_id': job_id,
+                'status': 'queued',
+                'total': len(items),
+                'status_url': f'/api/core/batch/answers/{job_id}/'
+            }, status=202)
+
+        results = llm_service.answer_batch(items)
+        return JsonResponse({
+            'success': True,
+            'total': len(results),
+            'failed': sum(1 for result in results if not result.get('success')),
+            'results': results
+        })
+    except Exception as e:
+        print(f"❌ Error in batch_answers: {e}")
+        return JsonResponse({
+            'success': False,
+            'error': f"An error occurred while processing the batch: {str(e)}"
+        }, status=500)
+
+
+@require_http_methods(["GET"])
+def batch_job_status(request, job_id):
+    """
+    Progress and (partial) results of a batch job. Results of items that
+    have not finished yet are null.
+    """
+    job = llm_service.batch_jobs.get(job_id)
+    if job is None:
+        return JsonResponse({
+            'success': False,
+            'error': 'Batch job not found (it may have expired).'
+        }, status=404)
+    return JsonResponse({
+        'success': True,
+        **job
+    })
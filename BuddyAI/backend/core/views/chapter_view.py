@@ -3,6 +3,7 @@ from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from core.services import llm_service
+from core.services.retrieval_cache import chunk_ids_of
 
 
 @require_http_methods(["GET"])
@@ -13,12 +14,19 @@ def get_chapter_content(request):
     Query Parameters:
     - query: The user's question to find relevant chapter
     - chunks_used: Number of chunks to retrieve (default: 5)
+    - turn_id: Chat turn the query was answered in (optional)
+    - chunk_ids: Comma-separated chunk ids returned with that answer (optional)
+    
+    With turn_id, the chunks retrieved for the answer are reused and only
+    topped up to the larger chapter depth.
     
     Returns:
     JSON response with chapter content
     """
     query = request.GET.get("query")
     chunks_used = int(request.GET.get("chunks_used", 5))
+    turn_id = request.GET.get("turn_id")
+    chunk_ids = [c for c in request.GET.get("chunk_ids", "").split(",") if c.strip()]
     
     if not query:
         return JsonResponse({
@@ -28,7 +36,7 @@ def get_chapter_content(request):
     
     try:
         # Get relevant chunks from the textbook
-        chunks = llm_service.retrieve_textbook_chunks(query, k=max(chunks_used, 10))
+        chunks = llm_service.retrieve_for_turn(turn_id, query, k=max(chunks_used, 10), chunk_ids=chunk_ids)
         
         if not chunks:
             return JsonResponse({
@@ -69,7 +77,9 @@ def get_chapter_content(request):
             "metadata": {
                 "total_chunks": len(chunks),
                 "content_length": len(chapter_content),
-                "query_processed": query
+                "query_processed": query,
+                "turn_id": turn_id,
+                "chunk_ids": chunk_ids_of(chunks)
             }
         })
         
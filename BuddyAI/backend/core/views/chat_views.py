@@ -3,7 +3,9 @@ from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 import json
+import uuid
 from core.services import llm_service
+from core.views.streaming import sse_response
 
 # Chat-related views
 
@@ -18,6 +20,7 @@ def chat_view(request):
         message = data.get('message', '')
         level = data.get('level', 'textbook')
         history = data.get('history', [])
+        session_id = data.get('session_id') or uuid.uuid4().hex
         
         if not message or len(message.strip()) < 4:
             return JsonResponse({
@@ -25,14 +28,21 @@ def chat_view(request):
                 'error': 'Please provide a valid question (at least 4 characters).'
             })
         
+        if data.get('stream'):
+            return sse_response(llm_service.stream_chat_response(message, level, history, session_id=session_id))
+        
         # Get response from LLM service
-        response = llm_service.get_chat_response(message, level, history)
+        response = llm_service.get_chat_response(message, level, history, session_id=session_id)
         
         return JsonResponse({
             'success': True,
             'answer': response['answer'],
             'suggested_questions': response['suggested_questions'],
-            'level': response['level']
+            'level': response['level'],
+            'turn_id': response.get('turn_id'),
+            'chunk_ids': response.get('chunk_ids', []),
+            'session_id': session_id,
+            'prompt_tokens': response.get('prompt_tokens')
         })
         
     except json.JSONDecodeError:
@@ -132,6 +142,23 @@ def health_check_view(request):
         'status': 'healthy'
     })
 
+@require_http_methods(["GET"])
+def readiness_view(request):
+    """
+    Readiness endpoint: reports whether the LLM service has finished loading
+    and which components are available. Returns 503 until it is ready; the
+    status field says whether it is still loading, failed, or was never
+    started (warm-up disabled with LLM_SERVICE_WARMUP=0).
+    Pass ?warm=1 to start a background warm-up if the service is not loaded yet.
+    """
+    if request.GET.get('warm') and not llm_service.is_loaded:
+        llm_service.start_background_warmup()
+    readiness = llm_service.readiness()
+    return JsonResponse({
+        'success': True,
+        **readiness
+    }, status=200 if readiness['ready'] else 503)
+
 def index_view(request):
     """
     Main page view (for future web interface).
@@ -1,9 +1,11 @@
 # llm_view.py
 import json
+import uuid
 from django.http import JsonResponse
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
 from core.services.llm_service import llm_service
+from core.views.streaming import sse_response
 
 def get_answer(request):
     """
@@ -37,7 +39,10 @@ def get_answer(request):
             'answer': response['answer'],
             'suggested_questions': response.get('suggested_questions', []),
             'level': level,
-            'query': query
+            'query': query,
+            'turn_id': response.get('turn_id'),
+            'chunk_ids': response.get('chunk_ids', []),
+            'prompt_tokens': response.get('prompt_tokens')
         })
 
     except Exception as e:
@@ -54,6 +59,26 @@ def get_answer(request):
         }, status=500)
 
 
+@require_http_methods(["GET"])
+def get_answer_stream(request):
+    """
+    Server-sent events variant of get_answer (usable from EventSource).
+    Emits "token" events as the answer is generated, then "suggestions",
+    "metadata" and "done".
+    """
+    query = request.GET.get('query', '')
+    level = request.GET.get('level', 'textbook')
+
+    if not query:
+        return JsonResponse({
+            'success': False,
+            'error': 'No query provided'
+        }, status=400)
+
+    print(f"🔍 Streaming answer for query: '{query}' (level: {level})")
+    return sse_response(llm_service.stream_chat_response(message=query, level=level))
+
+
 def get_service_status(request):
     """
     Get the current status of the LLM service.
@@ -74,12 +99,15 @@ def get_service_status(request):
 def chat(request):
     """
     Handle conversational chat with context preservation.
+    Send back the returned session_id so follow-up questions see the
+    conversation so far (a new session is started without one).
     """
     try:
         data = json.loads(request.body)
         message = data.get('message', '')
         history = data.get('history', [])
         level = data.get('level', 'detailed')
+        session_id = data.get('session_id') or uuid.uuid4().hex
 
         if not message:
             return JsonResponse({
@@ -87,18 +115,31 @@ def chat(request):
                 'error': 'No message provided'
             }, status=400)
 
+        if data.get('stream'):
+            return sse_response(llm_service.stream_chat_response(
+                message=message,
+                level=level,
+                history=history,
+                session_id=session_id
+            ))
+
         # Use LLM service to generate chat response
         response = llm_service.get_chat_response(
             message=message, 
             level=level, 
-            history=history
+            history=history,
+            session_id=session_id
         )
 
         return JsonResponse({
             'success': True,
             'answer': response['answer'],
             'suggested_questions': response.get('suggested_questions', []),
-            'level': level
+            'level': level,
+            'turn_id': response.get('turn_id'),
+            'chunk_ids': response.get('chunk_ids', []),
+            'session_id': session_id,
+            'prompt_tokens': response.get('prompt_tokens')
         })
 
     except Exception as e:
@@ -108,12 +149,44 @@ def chat(request):
             'error': f"An error occurred while processing your request: {str(e)}"
         }, status=500) 
 
+
+@require_http_methods(["POST"])
+@csrf_exempt
+def chat_stream(request):
+    """
+    Server-sent events variant of chat: streams tokens as they are generated,
+    followed by suggested questions and metadata (used_mode, chunks_used).
+    """
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({
+            'success': False,
+            'error': 'Invalid JSON data.'
+        }, status=400)
+
+    message = data.get('message', '')
+    if not message:
+        return JsonResponse({
+            'success': False,
+            'error': 'No message provided'
+        }, status=400)
+
+    return sse_response(llm_service.stream_chat_response(
+        message=message,
+        level=data.get('level', 'detailed'),
+        history=data.get('history', []),
+        session_id=data.get('session_id') or uuid.uuid4().hex
+    ))
+
 @require_http_methods(["POST"])
 @csrf_exempt
 def rewrite_answer(request):
     """
     Rewrite a previous answer with a specific mode.
     Supports regenerating the last answer or a specific turn's answer.
+    Send the turn_id and chunk_ids returned with the original answer to reuse
+    its textbook retrieval instead of searching again.
     """
     try:
         data = json.loads(request.body)
@@ -121,6 +194,9 @@ def rewrite_answer(request):
         mode = data.get('mode', 'textbook')
         conversation_context = data.get('conversation_context', [])
         turn_index = data.get('turn_index', -1)  # -1 means last turn
+        turn_id = data.get('turn_id')
+        chunk_ids = data.get('chunk_ids') or []
+        session_id = data.get('session_id')
 
         # Validate inputs
         if not user_prompt:
@@ -141,7 +217,12 @@ def rewrite_answer(request):
         response = llm_service.get_chat_response(
             message=user_prompt, 
             level=mode, 
-            history=context_for_turn
+            history=context_for_turn,
+            turn_id=turn_id,
+            chunk_ids=chunk_ids,
+            session_id=session_id,
+            # A rewrite replaces an answer already in the conversation
+            remember=False
         )
 
         return JsonResponse({
@@ -149,7 +230,10 @@ def rewrite_answer(request):
             'answer': response['answer'],
             'suggested_questions': response.get('suggested_questions', []),
             'mode': mode,
-            'turn_index': turn_index
+            'turn_index': turn_index,
+            'turn_id': response.get('turn_id'),
+            'chunk_ids': response.get('chunk_ids', []),
+            'prompt_tokens': response.get('prompt_tokens')
         })
 
     except Exception as e:
@@ -157,4 +241,51 @@ def rewrite_answer(request):
         return JsonResponse({
             'success': False, 
             'error': str(e)
-        }, status=500) 
\ No newline at end of file
+        }, status=500) 
+
+@require_http_methods(["POST"])
+@csrf_exempt
+def chat_all_modes(request):
+    """
+    Answer one question in textbook, detailed and advanced modes together.
+    Textbook retrieval runs once and the three answers are generated
+    concurrently, so the client can flip between modes without new requests.
+    With "stream": true, each mode is sent as a server-sent "mode" event as
+    soon as it is ready.
+    """
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({
+            'success': False,
+            'error': 'Invalid JSON data.'
+        }, status=400)
+
+    message = data.get('message', '')
+    if not message:
+        return JsonResponse({
+            'success': False,
+            'error': 'No message provided'
+        }, status=400)
+
+    history = data.get('history', [])
+    turn_id = data.get('turn_id')
+    chunk_ids = data.get('chunk_ids') or []
+    session_id = data.get('session_id') or uuid.uuid4().hex
+
+    if data.get('stream'):
+        return sse_response(llm_service.stream_all_mode_responses(message, history, turn_id, chunk_ids, session_id))
+
+    try:
+        result = llm_service.get_all_mode_responses(message, history, turn_id, chunk_ids, session_id)
+        return JsonResponse({
+            'success': True,
+            'query': message,
+            **result
+        })
+    except Exception as e:
+        print(f"❌ Error in chat_all_modes: {e}")
+        return JsonResponse({
+            'success': False,
+            'error': f"An error occurred while processing your request: {str(e)}"
+        }, status=500)
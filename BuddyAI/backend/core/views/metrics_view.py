@@ -0,0 +1,19 @@
+# metrics_view.py
+import os
+from django.http import HttpResponse
+from django.views.decorators.http import require_http_methods
+from core.services import metrics
+
+# Optional bearer token required to scrape /metrics
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+
+@require_http_methods(["GET"])
+def metrics_view(request):
+    """
+    Prometheus text exposition of per-stage latencies, LLM token counts,
+    cache events and errors for this worker process.
+    """
+    if METRICS_TOKEN and request.headers.get("Authorization") != f"Bearer {METRICS_TOKEN}":
+        return HttpResponse("Unauthorized\n", status=401, content_type="text/plain")
+    return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -111,7 +111,8 @@ class CorrectAnswerView(APIView):
             })
         # Fallback: if llm_service has a method to derive/correct
         try:
-            if _llm_service_instance and hasattr(_llm_service_instance, 'get_correct_answer'):
+            # Never build the LLM service inside a request just for this optional fallback
+            if _llm_service_instance is not None and _llm_service_instance.is_loaded and hasattr(_llm_service_instance, 'get_correct_answer'):
                 data = _llm_service_instance.get_correct_answer(question_id)
                 return Response(data)
         except Exception:
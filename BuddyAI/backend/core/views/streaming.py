@@ -0,0 +1,33 @@
+"""
+Server-sent events helpers shared by the streaming chat endpoints.
+"""
+
+import json
+from typing import Any, Dict, Iterable, Iterator
+
+from django.http import StreamingHttpResponse
+
+
+def format_sse(event: str, data: Any) -> str:
+    """Encode one server-sent event frame."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def sse_response(events: Iterable[Dict[str, Any]]) -> StreamingHttpResponse:
+    """
+    Wrap an iterator of {"event": ..., "data": ...} dicts in a text/event-stream response.
+    """
+    def _frames() -> Iterator[str]:
+        try:
+            for item in events:
+                yield format_sse(item["event"], item.get("data", {}))
+        except Exception as e:
+            print(f"❌ Error while streaming response: {e}")
+            yield format_sse("error", {"error": str(e)})
+            yield format_sse("done", {})
+
+    response = StreamingHttpResponse(_frames(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    # Disable proxy buffering (nginx) so tokens reach the browser immediately
+    response["X-Accel-Buffering"] = "no"
+    return response
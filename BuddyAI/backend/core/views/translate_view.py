@@ -4,6 +4,7 @@ from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 import json
 
+from core.services import metrics
 from core.services.translator import (
     get_translator,
     TranslatorError,
@@ -53,6 +54,7 @@ def translate_view(request):
     try:
         cache_key = f"{source_lang or 'auto'}->{target_lang}:{hash(text)}"
         cached = translation_cache.get(cache_key)
+        metrics.cache_event("translation", "hit" if cached else "miss")
         if cached:
             return JsonResponse({
                 "success": True,
@@ -71,7 +73,8 @@ def translate_view(request):
 
         def _do_translate(p: str):
             # Use pre-detected source for all parts
-            t, _ = translator.translate(p, detected_lang, target_lang)
+            with metrics.timed("translation"):
+                t, _ = translator.translate(p, detected_lang, target_lang)
             return t
 
         with ThreadPoolExecutor(max_workers=min(4, len(parts))) as ex:
@@ -2,24 +2,52 @@
 """
 Rebuild textbook vector database with OpenAI embeddings.
 This script creates a fresh vector database using the current OpenAI embeddings.
+
+Chunking is configured with TEXTBOOK_CHUNK_SIZE (default 1000 characters) and
+TEXTBOOK_CHUNK_OVERLAP (default 200), or with TEXTBOOK_CHUNKER=token and
+TEXTBOOK_TOKEN_CHUNK_SIZE / TEXTBOOK_TOKEN_CHUNK_OVERLAP (default 250 / 40
+tokens) for token-aware sentence chunks; compare settings first with
+benchmarks/benchmark_retrieval_quality.py.
+
+New chunks are embedded through the batched, concurrent embedder
+(INGEST_EMBED_BATCH_SIZE, INGEST_EMBED_CONCURRENCY) and cached as they
+finish, so a rebuild that is interrupted resumes without re-embedding.
+
+For routine updates after a PDF edit use ingest_textbook.py, which only
+re-embeds changed chunks and keeps the database online.
 """
 
 import os
 import sys
+import time
 from pathlib import Path
 from dotenv import load_dotenv
 
 # Add the current directory to Python path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import PyPDFLoader
 from langchain_community.vectorstores import Chroma
 from langchain_openai import OpenAIEmbeddings
 
+from core.services.batch_embedder import BatchEmbedder
+from core.services.embedding_cache import CachedEmbeddings
+from core.services.pdf_pages import iter_pdf_pages, page_count
+from core.services.ingestion import (
+    TEXTBOOK_CHUNKER,
+    chunking_params,
+    file_sha256,
+    find_textbook_pdf,
+    iter_textbook_chunks,
+    metadata_params,
+    rebuild_side_indexes,
+    save_manifest,
+    sync_chunk_stream,
+)
+
 # Load environment variables
 load_dotenv()
 
+
 def create_textbook_vector_db():
     """Create a fresh textbook vector database with OpenAI embeddings."""
     
@@ -30,52 +58,27 @@ def create_textbook_vector_db():
         return False
     
     # Find textbook PDF
-    textbook_paths = [
-        "../../knowledge-base/textbook.pdf",
-        "../knowledge-base/textbook.pdf", 
-        "knowledge-base/textbook.pdf",
-        "../../../knowledge-base/textbook.pdf"
-    ]
-    
-    textbook_path = None
-    for path in textbook_paths:
-        if os.path.exists(path):
-            textbook_path = path
-            print(f"✅ Found textbook at: {path}")
-            break
-    
+    textbook_path = find_textbook_pdf()
     if not textbook_path:
         print("❌ Textbook PDF not found!")
         return False
+    print(f"✅ Found textbook at: {textbook_path}")
     
     # Initialize OpenAI embeddings
     embed_model = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-small")
-    embeddings = OpenAIEmbeddings(model=embed_model, openai_api_key=openai_api_key)
+    embeddings = CachedEmbeddings(
+        OpenAIEmbeddings(model=embed_model, openai_api_key=openai_api_key, max_retries=0), model_name=embed_model
+    )
     print(f"✅ Using OpenAI embeddings: {embed_model}")
     
     # Load and split textbook
     try:
-        loader = PyPDFLoader(textbook_path)
-        pages = loader.load()
-        print(f"✅ Loaded {len(pages)} pages from textbook")
-        
-        # Split into chunks
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200,
-            length_function=len,
-        )
+        print(f"✅ Streaming {page_count(textbook_path)} pages from textbook")
         
-        chunks = text_splitter.split_documents(pages)
-        print(f"✅ Created {len(chunks)} chunks")
-        
-        # Add metadata
-        for i, chunk in enumerate(chunks):
-            chunk.metadata.update({
-                'source': 'textbook.pdf',
-                'chunk_id': i,
-                'page_number': chunk.metadata.get('page', 0) + 1
-            })
+        # Pages are extracted, split and embedded as a stream; chunks are stored
+        # under content hashes so ingest_textbook.py can update them
+        chunk_params = chunking_params()
+        chunks = iter_textbook_chunks(iter_pdf_pages(textbook_path))
         
         # Create vector database
         db_path = "../../textbook_vector_db"
@@ -85,16 +88,31 @@ def create_textbook_vector_db():
             print(f"🗑️ Removed old database at: {db_path}")
         
         # Create new database
-        vectorstore = Chroma.from_documents(
-            documents=chunks,
-            embedding=embeddings,
-            persist_directory=db_path
-        )
+        vectorstore = Chroma(persist_directory=db_path, embedding_function=embeddings)
+        report = sync_chunk_stream(vectorstore, chunks, chunk_params, embed_model, embedder=BatchEmbedder(embeddings))
+        print(f"✅ Created {report.total} {TEXTBOOK_CHUNKER} chunks "
+              f"(size {chunk_params['chunk_size']}, overlap {chunk_params['chunk_overlap']})")
+        if report.embedding:
+            print(f"⚡ Embedded at {report.embedding['chunks_per_second']} chunks/s "
+                  f"({report.embedding['resumed']} resumed from checkpoint)")
         
         # Persist the database
         vectorstore.persist()
         print(f"✅ Created new vector database at: {db_path}")
-        print(f"✅ Database contains {len(chunks)} chunks with OpenAI embeddings")
+        print(f"✅ Database contains {report.total} chunks with OpenAI embeddings")
+        
+        # BM25 index (hybrid/lexical retrieval) and key terms (local suggested questions)
+        rebuild_side_indexes(vectorstore, db_path)
+        save_manifest(db_path, {
+            "source": os.path.basename(textbook_path),
+            "source_sha256": file_sha256(textbook_path),
+            "chunk_params": chunk_params,
+            "embedding_model": embed_model,
+            "metadata": metadata_params(),
+            "chunks": report.total,
+            "chunk_ids": report.chunk_ids,
+            "updated_at": time.time(),
+        })
         
         # Test the database
         test_results = vectorstore.similarity_search("solar system", k=1)
@@ -41,21 +41,29 @@ def analyze_textbook_content():
         for content in sample_content:
             print(f"  {content}")
         
-        # Look for key topics
-        full_text = ""
-        for page in reader.pages:
-            full_text += page.extract_text() or ""
-        
+        # Look for key topics page by page instead of building the whole book's text
         key_topics = ["solar system", "planet", "sun", "moon", "earth", "mars", "jupiter"]
-        found_topics = [topic for topic in key_topics if topic.lower() in full_text.lower()]
+        found = set()
+        content_length = 0
+        sample_parts = []
+        sample_length = 0
+        for page in reader.pages:
+            page_text = page.extract_text() or ""
+            content_length += len(page_text)
+            if sample_length < 1000:
+                sample_parts.append(page_text[:1000 - sample_length])
+                sample_length += len(sample_parts[-1])
+            lowered = page_text.lower()
+            found.update(topic for topic in key_topics if topic not in found and topic in lowered)
+        found_topics = [topic for topic in key_topics if topic in found]
         
         print(f"\n🔍 Found topics in textbook: {', '.join(found_topics)}")
         
         return {
             "pages": len(reader.pages),
-            "content_length": len(full_text),
+            "content_length": content_length,
             "found_topics": found_topics,
-            "sample_text": full_text[:1000]
+            "sample_text": "".join(sample_parts)
         }
         
     except Exception as e:
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Export the textbook Chroma database into the in-process NumPy vector index.
+
+The index is written next to the database (textbook_vector_db/numpy_index)
+unless NUMPY_INDEX_PATH is set. LLMService uses it when RETRIEVAL_BACKEND=numpy
+and re-exports automatically when the collection no longer matches the
+build id recorded in the index; run
+this script to do the export ahead of deployment.
+"""
+
+import argparse
+import os
+import sys
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from dotenv import load_dotenv
+from langchain_community.vectorstores import Chroma
+
+from core.services.vector_index import NumpyVectorIndex
+
+# Load environment variables
+load_dotenv()
+
+TEXTBOOK_DB_PATHS = [
+    "../../textbook_vector_db",
+    "../../../textbook_vector_db",
+    "../textbook_vector_db",
+    "textbook_vector_db",
+]
+
+
+def find_textbook_db() -> str:
+    for path in TEXTBOOK_DB_PATHS:
+        if os.path.exists(path):
+            return path
+    return ""
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Export textbook embeddings to a NumPy index")
+    parser.add_argument("--db-path", default=None, help="Chroma persist directory (auto-detected by default)")
+    parser.add_argument("--out", default=None, help="index directory (default: <db-path>/numpy_index)")
+    args = parser.parse_args()
+
+    db_path = args.db_path or find_textbook_db()
+    if not db_path or not os.path.exists(db_path):
+        print("❌ Textbook vector database not found. Please run create_fresh_textbook_db.py first.")
+        return 1
+
+    index_dir = args.out or NumpyVectorIndex.default_path(db_path)
+    vectorstore = Chroma(persist_directory=db_path)
+    index = NumpyVectorIndex.export_from_chroma(
+        vectorstore, index_dir, model_name=os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-small")
+    )
+    print(f"✅ NumPy index ready: {len(index)} chunks at {index_dir}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Incrementally update the textbook vector database from the PDF.
+
+Chunks are identified by a hash of their source and text, the chunking
+parameters and the embedding model, so only new or edited chunks are
+embedded, chunks that disappeared are deleted and moved chunks only get
+their metadata updated.
+The database is updated in place (the server keeps serving from it) and the
+BM25 and key-term indexes are rebuilt from it afterwards.
+
+New chunks are embedded in batches (--batch-size) by a bounded pool of
+concurrent requests (--concurrency) that backs off on rate limits. Each
+finished batch is kept in the embedding cache, so re-running an interrupted
+ingestion only embeds what is still missing.
+
+Chunks carry source, chapter, section and (with --grade or TEXTBOOK_GRADE)
+grade metadata for filtered retrieval. Each --source is synced on its own,
+so several textbooks can live in one database.
+
+The PDF is streamed: pages are extracted lazily (by a process pool for
+large books, --workers), split and embedded a window of chunks at a time,
+so memory does not grow with the size of the book.
+
+--chunker picks the chunking stage: "recursive" (character-based, sizes in
+characters) or "token" (sentence packing with a token budget and token
+overlap, sizes in tokens; chunks may span pages). TEXTBOOK_CHUNKER sets the
+default. Switching chunkers re-embeds the textbook once.
+
+When the PDF, chunking and embedding model match the last run recorded in
+the manifest, nothing is done (use --force to re-check every chunk).
+
+Usage (from BuddyAI/backend):
+    python ingest_textbook.py
+    python ingest_textbook.py --dry-run --chunk-size 800 --chunk-overlap 150
+    python ingest_textbook.py --batch-size 200 --concurrency 8
+    python ingest_textbook.py --chunker token --chunk-size 250 --chunk-overlap 40
+    python ingest_textbook.py --pdf ../../knowledge-base/grade8.pdf --source grade8.pdf --grade 8
+"""
+
+import argparse
+import os
+import sys
+import time
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from dotenv import load_dotenv
+
+from core.services.ingestion import (
+    CHUNKERS,
+    TEXTBOOK_CHUNKER,
+    TEXTBOOK_GRADE,
+    TEXTBOOK_SOURCE,
+    chunking_params,
+    file_sha256,
+    find_textbook_pdf,
+    is_up_to_date,
+    iter_textbook_chunks,
+    load_manifest,
+    metadata_params,
+    rebuild_side_indexes,
+    save_manifest,
+    sync_chunk_stream,
+)
+
+# Load environment variables
+load_dotenv()
+
+DEFAULT_DB_PATH = "../../textbook_vector_db"
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf", default=None, help="textbook PDF (auto-detected by default)")
+    parser.add_argument("--db-path", default=DEFAULT_DB_PATH, help="Chroma persist directory")
+    parser.add_argument("--source", default=TEXTBOOK_SOURCE, help="source name stored with (and filtering) the chunks")
+    parser.add_argument("--grade", type=int, default=TEXTBOOK_GRADE, help="grade stored with the chunks")
+    parser.add_argument("--chunker", choices=CHUNKERS, default=TEXTBOOK_CHUNKER, help="chunking stage")
+    parser.add_argument("--chunk-size", type=int, default=None,
+                        help="characters (recursive, default 1000) or tokens (token, default 250)")
+    parser.add_argument("--chunk-overlap", type=int, default=None,
+                        help="characters (recursive, default 200) or tokens (token, default 40)")
+    parser.add_argument("--batch-size", type=int, default=None,
+                        help="texts per embeddings request (default INGEST_EMBED_BATCH_SIZE or 100)")
+    parser.add_argument("--concurrency", type=int, default=None,
+                        help="embeddings requests in flight (default INGEST_EMBED_CONCURRENCY or 4)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="PDF extraction processes (default PDF_EXTRACT_WORKERS or up to 4)")
+    parser.add_argument("--dry-run", action="store_true", help="report what would change without writing")
+    parser.add_argument("--force", action="store_true", help="re-check every chunk even if the PDF is unchanged")
+    args = parser.parse_args()
+
+    pdf_path = args.pdf or find_textbook_pdf()
+    if not pdf_path or not os.path.exists(pdf_path):
+        print("❌ Textbook PDF not found!")
+        return 1
+    openai_api_key = os.getenv("OPENAI_API_KEY")
+    if not openai_api_key:
+        print("❌ OPENAI_API_KEY not found in environment!")
+        return 1
+
+    embed_model = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-small")
+    try:
+        chunk_params = chunking_params(args.chunker, args.chunk_size, args.chunk_overlap)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+    source_sha256 = file_sha256(pdf_path)
+    metadata = metadata_params(args.source, args.grade)
+    manifest = load_manifest(args.db_path)
+    if not args.force and is_up_to_date(manifest, source_sha256, chunk_params, embed_model, metadata):
+        print(f"✅ {args.db_path} is up to date with {pdf_path} ({manifest.get('chunks', 0)} chunks)")
+        return 0
+
+    from langchain_community.vectorstores import Chroma
+    from langchain_openai import OpenAIEmbeddings
+
+    from core.services.batch_embedder import BatchEmbedder
+    from core.services.embedding_cache import CachedEmbeddings
+    from core.services.pdf_pages import iter_pdf_pages
+
+    start = time.perf_counter()
+    pages = iter_pdf_pages(pdf_path, workers=args.workers)
+    chunks = iter_textbook_chunks(
+        pages, chunk_params["chunk_size"], chunk_params["chunk_overlap"],
+        source=args.source, grade=args.grade, chunker=args.chunker,
+    )
+
+    # Unchanged texts are served from the embedding cache even when their id is new.
+    # Retries are left to the batch embedder, which backs off the whole pool on 429s.
+    embeddings = CachedEmbeddings(
+        OpenAIEmbeddings(model=embed_model, openai_api_key=openai_api_key, max_retries=0), model_name=embed_model
+    )
+    embedder = BatchEmbedder(embeddings, batch_size=args.batch_size, concurrency=args.concurrency)
+    vectorstore = Chroma(persist_directory=args.db_path, embedding_function=embeddings)
+    report = sync_chunk_stream(
+        vectorstore, chunks, chunk_params, embed_model, dry_run=args.dry_run, embedder=embedder, source=args.source
+    )
+    print(f"✅ Split {pdf_path} into {report.total} chunks")
+    print(f"{'🧪 Dry run: ' if args.dry_run else '✅ '}{report.added} added, {report.updated} updated, "
+          f"{report.deleted} deleted, {report.unchanged} unchanged")
+    if report.embedding:
+        print(f"⚡ Embedding throughput: {report.embedding['chunks_per_second']} chunks/s "
+              f"({report.embedding['resumed']} resumed from checkpoint)")
+    if args.dry_run:
+        return 0
+
+    if report.added or report.updated or report.deleted or args.force:
+        rebuild_side_indexes(vectorstore, args.db_path)
+    save_manifest(args.db_path, {
+        "source": os.path.basename(pdf_path),
+        "source_sha256": source_sha256,
+        "chunk_params": chunk_params,
+        "embedding_model": embed_model,
+        "metadata": metadata,
+        "chunks": report.total,
+        "chunk_ids": report.chunk_ids,
+        "updated_at": time.time(),
+        "last_run": report.summary(),
+    })
+    print(f"✅ Ingestion finished in {time.perf_counter() - start:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Precompute answers for the canned suggested questions and the most frequent
+logged questions, in every mode, for the precomputed answer store.
+
+Questions come from:
+- the fixed suggestions of LLMService (topic-specific and fallback questions)
+- the top --top questions of server logs (--log, repeatable): the
+  "📩 Question: ..." lines the service prints, or JSON lines with a
+  "question" or "message" field
+- a plain file with one question per line (--questions)
+
+The store is tied to the current textbook vector database and is ignored
+after the database is rebuilt, so run this again after
+create_fresh_textbook_db.py. Workers load the store at startup.
+
+Usage (from BuddyAI/backend):
+    python precompute_answers.py --log logs/django.log --top 50
+    python precompute_answers.py --dry-run --log logs/django.log
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from dotenv import load_dotenv
+
+from core.services.answer_cache import normalize_question
+from core.services.answer_store import PrecomputedAnswerStore
+
+# Load environment variables
+load_dotenv()
+
+MODES = ["textbook", "detailed", "advanced"]
+LOG_QUESTION_RE = re.compile(r"📩 Question(?: \(stream\))?: (.+)$")
+
+
+def questions_from_logs(paths, top, min_count):
+    """Most frequent logged questions (most common spelling of each)."""
+    counts = Counter()
+    spellings = {}
+    for path in paths:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                line = line.strip()
+                question = None
+                if line.startswith("{"):
+                    try:
+                        record = json.loads(line)
+                        question = record.get("question") or record.get("message")
+                    except (ValueError, AttributeError):
+                        question = None
+                else:
+                    match = LOG_QUESTION_RE.search(line)
+                    question = match.group(1) if match else None
+                key = normalize_question(question or "")
+                if len(key) < 3:
+                    continue
+                counts[key] += 1
+                spellings.setdefault(key, Counter())[question.strip()] += 1
+    return [
+        spellings[key].most_common(1)[0][0]
+        for key, count in counts.most_common(top)
+        if count >= min_count
+    ]
+
+
+def collect_questions(args, service_cls):
+    questions = [] if args.no_canned else service_cls.canned_questions()
+    if args.log:
+        logged = questions_from_logs(args.log, args.top, args.min_count)
+        print(f"📈 {len(logged)} frequent questions from {len(args.log)} log file(s)")
+        questions += logged
+    if args.questions:
+        with open(args.questions, "r", encoding="utf-8") as f:
+            questions += [line.strip() for line in f if line.strip()]
+    unique = {}
+    for question in questions:
+        unique.setdefault(normalize_question(question), question)
+    return list(unique.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--log", action="append", default=[], help="server log to mine for frequent questions")
+    parser.add_argument("--top", type=int, default=50, help="frequent questions taken from the logs")
+    parser.add_argument("--min-count", type=int, default=2, help="times a logged question must have been asked")
+    parser.add_argument("--questions", default=None, help="file with extra questions, one per line")
+    parser.add_argument("--no-canned", action="store_true", help="skip the fixed suggested questions")
+    parser.add_argument("--modes", default=",".join(MODES))
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--out", default=None, help="store file (default: ANSWER_STORE_PATH or .buddy_cache/answer_store.json)")
+    parser.add_argument("--dry-run", action="store_true", help="only list the questions")
+    args = parser.parse_args()
+
+    from core.services.llm_service import LLMService
+
+    modes = [mode.strip() for mode in args.modes.split(",") if mode.strip() in MODES]
+    questions = collect_questions(args, LLMService)
+    print(f"📝 {len(questions)} questions x {len(modes)} modes")
+    if args.dry_run:
+        for question in questions:
+            print(f"  - {question}")
+        return 0
+
+    os.environ["ANSWER_STORE_ENABLED"] = "0"
+    service = LLMService()
+    build_id = service.textbook_build_id()
+    if build_id is None:
+        print("❌ Textbook vector database not found. Please run create_fresh_textbook_db.py first.")
+        return 1
+
+    entries = {mode: {} for mode in modes}
+    failed = 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        futures = {
+            pool.submit(service._compute_chat_response, question, mode): (question, mode)
+            for question in questions
+            for mode in modes
+        }
+        for future in as_completed(futures):
+            question, mode = futures[future]
+            try:
+                response = future.result()
+            except Exception as e:
+                response = {"success": False, "answer": f"Error generating answer: {e}"}
+            if not service._is_cacheable_response(response):
+                failed += 1
+                print(f"⚠️ Skipped [{mode}] {question}: {(response.get('answer') or '')[:80]}")
+                continue
+            response.pop("turn_id", None)
+            entries[mode][normalize_question(question)] = response
+
+    out = args.out or PrecomputedAnswerStore.default_path()
+    PrecomputedAnswerStore.write(
+        out,
+        build_id,
+        entries,
+        questions=len(questions),
+        models={mode: service.task_router["chat"][mode]["model"] for mode in modes},
+    )
+    stored = sum(len(answers) for answers in entries.values())
+    print(f"✅ Stored {stored} answers ({failed} skipped) for build {build_id} at {out} "
+          f"in {time.perf_counter() - start:.1f}s")
+    print("ℹ️ Restart the backend workers to serve the new answers")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
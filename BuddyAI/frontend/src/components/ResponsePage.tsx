@@ -84,6 +84,9 @@ const ResponsePage: React.FC = () => {
     mode?: 'textbook' | 'detailed' | 'advanced';
     used_mode?: 'textbook' | 'detailed' | 'advanced';
     mode_notes?: string;
+    // Retrieval of the turn, sent back so rewrites reuse it
+    turn_id?: string;
+    chunk_ids?: string[];
     mode_notes_translated?: string | null;
     mode_notes_to?: 'en' | 'ar';
     // Translation state
@@ -95,6 +98,8 @@ const ResponsePage: React.FC = () => {
     showTranslation?: boolean;
   }
   const [chatHistory, setChatHistory] = useState<ChatMessage[]>([]);
+  // Backend conversation memory session, returned by /chat and sent back on follow-ups
+  const chatSessionIdRef = useRef<string | null>(null);
   const [autoTranslateToArabic, setAutoTranslateToArabic] = useState<boolean>(false);
   const [translationAvailable, setTranslationAvailable] = useState<boolean>(true);
   const [translateOpen, setTranslateOpen] = useState(false);
@@ -177,7 +182,10 @@ const ResponsePage: React.FC = () => {
         user_prompt: userMessage.content,
         mode: getLevelForBackend(explanationType),
         conversation_context: updatedHistory.slice(0, index),
-        turn_index: index
+        turn_index: index,
+        turn_id: updatedHistory[index]?.turn_id,
+        chunk_ids: updatedHistory[index]?.chunk_ids,
+        session_id: chatSessionIdRef.current
       });
 
       // Update the specific assistant message
@@ -185,7 +193,9 @@ const ResponsePage: React.FC = () => {
         updatedHistory[index] = {
           role: 'assistant',
           content: response.data.answer,
-          used_mode: getLevelForBackend(explanationType)
+          used_mode: getLevelForBackend(explanationType),
+          turn_id: response.data.turn_id,
+          chunk_ids: response.data.chunk_ids
         };
 
         setChatHistory(updatedHistory);
@@ -757,13 +767,15 @@ const ResponsePage: React.FC = () => {
         message: queryToSubmit,
         level: requestedMode,
         history: nextHistory,
+        session_id: chatSessionIdRef.current,
       });
 
-      const { answer, suggested_questions, level, used_mode, mode_notes } = chatResponse.data || {};
+      const { answer, suggested_questions, level, used_mode, mode_notes, turn_id, chunk_ids, session_id } = chatResponse.data || {};
+      if (session_id) chatSessionIdRef.current = session_id;
 
       // Append assistant reply to chat, with optional auto-translate to AR
       if (answer) {
-        const assistantMsg: ChatMessage = { role: 'assistant', content: answer, used_mode, mode_notes, originalText: answer, language: 'en' };
+        const assistantMsg: ChatMessage = { role: 'assistant', content: answer, used_mode, mode_notes, turn_id, chunk_ids, originalText: answer, language: 'en' };
         if (translationAvailable && autoTranslateToArabic) {
           try {
             // Optimistically add then update after translation
@@ -1,47 +1,35 @@
-def dynamic_chunking_with_metadata(text, token_limit=1000, model="cl100k_base", page_number=1):
-    from nltk.tokenize import sent_tokenize
-    from tiktoken import get_encoding
+import os
+import sys
 
-    try:
-        enc = get_encoding(model)
-    except ValueError:
-        raise ValueError(f"Model '{model}' is not supported by tiktoken.")
+# Add the backend directory to Python path
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "BuddyAI", "backend"))
 
-    sentences = sent_tokenize(text)
-    chunks = []
-    current_chunk = []
-    current_tokens = 0
-    chunk_index = 0
+from langchain.schema import Document
 
-    for sentence in sentences:
-        sentence = sentence.strip().replace("\n", " ").replace("\t", " ")
-        sentence_tokens = len(enc.encode(sentence))
+from core.services.token_chunker import TokenSentenceChunker
 
-        # If adding this sentence exceeds the token limit, flush the current chunk
-        if current_tokens + sentence_tokens > token_limit and current_chunk:
-            chunk_text = " ".join(current_chunk)
-            chunks.append({
-                "chunk_id": f"{page_number}-{chunk_index}",
-                "text": chunk_text,
-                "tokens": current_tokens,
-                "page_number": page_number
-            })
-            chunk_index += 1
-            current_chunk = [sentence]
-            current_tokens = sentence_tokens
-        else:
-            current_chunk.append(sentence)
-            current_tokens += sentence_tokens
 
-    # Add final chunk if any remains
-    if current_chunk:
-        chunk_text = " ".join(current_chunk)
-        chunks.append({
+def dynamic_chunking_with_metadata(text, token_limit=1000, model="cl100k_base", page_number=1, overlap_tokens=None):
+    """
+    Token-bounded sentence chunks of a text, as dicts with chunk_id, text,
+    tokens and page_number. A thin wrapper over the ingestion stage
+    core.services.token_chunker.TokenSentenceChunker: cached encoders, one
+    batched token count for the text and overlapping chunks (overlap_tokens,
+    default a fifth of token_limit). `model` is a tiktoken encoding or an
+    OpenAI model name.
+    """
+    overlap = token_limit // 5 if overlap_tokens is None else overlap_tokens
+    chunker = TokenSentenceChunker(token_limit, overlap, model=model)
+    page = Document(page_content=text, metadata={"page": page_number - 1})
+    chunks = [
+        {
             "chunk_id": f"{page_number}-{chunk_index}",
-            "text": chunk_text,
-            "tokens": current_tokens,
+            "text": chunk.page_content,
+            "tokens": chunk.metadata["tokens"],
             "page_number": page_number
-        })
+        }
+        for chunk_index, chunk in enumerate(chunker.split_pages([page]))
+    ]
 
     print(f"✅ Total Chunks Created: {len(chunks)}")
     for i, c in enumerate(chunks[:5]):
@@ -1,12 +1,21 @@
-from PyPDF2 import PdfReader
+import os
+import sys
 
-def extract_text_from_pdf(file_path):
+# Add the backend directory to Python path
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "BuddyAI", "backend"))
+
+from core.services.pdf_pages import iter_pdf_pages
+
+
+def iter_page_texts(file_path, workers=None):
+    """Yield the text of each page in order, without holding the whole book."""
+    for page in iter_pdf_pages(file_path, workers):
+        yield page.page_content
+
+
+def extract_text_from_pdf(file_path, workers=None):
     try:
-        reader = PdfReader(file_path)
-        text = ""
-        for page in reader.pages:
-            text += page.extract_text() or ""
-        return text
+        return "".join(iter_page_texts(file_path, workers))
     except Exception as e:
         print(f"Error extracting text from {file_path}: {e}")
         return ""